@@ -1,67 +1,407 @@
 # -*- coding: utf-8 -*-
 """
 Module de gestion de la base de données.
-Gère le stockage et la récupération des données patient au format JSON.
+Stocke les patients et les messages HL7 dans une base SQLite en mode WAL.
+Chaque thread réutilise sa propre connexion (les connexions sqlite3 ne se
+partagent pas entre threads); l'attente sur verrou (busy timeout) permet
+aux threads du serveur MLLP d'écrire en parallèle. L'ancien fichier
+patients.json est importé automatiquement une seule fois.
+
+Des déclencheurs SQLite tiennent à jour la table message_stats (compteurs
+par minute, heure et jour, par type, source, destination, statut et code
+d'ACK) à chaque écriture dans messages, quel que soit le chemin d'écriture
+(repository, file write-behind): tableaux de bord et rapports lisent ces
+compteurs au lieu de parcourir les messages. Les compteurs par minute ne
+sont conservés que MINUTE_STATS_RETENTION_DAYS jours.
 """
 import os
 import json
+import sqlite3
+import threading
+import uuid
 from pathlib import Path
 
+ROOT_DIR = Path(__file__).parent.parent.parent
+
+# Base du dossier resources, utilisée par défaut
+DEFAULT_DB_PATH = os.path.join(ROOT_DIR, 'resources', 'hl7_messages.db')
+
+# Version du schéma enregistrée dans PRAGMA user_version
+SCHEMA_VERSION = 3
+
+# Granularités des compteurs: longueur du préfixe de created_at (ISO 8601)
+# formant le seau ('2025-06-01T14:05', '2025-06-01T14', '2025-06-01')
+STATS_GRANULARITIES = (("minute", 16), ("hour", 13), ("day", 10))
+
+# Durée de conservation des compteurs par minute (courbes récentes); les
+# compteurs par heure et par jour sont conservés
+MINUTE_STATS_RETENTION_DAYS = 2
+
+# Code d'ACK des messages enregistrés sans code (bases antérieures à la colonne ack_code)
+ACK_CODES = {"PROCESSED": "AA", "SUCCESS": "AA", "ERROR": "AE", "REJECTED": "AR"}
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS patients (
+    id TEXT PRIMARY KEY,
+    first_name TEXT,
+    last_name TEXT,
+    birth_date TEXT,
+    gender TEXT,
+    address TEXT
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    type TEXT,
+    content TEXT,
+    source TEXT,
+    destination TEXT,
+    patient_id TEXT,
+    status TEXT,
+    created_at TEXT,
+    ack_code TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_messages_created_at ON messages (created_at);
+CREATE INDEX IF NOT EXISTS idx_messages_patient_id ON messages (patient_id, created_at);
+
+CREATE TABLE IF NOT EXISTS message_stats (
+    granularity TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    type TEXT NOT NULL,
+    source TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    status TEXT NOT NULL,
+    ack_code TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (granularity, bucket, type, source, destination, status, ack_code)
+) WITHOUT ROWID;
+'''
+
+
+def _source_key(row):
+    """
+    Source regroupée: les anciennes sources 'ip:port' (un port éphémère par
+    connexion) sont ramenées à l'adresse IP
+    """
+    return (f"coalesce(CASE WHEN {row}.source GLOB '*.*.*.*:[0-9]*' "
+            f"THEN substr({row}.source, 1, instr({row}.source, ':') - 1) ELSE {row}.source END, '')")
+
+
+def _ack_key(row):
+    """Code d'ACK enregistré, ou déduit du statut pour les anciennes lignes"""
+    cases = " ".join(f"WHEN '{status}' THEN '{code}'" for status, code in ACK_CODES.items())
+    return f"coalesce({row}.ack_code, CASE {row}.status {cases} END, '')"
+
+
+def _stats_statements(row, delta):
+    """Mises à jour de message_stats pour une ligne de messages (NEW ou OLD)"""
+    statements = []
+    for granularity, length in STATS_GRANULARITIES:
+        statements.append(f'''
+    INSERT INTO message_stats VALUES (
+        '{granularity}', coalesce(substr({row}.created_at, 1, {length}), ''), coalesce({row}.type, ''),
+        {_source_key(row)}, coalesce({row}.destination, ''), coalesce({row}.status, ''),
+        {_ack_key(row)}, {delta})
+    ON CONFLICT (granularity, bucket, type, source, destination, status, ack_code)
+    DO UPDATE SET count = count + ({delta});''')
+    return "".join(statements)
+
+
+# Les remplacements (INSERT OR REPLACE) passent par le déclencheur de
+# suppression grâce à PRAGMA recursive_triggers (voir Database._open)
+STATS_TRIGGERS = f'''
+CREATE TRIGGER IF NOT EXISTS messages_stats_insert AFTER INSERT ON messages
+BEGIN{_stats_statements("NEW", 1)}
+END;
+
+CREATE TRIGGER IF NOT EXISTS messages_stats_delete AFTER DELETE ON messages
+BEGIN{_stats_statements("OLD", -1)}
+END;
+
+CREATE TRIGGER IF NOT EXISTS messages_stats_update
+AFTER UPDATE OF type, source, destination, status, ack_code, created_at ON messages
+BEGIN{_stats_statements("OLD", -1)}{_stats_statements("NEW", 1)}
+END;
+
+-- Rétention des compteurs par minute: une purge par nouvelle heure (le test
+-- porte sur la clé primaire et ne coûte qu'une recherche d'index par message)
+CREATE TRIGGER IF NOT EXISTS messages_stats_retention BEFORE INSERT ON messages
+WHEN NOT EXISTS (SELECT 1 FROM message_stats
+                 WHERE granularity = 'hour' AND bucket = substr(NEW.created_at, 1, 13))
+BEGIN
+    DELETE FROM message_stats WHERE granularity = 'minute' AND bucket <
+        strftime('%Y-%m-%dT%H:%M', substr(NEW.created_at, 1, 19), '-{MINUTE_STATS_RETENTION_DAYS} days');
+END;
+'''
+
+STATS_TRIGGER_NAMES = ("messages_stats_insert", "messages_stats_delete",
+                       "messages_stats_update", "messages_stats_retention")
+
+REBUILD_STATS = [
+    'DELETE FROM message_stats'
+] + [f'''
+INSERT INTO message_stats
+SELECT '{granularity}', coalesce(substr(created_at, 1, {length}), ''), coalesce(type, ''),
+       {_source_key("messages")}, coalesce(destination, ''), coalesce(status, ''),
+       {_ack_key("messages")}, COUNT(*)
+FROM messages
+GROUP BY 2, 3, 4, 5, 6, 7
+''' for granularity, length in STATS_GRANULARITIES] + [f'''
+DELETE FROM message_stats WHERE granularity = 'minute' AND bucket <
+    (SELECT strftime('%Y-%m-%dT%H:%M', max(substr(created_at, 1, 19)), '-{MINUTE_STATS_RETENTION_DAYS} days')
+     FROM messages)
+''']
+
+
 class Database:
-    """Gestionnaire de données pour le stockage JSON des patients"""
-    
-    def __init__(self, data_path=None):
+    """Gestionnaire de la base SQLite de l'application"""
+
+    def __init__(self, db_path=None, json_path=None, busy_timeout=5.0):
         """
-        Initialise la connexion au fichier de données
-        
+        Initialise la base de données (ouverte au premier accès)
+
         Args:
-            data_path (str, optional): Chemin vers le fichier JSON
+            db_path (str, optional): Chemin vers le fichier SQLite
+            json_path (str, optional): Ancien fichier JSON des patients à importer
+            busy_timeout (float, optional): Attente maximale (secondes) quand
+                un autre thread ou processus écrit dans la base
         """
-        if data_path is None:
-            # Créer le fichier dans le dossier resources par défaut
-            root_dir = Path(__file__).parent.parent.parent
-            data_path = os.path.join(root_dir, 'resources', 'patients.json')
-            
-        self.data_path = data_path
-        self._ensure_file_exists()
-        
-    def _ensure_file_exists(self):
-        """S'assure que le fichier JSON existe, sinon le crée"""
-        if not os.path.exists(self.data_path):
-            directory = os.path.dirname(self.data_path)
-            if not os.path.exists(directory):
-                os.makedirs(directory)
-            with open(self.data_path, 'w') as f:
-                json.dump([], f)
-                
-    def load_data(self):
+        if db_path is None:
+            db_path = DEFAULT_DB_PATH
+        if json_path is None and db_path != ':memory:':
+            json_path = os.path.join(os.path.dirname(db_path), 'patients.json')
+
+        self.db_path = db_path
+        self.json_path = json_path
+        self.busy_timeout = busy_timeout
+        # ':memory:' crée une base vide par connexion: base en mémoire nommée,
+        # partagée par les connexions de cette instance et maintenue par une
+        # connexion ouverte jusqu'à close_all()
+        self._uri = None
+        self._keeper = None
+        if db_path == ':memory:':
+            self._uri = f"file:hl7_memory_{uuid.uuid4().hex}?mode=memory&cache=shared"
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self._local = threading.local()
+
+    def connect(self):
         """
-        Charge les données depuis le fichier JSON
-        
+        Renvoie la connexion du thread courant (ouverte au premier appel).
+        Utilisable avec `with`: commit en sortie, rollback en cas d'exception.
+
         Returns:
-            list: Liste des données patients
+            sqlite3.Connection: Connexion avec accès aux colonnes par nom
         """
-        try:
-            with open(self.data_path, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Erreur lors du chargement des données: {e}")
-            return []
-            
-    def save_data(self, data):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            if not self._initialized:
+                self._initialize()
+            conn = self._local.conn = self._open()
+        return conn
+
+    def close(self):
+        """Ferme la connexion du thread courant"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.conn = None
+            conn.close()
+
+    def close_all(self):
+        """Ferme la connexion du thread courant et libère une base en mémoire"""
+        self.close()
+        if self._keeper is not None:
+            self._keeper.close()
+            self._keeper = None
+            self._initialized = False
+
+    def open(self, check_same_thread=True):
         """
-        Enregistre les données dans le fichier JSON
-        
+        Ouvre une connexion dédiée, distincte de celle du thread courant
+        (à fermer par l'appelant)
+
         Args:
-            data (list): Liste des données à enregistrer
-            
+            check_same_thread (bool, optional): False pour partager la connexion
+                entre threads (l'appelant doit alors sérialiser les accès)
+
         Returns:
-            bool: True si l'enregistrement a réussi, False sinon
+            sqlite3.Connection: Nouvelle connexion configurée
+        """
+        if not self._initialized:
+            self._initialize()
+        return self._open(check_same_thread)
+
+    def _open(self, check_same_thread=True):
+        """Ouvre et configure une connexion SQLite"""
+        conn = sqlite3.connect(self._uri or self.db_path, timeout=self.busy_timeout,
+                               check_same_thread=check_same_thread, uri=self._uri is not None)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f'PRAGMA busy_timeout={int(self.busy_timeout * 1000)}')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA recursive_triggers=ON')
+        return conn
+
+    def _initialize(self):
+        """Crée le dossier, le schéma et importe l'ancien JSON si nécessaire"""
+        with self._init_lock:
+            if self._initialized:
+                return
+            directory = os.path.dirname(self.db_path)
+            if directory and not os.path.exists(directory):
+                os.makedirs(directory)
+
+            conn = self._open()
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                if version < 3:
+                    self._migrate_ack_code(conn)
+                conn.executescript(SCHEMA + STATS_TRIGGERS)
+                if version < 1:
+                    self._migrate_json(conn)
+                if version < 3:
+                    # Compteurs des messages enregistrés avant les déclencheurs
+                    # (ou avant la dimension ack_code)
+                    self.rebuild_stats(conn)
+                if version < SCHEMA_VERSION:
+                    conn.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+                conn.commit()
+            finally:
+                if self._uri is None:
+                    conn.close()
+                else:
+                    self._keeper = conn
+            self._initialized = True
+
+    def rebuild_stats(self, conn=None):
+        """
+        Recalcule entièrement message_stats à partir de la table messages
+
+        Args:
+            conn (sqlite3.Connection, optional): Connexion à utiliser (celle
+                du thread courant par défaut, avec validation)
         """
+        target = conn if conn is not None else self.connect()
+        for statement in REBUILD_STATS:
+            target.execute(statement)
+        if conn is None:
+            target.commit()
+
+    @staticmethod
+    def _migrate_ack_code(conn):
+        """
+        Ajoute la colonne ack_code aux messages et recrée message_stats avec
+        cette dimension (recalculée ensuite par rebuild_stats)
+
+        Args:
+            conn (sqlite3.Connection): Connexion sur laquelle écrire
+        """
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(messages)')}
+        if columns and 'ack_code' not in columns:
+            conn.execute('ALTER TABLE messages ADD COLUMN ack_code TEXT')
+        for name in STATS_TRIGGER_NAMES:
+            conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+        conn.execute('DROP TABLE IF EXISTS message_stats')
+
+    def _migrate_json(self, conn):
+        """
+        Importe les patients de l'ancien fichier JSON (migration unique)
+
+        Args:
+            conn (sqlite3.Connection): Connexion sur laquelle écrire
+        """
+        if not self.json_path or not os.path.exists(self.json_path):
+            return
         try:
-            with open(self.data_path, 'w') as f:
-                json.dump(data, f, indent=2)
-            return True
+            with open(self.json_path, 'r') as f:
+                data = json.load(f)
         except Exception as e:
-            print(f"Erreur lors de l'enregistrement des données: {e}")
-            return False
+            print(f"Erreur lors de la lecture de {self.json_path}: {e}")
+            return
+
+        rows = [patient_to_row(item) for item in data if item.get('id')]
+        conn.executemany(UPSERT_PATIENT, rows)
+        print(f"📦 {len(rows)} patients importés depuis {self.json_path}")
+
+
+UPSERT_PATIENT = '''
+INSERT INTO patients (id, first_name, last_name, birth_date, gender, address)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET
+    first_name = excluded.first_name,
+    last_name = excluded.last_name,
+    birth_date = excluded.birth_date,
+    gender = excluded.gender,
+    address = excluded.address
+'''
+
+
+def patient_to_row(data):
+    """
+    Convertit le dictionnaire d'un patient en ligne de la table patients
+
+    Args:
+        data (dict): Données du patient (Patient.to_dict())
+
+    Returns:
+        tuple: Valeurs dans l'ordre des colonnes de UPSERT_PATIENT
+    """
+    return (
+        data.get('id'),
+        data.get('first_name'),
+        data.get('last_name'),
+        data.get('birth_date'),
+        data.get('gender'),
+        json.dumps(data.get('address') or {})
+    )
+
+
+def row_to_patient_dict(row):
+    """
+    Convertit une ligne de la table patients en dictionnaire
+
+    Args:
+        row (sqlite3.Row): Ligne lue
+
+    Returns:
+        dict: Données du patient (format de Patient.from_dict())
+    """
+    return {
+        'id': row['id'],
+        'first_name': row['first_name'],
+        'last_name': row['last_name'],
+        'birth_date': row['birth_date'],
+        'gender': row['gender'],
+        'address': json.loads(row['address']) if row['address'] else {}
+    }
+
+
+INSERT_MESSAGE = '''
+INSERT OR REPLACE INTO messages
+(id, type, content, source, destination, patient_id, status, created_at, ack_code)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+
+def message_to_row(message):
+    """
+    Convertit un message en ligne de la table messages
+
+    Args:
+        message (Message): Message HL7
+
+    Returns:
+        tuple: Valeurs dans l'ordre des colonnes de INSERT_MESSAGE
+    """
+    return (
+        message.id,
+        message.message_type,
+        message.content,
+        message.source,
+        message.destination,
+        message.patient_id,
+        message.status,
+        message.created_at,
+        message.ack_code
+    )
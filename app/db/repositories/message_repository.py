@@ -3,7 +3,7 @@
 Repository pour la gestion des messages HL7.
 """
 import json
-from ..database import Database
+from ..database import Database, INSERT_MESSAGE, message_to_row
 from ...models.message import Message
  
 class MessageRepository:
@@ -30,20 +30,7 @@ class MessageRepository:
         """
         with self.db.connect() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-            INSERT OR REPLACE INTO messages
-            (id, type, content, source, destination, patient_id, status, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                message.id,
-                message.message_type,
-                message.content,
-                message.source,
-                message.destination,
-                message.patient_id,
-                message.status,
-                message.created_at
-            ))
+            cursor.execute(INSERT_MESSAGE, message_to_row(message))
             conn.commit()
            
         return message
@@ -64,15 +51,19 @@ class MessageRepository:
             row = cursor.fetchone()
            
             if row:
-                return Message(
+                message = Message(
                     id=row['id'],
                     message_type=row['type'],
                     content=row['content'],
                     source=row['source'],
                     destination=row['destination'],
                     patient_id=row['patient_id'],
-                    status=row['status']
+                    status=row['status'],
+                    ack_code=row['ack_code']
                 )
+                # Restaurer la date de création d'origine
+                message.created_at = row['created_at']
+                return message
             return None
            
     def get_by_patient(self, patient_id):
@@ -102,7 +93,8 @@ class MessageRepository:
                     source=row['source'],
                     destination=row['destination'],
                     patient_id=row['patient_id'],
-                    status=row['status']
+                    status=row['status'],
+                    ack_code=row['ack_code']
                 )
                 # Restaurer la date de création d'origine
                 message.created_at = row['created_at']
@@ -137,7 +129,8 @@ class MessageRepository:
                     source=row['source'],
                     destination=row['destination'],
                     patient_id=row['patient_id'],
-                    status=row['status']
+                    status=row['status'],
+                    ack_code=row['ack_code']
                 )
                 message.created_at = row['created_at']
                 messages.append(message)
@@ -1,154 +1,305 @@
-# -*- coding: utf-8 -*-
+ # -*- coding: utf-8 -*-
 """
 Repository pour la gestion des patients.
-Fournit les méthodes CRUD pour les patients avec stockage JSON.
+Fournit les méthodes CRUD pour les patients avec stockage SQLite.
 """
-from ..database import Database
+import threading
+
+from ..database import Database, UPSERT_PATIENT, patient_to_row, row_to_patient_dict
+from ..search_index import PatientSearchIndex
 from ...models.patient import Patient
 
+# Colonnes de la table patients, dans l'ordre de patient_to_row()
+_COLUMNS = ('id', 'first_name', 'last_name', 'birth_date', 'gender', 'address')
+
 class PatientRepository:
     """Gestionnaire des opérations CRUD pour les patients"""
-    
+
     def __init__(self, database=None):
         """
         Initialise le repository
-        
+
         Args:
             database (Database, optional): Instance de base de données
         """
         self.db = database or Database()
-        
+
     def get_all(self):
         """
         Récupère tous les patients
-        
+
         Returns:
             list: Liste d'objets Patient
         """
-        data = self.db.load_data()
-        
-        patients = []
-        for item in data:
-            patient = Patient.from_dict(item)
-            patients.append(patient)
-            
-        return patients
-        
+        with self.db.connect() as conn:
+            rows = conn.execute('SELECT * FROM patients ORDER BY rowid').fetchall()
+
+        return [Patient.from_dict(row_to_patient_dict(row)) for row in rows]
+
     def get_by_id(self, patient_id):
         """
         Récupère un patient par son ID
-        
+
         Args:
             patient_id (str): ID du patient
-            
+
         Returns:
             Patient: Instance de Patient ou None si non trouvé
         """
-        data = self.db.load_data()
-        
-        for item in data:
-            if item.get('id') == patient_id:
-                return Patient.from_dict(item)
-                
+        with self.db.connect() as conn:
+            row = conn.execute('SELECT * FROM patients WHERE id = ?', (patient_id,)).fetchone()
+
+        if row:
+            return Patient.from_dict(row_to_patient_dict(row))
         return None
-        
+
     def create(self, patient):
         """
-        Crée un nouveau patient
-        
+        Crée un nouveau patient (ou le met à jour s'il existe déjà)
+
         Args:
             patient (Patient): Instance de Patient à créer
-            
+
         Returns:
             Patient: Instance de Patient créée
         """
         if not patient.id:
             raise ValueError("L'ID du patient est requis")
-            
-        # Vérifier que le patient n'existe pas déjà
-        existing = self.get_by_id(patient.id)
-        if existing:
-            return self.update(patient)
-            
-        # Ajouter le patient
-        data = self.db.load_data()
-        data.append(patient.to_dict())
-        self.db.save_data(data)
-        
-        return patient
-        
+
+        return self._upsert(patient)
+
     def update(self, patient):
         """
-        Met à jour un patient existant
-        
+        Met à jour un patient existant (ou l'ajoute s'il n'existe pas)
+
         Args:
             patient (Patient): Instance de Patient à mettre à jour
-            
+
         Returns:
             Patient: Instance de Patient mise à jour
         """
         if not patient.id:
             raise ValueError("L'ID du patient est requis")
-            
-        data = self.db.load_data()
-        
-        # Rechercher le patient
-        found = False
-        for i, item in enumerate(data):
-            if item.get('id') == patient.id:
-                data[i] = patient.to_dict()
-                found = True
-                break
-                
-        # Si le patient n'existe pas, l'ajouter
-        if not found:
-            data.append(patient.to_dict())
-            
-        self.db.save_data(data)
-        
-        return patient
-        
+
+        return self._upsert(patient)
+
     def delete(self, patient_id):
         """
         Supprime un patient
-        
+
         Args:
             patient_id (str): ID du patient à supprimer
-            
+
         Returns:
             bool: True si la suppression a réussi, False sinon
         """
-        data = self.db.load_data()
-        
-        # Rechercher le patient
-        for i, item in enumerate(data):
-            if item.get('id') == patient_id:
-                del data[i]
-                self.db.save_data(data)
-                return True
-                
-        return False
-        
-    def search(self, query):
+        with self.db.connect() as conn:
+            cursor = conn.execute('DELETE FROM patients WHERE id = ?', (patient_id,))
+            return cursor.rowcount > 0
+
+    def search(self, query, limit=None):
         """
         Recherche des patients par nom, prénom ou ID
-        
+
         Args:
             query (str): Terme de recherche
-            
+            limit (int, optional): Nombre maximum de résultats
+
         Returns:
             list: Liste d'objets Patient correspondant à la recherche
         """
-        data = self.db.load_data()
         query = query.lower()
-        
+
         patients = []
-        for item in data:
-            if (query in str(item.get('id', '')).lower() or
-                query in str(item.get('first_name', '')).lower() or
-                query in str(item.get('last_name', '')).lower()):
-                
-                patient = Patient.from_dict(item)
-                patients.append(patient)
-                
-        return patients
\ No newline at end of file
+        with self.db.connect() as conn:
+            for row in conn.execute('SELECT * FROM patients ORDER BY rowid'):
+                if (query in str(row['id'] or '').lower() or
+                    query in str(row['first_name'] or '').lower() or
+                    query in str(row['last_name'] or '').lower()):
+
+                    patients.append(Patient.from_dict(row_to_patient_dict(row)))
+                    if limit is not None and len(patients) >= limit:
+                        break
+
+        return patients
+
+    def _upsert(self, patient):
+        """Insère ou remplace un patient en une seule requête indexée"""
+        with self.db.connect() as conn:
+            conn.execute(UPSERT_PATIENT, patient_to_row(patient.to_dict()))
+
+        return patient
+
+
+class CachedPatientRepository(PatientRepository):
+    """
+    Repository patients servi depuis un index en mémoire.
+    Les patients sont chargés une seule fois dans un dictionnaire indexé par
+    ID, avec un index par nom et un index de recherche n-grammes
+    (PatientSearchIndex); chaque écriture met à jour la ligne en base puis
+    les index. Les modifications faites par d'autres connexions (serveur
+    MLLP, autre processus) sont détectées via PRAGMA data_version et
+    provoquent un rechargement.
+    """
+
+    def __init__(self, database=None):
+        """
+        Initialise le repository (chargement au premier accès)
+
+        Args:
+            database (Database, optional): Instance de base de données
+        """
+        super().__init__(database)
+        self._lock = threading.RLock()
+        self._conn = None
+        self._data_version = None
+        self._patients = {}     # id -> données du patient
+        self._search_index = PatientSearchIndex()
+        self._names = {}        # nom en minuscules -> ids (dict ordonné)
+
+    def close(self):
+        """Ferme la connexion dédiée et vide l'index"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._data_version = None
+            self._patients = {}
+            self._search_index.clear()
+            self._names = {}
+
+    def get_all(self):
+        """
+        Récupère tous les patients
+
+        Returns:
+            list: Liste d'objets Patient
+        """
+        with self._lock:
+            self._refresh()
+            return [self._to_patient(data) for data in self._patients.values()]
+
+    def get_by_id(self, patient_id):
+        """
+        Récupère un patient par son ID
+
+        Args:
+            patient_id (str): ID du patient
+
+        Returns:
+            Patient: Instance de Patient ou None si non trouvé
+        """
+        with self._lock:
+            self._refresh()
+            data = self._patients.get(patient_id)
+            return self._to_patient(data) if data else None
+
+    def find_by_name(self, last_name, first_name=None):
+        """
+        Recherche exacte (insensible à la casse) par nom et prénom
+
+        Args:
+            last_name (str): Nom de famille
+            first_name (str, optional): Prénom
+
+        Returns:
+            list: Liste d'objets Patient
+        """
+        with self._lock:
+            self._refresh()
+            patients = []
+            for patient_id in self._names.get((last_name or '').lower(), ()):
+                data = self._patients[patient_id]
+                if first_name is None or (data['first_name'] or '').lower() == first_name.lower():
+                    patients.append(self._to_patient(data))
+            return patients
+
+    def delete(self, patient_id):
+        """
+        Supprime un patient
+
+        Args:
+            patient_id (str): ID du patient à supprimer
+
+        Returns:
+            bool: True si la suppression a réussi, False sinon
+        """
+        with self._lock:
+            self._refresh()
+            with self._conn:
+                cursor = self._conn.execute('DELETE FROM patients WHERE id = ?', (patient_id,))
+            self._unindex(patient_id)
+            return cursor.rowcount > 0
+
+    def search(self, query, limit=None):
+        """
+        Recherche des patients par nom, prénom ou ID, accents et casse ignorés.
+        Chaque mot de la requête doit apparaître (sous-chaîne, comme dans
+        PatientRepository.search) dans un mot de l'ID, du prénom ou du nom.
+
+        Args:
+            query (str): Terme de recherche
+            limit (int, optional): Nombre maximum de résultats
+
+        Returns:
+            list: Liste d'objets Patient, les plus pertinents d'abord
+        """
+        with self._lock:
+            self._refresh()
+            return [self._to_patient(self._patients[patient_id])
+                    for patient_id in self._search_index.search(query, limit)]
+
+    def _upsert(self, patient):
+        """Écrit le patient en base puis met à jour l'index"""
+        row = patient_to_row(patient.to_dict())
+        with self._lock:
+            self._refresh()
+            with self._conn:
+                self._conn.execute(UPSERT_PATIENT, row)
+            self._index(row_to_patient_dict(dict(zip(_COLUMNS, row))))
+
+        return patient
+
+    def _refresh(self):
+        """Charge l'index ou le recharge si la base a été modifiée ailleurs"""
+        if self._conn is None:
+            # Connexion dédiée: nos propres écritures ne modifient pas son data_version
+            self._conn = self.db.open(check_same_thread=False)
+        version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        if version == self._data_version:
+            return
+
+        self._patients = {}
+        self._search_index.clear()
+        self._names = {}
+        for row in self._conn.execute('SELECT * FROM patients ORDER BY rowid'):
+            self._index(row_to_patient_dict(row))
+        self._data_version = version
+
+    def _index(self, data):
+        patient_id = data['id']
+        if patient_id in self._patients:
+            self._unindex(patient_id, keep_position=True)
+        self._patients[patient_id] = data
+        self._search_index.add(patient_id, data['first_name'], data['last_name'])
+        self._names.setdefault((data['last_name'] or '').lower(), {})[patient_id] = None
+
+    def _unindex(self, patient_id, keep_position=False):
+        data = self._patients.get(patient_id)
+        if data is None:
+            return
+        name = (data['last_name'] or '').lower()
+        ids = self._names.get(name)
+        if ids is not None:
+            ids.pop(patient_id, None)
+            if not ids:
+                del self._names[name]
+        if not keep_position:
+            # Un upsert conserve le rowid, donc la position dans get_all()
+            del self._patients[patient_id]
+            self._search_index.remove(patient_id)
+
+    @staticmethod
+    def _to_patient(data):
+        """Copie les données de l'index dans un nouveau Patient"""
+        return Patient.from_dict(dict(data, address=dict(data['address'])))
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Repository pour les compteurs de messages précalculés (table message_stats).
+Les compteurs sont tenus à jour par les déclencheurs de la base: les
+lectures coûtent O(seaux) quel que soit le nombre de messages enregistrés.
+Les messages rejetés avant traitement (ACK AR: surcharge, limite de débit)
+ne sont pas enregistrés; ils ne sont comptés que par la métrique
+hl7_acks_total du serveur.
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from ..database import Database, STATS_GRANULARITIES
+
+# Dimensions de regroupement (colonnes de message_stats)
+DIMENSIONS = ("type", "source", "destination", "status", "ack_code")
+
+class StatsRepository:
+    """Lecture des compteurs par minute, heure et jour"""
+
+    def __init__(self, database=None):
+        """
+        Initialise le repository
+
+        Args:
+            database (Database, optional): Instance de base de données
+        """
+        self.db = database or Database()
+
+    @staticmethod
+    def _bounds(start, end=None):
+        """Seaux [début, fin) d'une plage de jours (end inclus)"""
+        end = end or start
+        return start.isoformat()[:10], (end + timedelta(days=1)).isoformat()[:10]
+
+    @staticmethod
+    def _check_granularity(granularity):
+        if granularity not in dict(STATS_GRANULARITIES):
+            raise ValueError(f"Granularité inconnue: {granularity}")
+
+    def rows(self, start, end=None, granularity="hour"):
+        """
+        Compteurs détaillés d'une plage de jours
+
+        Args:
+            start (date): Premier jour
+            end (date, optional): Dernier jour inclus (start par défaut)
+            granularity (str, optional): 'minute', 'hour' ou 'day'
+
+        Returns:
+            list: Tuples (seau, type, source, destination, statut, code d'ACK, nombre)
+        """
+        self._check_granularity(granularity)
+        lower, upper = self._bounds(start, end)
+        cursor = self.db.connect().execute('''
+            SELECT bucket, type, source, destination, status, ack_code, count
+            FROM message_stats
+            WHERE granularity = ? AND bucket >= ? AND bucket < ? AND count > 0
+        ''', (granularity, lower, upper))
+        return [tuple(row) for row in cursor]
+
+    def totals(self, start, end=None, by="type"):
+        """
+        Nombre de messages d'une plage de jours regroupés par dimension
+
+        Args:
+            start (date): Premier jour
+            end (date, optional): Dernier jour inclus (start par défaut)
+            by (str, optional): 'type', 'source', 'destination', 'status' ou 'ack_code'
+
+        Returns:
+            Counter: {valeur de la dimension: nombre de messages}
+        """
+        if by not in DIMENSIONS:
+            raise ValueError(f"Dimension inconnue: {by}")
+        lower, upper = self._bounds(start, end)
+        cursor = self.db.connect().execute(f'''
+            SELECT {by}, SUM(count)
+            FROM message_stats
+            WHERE granularity = 'day' AND bucket >= ? AND bucket < ?
+            GROUP BY {by}
+            HAVING SUM(count) > 0
+        ''', (lower, upper))
+        return Counter(dict(cursor.fetchall()))
+
+    def series(self, since, until=None, granularity="minute", **filters):
+        """
+        Nombre de messages par seau (pour les courbes des tableaux de bord)
+
+        Args:
+            since (datetime): Début de la période
+            until (datetime, optional): Fin exclue (maintenant par défaut)
+            granularity (str, optional): 'minute', 'hour' ou 'day' (les seaux
+                par minute ne sont conservés que MINUTE_STATS_RETENTION_DAYS jours)
+            **filters: Égalités sur les dimensions (ex: source='LAB')
+
+        Returns:
+            list: [(seau, nombre de messages)] par ordre chronologique
+                (seaux sans message absents)
+        """
+        self._check_granularity(granularity)
+        length = dict(STATS_GRANULARITIES)[granularity]
+        until = until or datetime.now()
+        clauses = ["granularity = ?", "bucket >= ?", "bucket < ?"]
+        params = [granularity, since.isoformat()[:length], until.isoformat()[:length]]
+        for column, value in filters.items():
+            if column not in DIMENSIONS:
+                raise ValueError(f"Dimension inconnue: {column}")
+            clauses.append(f"{column} = ?")
+            params.append(value)
+        cursor = self.db.connect().execute(f'''
+            SELECT bucket, SUM(count)
+            FROM message_stats
+            WHERE {" AND ".join(clauses)}
+            GROUP BY bucket
+            HAVING SUM(count) > 0
+            ORDER BY bucket
+        ''', params)
+        return [tuple(row) for row in cursor]
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+Index de recherche des patients (ID, prénom, nom).
+Les champs sont normalisés (minuscules, sans accents) puis découpés en mots.
+Chaque mot distinct est indexé par ses sous-chaînes de 1 à 3 caractères
+(n-grammes): une requête de plus de 3 caractères n'examine que les mots
+contenant tous ses trigrammes, une requête plus courte est elle-même un
+n-gramme de l'index. Toutes les requêtes ont donc la même sémantique de
+sous-chaîne ("an" trouve "Jean" comme "ean"), comme PatientRepository.search.
+Comme les noms se répètent, l'index porte sur le vocabulaire et non sur
+chaque patient, ce qui le garde compact.
+
+Classement: mot identique, puis préfixe, puis sous-chaîne; à score égal,
+ordre alphabétique du nom, du prénom puis de l'ID.
+"""
+import heapq
+import re
+import unicodedata
+
+_WORD_SPLIT = re.compile(r"[\W_]+")
+
+# Score d'un mot de la requête selon la façon dont il correspond
+EXACT, PREFIX, SUBSTRING = 0, 1, 2
+
+
+def normalize_text(text):
+    """
+    Normalise un texte pour la recherche: minuscules et sans accents
+
+    Args:
+        text (str): Texte à normaliser (None accepté)
+
+    Returns:
+        str: Texte normalisé, ex: 'Hélène' -> 'helene'
+    """
+    if not text:
+        return ""
+    text = str(text)
+    if not text.isascii():
+        decomposed = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return text.casefold()
+
+
+def tokenize(text):
+    """
+    Découpe un texte normalisé en mots (tirets, apostrophes et espaces séparent)
+
+    Args:
+        text (str): Texte à découper
+
+    Returns:
+        list: Mots non vides
+    """
+    return [word for word in _WORD_SPLIT.split(normalize_text(text)) if word]
+
+
+def _trigrams(word):
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def _ngrams(word):
+    """Sous-chaînes de 1 à 3 caractères d'un mot"""
+    return {word[i:i + n] for n in (1, 2, 3) for i in range(len(word) - n + 1)}
+
+
+class PatientSearchIndex:
+    """Index n-grammes sur l'ID, le prénom et le nom des patients"""
+
+    def __init__(self):
+        self._documents = {}   # id -> (mots, clé de tri)
+        self._postings = {}    # mot -> {id: None} (ordre d'insertion)
+        self._ngrams = {}      # sous-chaîne de 1 à 3 caractères -> mots
+
+    def __len__(self):
+        """Nombre de patients indexés"""
+        return len(self._documents)
+
+    def clear(self):
+        """Vide l'index"""
+        self._documents.clear()
+        self._postings.clear()
+        self._ngrams.clear()
+
+    def add(self, patient_id, first_name=None, last_name=None):
+        """
+        Indexe (ou réindexe) un patient
+
+        Args:
+            patient_id (str): ID du patient
+            first_name (str, optional): Prénom
+            last_name (str, optional): Nom de famille
+        """
+        if patient_id in self._documents:
+            self.remove(patient_id)
+        words = frozenset(tokenize(patient_id) + tokenize(first_name) + tokenize(last_name))
+        sort_key = (normalize_text(last_name), normalize_text(first_name), str(patient_id))
+        self._documents[patient_id] = (words, sort_key)
+
+        for word in words:
+            postings = self._postings.get(word)
+            if postings is None:
+                postings = self._postings[word] = {}
+                for ngram in _ngrams(word):
+                    self._ngrams.setdefault(ngram, set()).add(word)
+            postings[patient_id] = None
+
+    def remove(self, patient_id):
+        """
+        Retire un patient de l'index
+
+        Args:
+            patient_id (str): ID du patient
+        """
+        document = self._documents.pop(patient_id, None)
+        if document is None:
+            return
+        for word in document[0]:
+            postings = self._postings[word]
+            postings.pop(patient_id, None)
+            if postings:
+                continue
+            # Plus aucun patient n'utilise ce mot: le retirer du vocabulaire
+            del self._postings[word]
+            for ngram in _ngrams(word):
+                words = self._ngrams[ngram]
+                words.discard(word)
+                if not words:
+                    del self._ngrams[ngram]
+
+    def search(self, query, limit=None):
+        """
+        Recherche les patients dont chaque mot de la requête apparaît
+        (sous-chaîne, quelle que soit sa longueur) dans un mot de l'ID, du
+        prénom ou du nom
+
+        Args:
+            query (str): Terme de recherche (accents et casse ignorés)
+            limit (int, optional): Nombre maximum de résultats
+
+        Returns:
+            list: IDs des patients, les plus pertinents d'abord
+        """
+        query_words = tokenize(query)
+        if not query_words:
+            return []
+
+        # Mots de l'index correspondant à chaque mot de la requête
+        matches = []
+        for query_word in set(query_words):
+            words = self._matching_words(query_word)
+            if not words:
+                return []
+            size = sum(len(self._postings[word]) for word in words)
+            matches.append((size, query_word, words))
+
+        # Candidats issus du mot le plus sélectif, filtrés par les autres mots
+        matches.sort()
+        candidates = set()
+        for word in matches[0][2]:
+            candidates.update(self._postings[word])
+        for _, query_word, _ in matches[1:]:
+            candidates = [
+                patient_id for patient_id in candidates
+                if any(query_word in w for w in self._documents[patient_id][0])
+            ]
+            if not candidates:
+                return []
+
+        def rank(patient_id):
+            words, sort_key = self._documents[patient_id]
+            score = 0
+            for _, query_word, _ in matches:
+                if query_word in words:
+                    score += EXACT
+                elif any(w.startswith(query_word) for w in words):
+                    score += PREFIX
+                else:
+                    score += SUBSTRING
+            return (score, sort_key)
+
+        if limit is None:
+            return sorted(candidates, key=rank)
+        return heapq.nsmallest(limit, candidates, key=rank)
+
+    def _matching_words(self, query_word):
+        """Mots du vocabulaire contenant query_word"""
+        if len(query_word) <= 3:
+            return list(self._ngrams.get(query_word, ()))
+
+        sets = sorted((self._ngrams.get(t, ()) for t in _trigrams(query_word)), key=len)
+        if not sets[0]:
+            return []
+        return [word for word in sets[0] if query_word in word and
+                all(word in other for other in sets[1:])]
@@ -0,0 +1,422 @@
+# -*- coding: utf-8 -*-
+"""
+File d'écriture différée (write-behind) pour la persistance du serveur MLLP.
+Les patients et messages reçus sont placés dans une file bornée; un thread
+d'écriture unique la vide par lots, chaque lot étant enregistré dans une
+seule transaction SQLite.
+
+Deux modes:
+    - commit-before-ack: submit() attend la validation du lot contenant
+      l'élément (l'ACK garantit la persistance, les écritures concurrentes
+      sont regroupées dans la même transaction);
+    - ack-then-commit: submit() rend la main dès que l'élément est mis en
+      file et ajouté à un journal sur disque (fichier JSON lignes, fsync à
+      chaque ajout) au lieu d'attendre la transaction. Le journal est vidé
+      chaque fois que la file a été entièrement écrite et rejoué par
+      start() après un crash: un message acquitté AA n'est pas perdu. Seul
+      un enregistrement dont l'écriture échoue encore après max_retries
+      nouvelles tentatives (base verrouillée, disque plein...) est
+      abandonné; chaque abandon est journalisé en ERROR (logger
+      HL7Messenger.MLLPServer.WriteBehind, donc dans le journal du serveur)
+      et compté dans `lost`.
+
+Quand la file est pleine, submit() attend au plus put_timeout secondes puis
+lève WriteBehindFull: le serveur renvoie alors un ACK d'erreur à l'émetteur.
+"""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from .database import (
+    DEFAULT_DB_PATH, Database, INSERT_MESSAGE, UPSERT_PATIENT, message_to_row, patient_to_row
+)
+
+COMMIT_BEFORE_ACK = "commit-before-ack"
+ACK_THEN_COMMIT = "ack-then-commit"
+MODES = (COMMIT_BEFORE_ACK, ACK_THEN_COMMIT)
+
+# Suffixe du journal ack-then-commit, à côté de la base par défaut
+JOURNAL_SUFFIX = ".writebehind.jsonl"
+
+# Enfant du logger du serveur: les erreurs atteignent le journal applicatif
+logger = logging.getLogger("HL7Messenger.MLLPServer.WriteBehind")
+
+
+class WriteBehindFull(Exception):
+    """La file d'écriture est pleine (contre-pression)"""
+
+
+def default_journal_path(db_path=DEFAULT_DB_PATH):
+    """
+    Renvoie le chemin du journal ack-then-commit associé à une base
+
+    Args:
+        db_path (str, optional): Chemin du fichier SQLite
+
+    Returns:
+        str: Chemin du journal
+    """
+    return os.path.splitext(str(db_path))[0] + JOURNAL_SUFFIX
+
+
+class _Pending:
+    """Élément en attente d'écriture"""
+
+    __slots__ = ("patient_row", "message_row", "done", "error", "cancelled", "claimed",
+                 "journaled", "finished")
+
+    def __init__(self, patient_row, message_row, wait):
+        self.patient_row = patient_row
+        self.message_row = message_row
+        self.done = threading.Event() if wait else None
+        self.error = None
+        self.cancelled = False   # Abandonné par submit() (délai dépassé, ACK AE)
+        self.claimed = False     # Pris par le thread d'écriture
+        self.journaled = False   # Ajouté au journal ack-then-commit
+        self.finished = False    # Écrit en base (ou abandonné) par le thread d'écriture
+
+    def finish(self, error=None):
+        self.error = error
+        if self.done is not None:
+            self.done.set()
+
+
+class WriteBehindQueue:
+    """File bornée vidée par lots par un thread d'écriture"""
+
+    def __init__(self, database=None, mode=COMMIT_BEFORE_ACK, max_size=10000,
+                 batch_size=500, put_timeout=5.0, commit_timeout=30.0,
+                 max_retries=3, retry_delay=0.5, journal_path=None):
+        """
+        Initialise la file (le thread d'écriture démarre au premier submit)
+
+        Args:
+            database (Database, optional): Base de données cible
+            mode (str, optional): COMMIT_BEFORE_ACK ou ACK_THEN_COMMIT
+            max_size (int, optional): Nombre maximum d'éléments en attente
+            batch_size (int, optional): Nombre maximum d'éléments par transaction
+            put_timeout (float, optional): Attente maximale quand la file est pleine
+            commit_timeout (float, optional): Attente maximale de la validation
+                en mode commit-before-ack
+            max_retries (int, optional): Nouvelles tentatives d'un enregistrement
+                après une erreur transitoire (sqlite3.OperationalError)
+            retry_delay (float, optional): Attente avant la première nouvelle
+                tentative, doublée à chaque essai
+            journal_path (str, optional): Journal des éléments acquittés non
+                encore écrits (ack-then-commit); à côté de la base par défaut
+
+        Raises:
+            ValueError: Mode inconnu, ou ack-then-commit sur une base en
+                mémoire sans journal_path
+        """
+        if mode not in MODES:
+            raise ValueError(f"Mode de persistance inconnu: {mode}")
+        self.db = database or Database()
+        self.journal_path = None
+        if mode == ACK_THEN_COMMIT:
+            if journal_path is None:
+                if self.db.db_path == ':memory:':
+                    raise ValueError("Le mode ack-then-commit exige un journal sur disque "
+                                     "(journal_path) pour une base en mémoire")
+                journal_path = default_journal_path(self.db.db_path)
+            self.journal_path = journal_path
+        self.mode = mode
+        self.batch_size = batch_size
+        self.put_timeout = put_timeout
+        self.commit_timeout = commit_timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue(maxsize=max_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._running = False
+        self._journal = None
+        self._journal_lock = threading.Lock()
+        self._journaled = 0  # Éléments du journal pas encore traités
+
+        # Statistiques
+        self.written = 0
+        self.batches = 0
+        self.failed = 0      # Enregistrements en échec (toutes tentatives)
+        self.retries = 0
+        self.lost = 0        # Échecs en ack-then-commit: messages acquittés perdus
+        self.rejected = 0
+        self.cancelled = 0   # Éléments abandonnés après commit_timeout, jamais écrits
+        self.replayed = 0    # Éléments rejoués depuis le journal au démarrage
+
+    def __len__(self):
+        """Nombre d'éléments en attente d'écriture"""
+        return self._queue.qsize()
+
+    def start(self):
+        """
+        Démarre le thread d'écriture s'il ne tourne pas déjà; en mode
+        ack-then-commit, écrit d'abord les éléments restés dans le journal
+        """
+        with self._lock:
+            if self._running:
+                return
+            if self.journal_path is not None:
+                self._open_journal()
+            self._running = True
+            self._thread = threading.Thread(
+                target=self._run, name="write-behind", daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, patient=None, message=None):
+        """
+        Place un patient et/ou un message dans la file d'écriture
+
+        Args:
+            patient (Patient, optional): Patient à enregistrer (upsert)
+            message (Message, optional): Message à enregistrer
+
+        Raises:
+            WriteBehindFull: Si la file est restée pleine pendant put_timeout
+            Exception: En mode commit-before-ack, l'erreur d'écriture éventuelle
+        """
+        if patient is None and message is None:
+            return
+        if not self._running:
+            self.start()
+
+        pending = _Pending(
+            patient_to_row(patient.to_dict()) if patient is not None else None,
+            message_to_row(message) if message is not None else None,
+            wait=self.mode == COMMIT_BEFORE_ACK
+        )
+        line = None
+        if self.journal_path is not None:
+            line = json.dumps({"patient": pending.patient_row, "message": pending.message_row},
+                              ensure_ascii=False).encode('utf-8') + b"\n"
+        self._put(pending)
+        if line is not None:
+            # Sur disque avant que l'appelant n'envoie l'ACK AA
+            self._append_journal(pending, line)
+
+        if pending.done is not None:
+            if not pending.done.wait(self.commit_timeout):
+                with self._lock:
+                    if not pending.claimed:
+                        # L'émetteur reçoit un AE et renverra le message: ne
+                        # jamais l'écrire (doublon et AA compté à tort)
+                        pending.cancelled = True
+                        self.cancelled += 1
+                        raise TimeoutError("Écriture en base non confirmée")
+                # Déjà en cours d'écriture: attendre son issue réelle
+                pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+
+    def flush(self, timeout=None):
+        """
+        Attend que tous les éléments déjà soumis soient écrits
+
+        Args:
+            timeout (float, optional): Attente maximale (secondes)
+
+        Returns:
+            bool: True si la file a été vidée à temps
+        """
+        if not self._running:
+            return self._queue.empty()
+        started = time.monotonic()
+        barrier = _Pending(None, None, wait=True)
+        try:
+            self._queue.put(barrier, timeout=timeout)
+        except queue.Full:
+            return False
+        if timeout is not None:
+            # Le temps passé à attendre une place compte dans le délai
+            timeout = max(0.0, timeout - (time.monotonic() - started))
+        return barrier.done.wait(timeout)
+
+    def close(self, timeout=10.0):
+        """
+        Écrit les éléments restants puis arrête le thread d'écriture
+
+        Args:
+            timeout (float, optional): Attente maximale (secondes)
+        """
+        if not self._running:
+            return
+        self.flush(timeout)
+        with self._lock:
+            self._running = False
+        try:
+            # Hors verrou: le thread d'écriture en a besoin pour vider la file
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            logger.warning(f"Arrêt de l'écriture différée: {len(self)} éléments non écrits")
+            return
+        self._thread.join(timeout)
+        with self._journal_lock:
+            if self._journal is not None:
+                # Conservé s'il reste des éléments: rejoué au prochain start()
+                self._journal.close()
+                self._journal = None
+
+    def _open_journal(self):
+        """Rejoue le journal laissé par un arrêt brutal puis le rouvre vide"""
+        patients, messages = [], []
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'rb') as journal:
+                for line in journal:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Dernière ligne tronquée par le crash: jamais acquittée
+                        continue
+                    if entry.get("patient"):
+                        patients.append(tuple(entry["patient"]))
+                    if entry.get("message"):
+                        messages.append(tuple(entry["message"]))
+        if patients or messages:
+            # Rejouer un élément déjà écrit est sans effet (upsert, INSERT OR REPLACE)
+            with self.db.connect() as conn:
+                if patients:
+                    conn.executemany(UPSERT_PATIENT, patients)
+                if messages:
+                    conn.executemany(INSERT_MESSAGE, messages)
+            self.replayed += max(len(patients), len(messages))
+            logger.warning(f"Journal d'écriture différée rejoué: {len(patients)} patients, "
+                           f"{len(messages)} messages ({self.journal_path})")
+
+        directory = os.path.dirname(self.journal_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._journal = open(self.journal_path, 'wb')
+        os.fsync(self._journal.fileno())
+        self._journaled = 0
+
+    def _append_journal(self, pending, line):
+        """Ajoute un élément au journal (fsync) s'il n'est pas déjà écrit en base"""
+        with self._journal_lock:
+            if pending.finished or self._journal is None:
+                return
+            self._journal.write(line)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            pending.journaled = True
+            self._journaled += 1
+
+    def _release_journal(self, batch):
+        """Marque un lot comme traité; vide le journal quand plus rien n'y est en attente"""
+        with self._journal_lock:
+            for pending in batch:
+                pending.finished = True
+                if pending.journaled:
+                    self._journaled -= 1
+            if self._journal is not None and self._journaled == 0 and self._journal.tell():
+                self._journal.seek(0)
+                self._journal.truncate()
+                os.fsync(self._journal.fileno())
+
+    def _put(self, pending):
+        try:
+            self._queue.put_nowait(pending)
+        except queue.Full:
+            try:
+                self._queue.put(pending, timeout=self.put_timeout)
+            except queue.Full:
+                with self._lock:
+                    self.rejected += 1
+                raise WriteBehindFull(
+                    f"File d'écriture pleine ({self._queue.maxsize} éléments en attente)"
+                )
+
+    def _run(self):
+        """Boucle du thread d'écriture"""
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                batch = [item]
+                stop = False
+                # Regrouper tout ce qui est déjà en attente (sans attendre)
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                        break
+                    batch.append(item)
+                with self._lock:
+                    # Ignorer les éléments abandonnés par submit()
+                    batch = [p for p in batch if not p.cancelled]
+                    for pending in batch:
+                        pending.claimed = True
+                if batch:
+                    self._write_batch(batch)
+                if stop:
+                    break
+        finally:
+            self.db.close()
+
+    def _write_batch(self, batch):
+        """Écrit un lot dans une transaction, ligne par ligne en cas d'échec"""
+        items = [p for p in batch if p.patient_row or p.message_row]
+        try:
+            conn = self.db.connect()
+            with conn:
+                patients = [p.patient_row for p in items if p.patient_row]
+                messages = [p.message_row for p in items if p.message_row]
+                if patients:
+                    conn.executemany(UPSERT_PATIENT, patients)
+                if messages:
+                    conn.executemany(INSERT_MESSAGE, messages)
+            self.written += len(items)
+            self.batches += 1
+            errors = [None] * len(batch)
+        except Exception:
+            # Isoler le ou les éléments fautifs sans perdre le reste du lot
+            errors = [self._write_one(pending) for pending in batch]
+        if self.journal_path is not None:
+            # Avant de signaler la fin: flush() attend aussi le journal vidé
+            self._release_journal(batch)
+        for pending, error in zip(batch, errors):
+            pending.finish(error)
+
+    def _write_one(self, pending):
+        if not (pending.patient_row or pending.message_row):
+            return None
+        delay = self.retry_delay
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.db.connect() as conn:
+                    if pending.patient_row:
+                        conn.execute(UPSERT_PATIENT, pending.patient_row)
+                    if pending.message_row:
+                        conn.execute(INSERT_MESSAGE, pending.message_row)
+                self.written += 1
+                return None
+            except sqlite3.OperationalError as e:
+                # Erreur transitoire probable (base verrouillée, disque plein)
+                if attempt == self.max_retries:
+                    return self._record_failure(pending, e)
+                self.retries += 1
+                logger.warning(f"Écriture différée: nouvelle tentative dans {delay:.1f}s ({e})")
+                time.sleep(delay)
+                delay *= 2
+            except Exception as e:
+                return self._record_failure(pending, e)
+
+    def _record_failure(self, pending, error):
+        """Journalise et compte un enregistrement abandonné"""
+        self.failed += 1
+        message_id = pending.message_row[0] if pending.message_row else None
+        if pending.done is None:
+            # ack-then-commit: l'émetteur a déjà reçu un ACK AA
+            self.lost += 1
+            logger.error(f"Message acquitté perdu (id={message_id}): {error}")
+        else:
+            logger.warning(f"Écriture différée en échec (id={message_id}): {error}")
+        return error
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Parser ER7 natif et paresseux pour les messages HL7 v2.
+Contrairement à hl7apy, aucun arbre d'objets n'est construit: les segments,
+champs et composants ne sont découpés qu'au moment où ils sont lus.
+Les caractères d'encodage sont lus dans MSH-1/MSH-2 et les séquences
+d'échappement (\\F\\, \\S\\, \\T\\, \\R\\, \\E\\, \\Xhh\\) sont décodées
+à la lecture des composants.
+
+Accès:
+    msg = parse_er7(raw)
+    msg.msh_9          # champ brut MSH-9, ex: "ADT^A01"
+    msg.pid_5_2        # composant PID-5.2 décodé, ex: "JOHN"
+    msg.value("PID-3") # équivalent à msg.pid_3
+"""
+import re
+
+
+class ER7ParseError(ValueError):
+    """Message ER7 invalide (segment MSH absent ou mal formé)"""
+
+
+class EncodingCharacters:
+    """Séparateurs et caractère d'échappement d'un message"""
+
+    __slots__ = ("field", "component", "repetition", "escape", "subcomponent")
+
+    def __init__(self, field="|", component="^", repetition="~", escape="\\", subcomponent="&"):
+        self.field = field
+        self.component = component
+        self.repetition = repetition
+        self.escape = escape
+        self.subcomponent = subcomponent
+
+    @classmethod
+    def from_msh(cls, msh):
+        """
+        Lit les caractères d'encodage dans un segment MSH brut
+
+        Args:
+            msh (str): Segment MSH
+
+        Returns:
+            EncodingCharacters: Caractères d'encodage du message
+        """
+        if len(msh) < 4:
+            raise ER7ParseError("Segment MSH trop court")
+        field = msh[3]
+        end = msh.find(field, 4)
+        declared = msh[4:end] if end >= 0 else msh[4:]
+        defaults = "^~\\&"
+        chars = [declared[i] if i < len(declared) else defaults[i] for i in range(4)]
+        return cls(field, *chars)
+
+
+DEFAULT_ENCODING = EncodingCharacters()
+
+_HEX_ESCAPE = re.compile(r"^X([0-9A-Fa-f]{2})+$")
+
+
+def unescape(value, encoding=DEFAULT_ENCODING):
+    """
+    Décode les séquences d'échappement HL7 d'une valeur
+
+    Args:
+        value (str): Valeur brute
+        encoding (EncodingCharacters, optional): Caractères d'encodage
+
+    Returns:
+        str: Valeur décodée
+    """
+    esc = encoding.escape
+    if esc not in value:
+        return value
+
+    replacements = {
+        "F": encoding.field,
+        "S": encoding.component,
+        "T": encoding.subcomponent,
+        "R": encoding.repetition,
+        "E": esc,
+    }
+    parts = value.split(esc)
+    # parts[0] est hors séquence, puis alternance séquence / texte
+    result = [parts[0]]
+    i = 1
+    while i < len(parts):
+        if i + 1 >= len(parts):
+            # Caractère d'échappement orphelin: conservé tel quel
+            result.append(esc + parts[i])
+            break
+        code = parts[i]
+        if code in replacements:
+            result.append(replacements[code])
+        elif _HEX_ESCAPE.match(code):
+            result.append(bytes.fromhex(code[1:]).decode("latin-1"))
+        elif code in (".br", "H", "N"):
+            result.append("\n" if code == ".br" else "")
+        else:
+            result.append(esc + code + esc)
+        result.append(parts[i + 1])
+        i += 2
+    return "".join(result)
+
+
+_ESCAPE_CHARS = frozenset("|^~\\&\r\n")
+
+
+def escape(value, encoding=DEFAULT_ENCODING):
+    """
+    Échappe les caractères réservés d'une donnée utilisateur
+
+    Args:
+        value (str): Valeur à insérer dans un champ ou un composant
+        encoding (EncodingCharacters, optional): Caractères d'encodage
+
+    Returns:
+        str: Valeur échappée
+    """
+    if encoding is DEFAULT_ENCODING and _ESCAPE_CHARS.isdisjoint(value):
+        return value
+    esc = encoding.escape
+    value = value.replace(esc, f"{esc}E{esc}")
+    for char, code in ((encoding.field, "F"), (encoding.component, "S"),
+                       (encoding.subcomponent, "T"), (encoding.repetition, "R")):
+        value = value.replace(char, f"{esc}{code}{esc}")
+    return value.replace("\r", f"{esc}X0D{esc}").replace("\n", f"{esc}X0A{esc}")
+
+
+class ER7Segment:
+    """Segment ER7 découpé à la demande"""
+
+    __slots__ = ("raw", "name", "encoding", "_fields")
+
+    def __init__(self, raw, encoding=DEFAULT_ENCODING):
+        self.raw = raw
+        self.name = raw[:3]
+        self.encoding = encoding
+        self._fields = None
+
+    def _split(self):
+        fields = self.raw.split(self.encoding.field)
+        if self.name == "MSH":
+            # MSH-1 est le séparateur lui-même: décaler la numérotation
+            fields.insert(1, self.encoding.field)
+        self._fields = fields
+        return fields
+
+    def field(self, index):
+        """
+        Renvoie la valeur brute (non décodée) d'un champ
+
+        Args:
+            index (int): Numéro du champ (numérotation HL7, 1 = premier champ)
+
+        Returns:
+            str: Valeur brute, chaîne vide si absente
+        """
+        fields = self._fields or self._split()
+        return fields[index] if 0 < index < len(fields) else ""
+
+    def component(self, index, component=1, repetition=1):
+        """
+        Renvoie un composant décodé d'un champ
+
+        Args:
+            index (int): Numéro du champ
+            component (int, optional): Numéro du composant
+            repetition (int, optional): Numéro de la répétition
+
+        Returns:
+            str: Valeur décodée, chaîne vide si absente
+        """
+        value = self.field(index)
+        if not value or (self.name == "MSH" and index <= 2):
+            return value
+        enc = self.encoding
+        if enc.repetition in value:
+            reps = value.split(enc.repetition)
+            value = reps[repetition - 1] if repetition <= len(reps) else ""
+        elif repetition > 1:
+            return ""
+        comps = value.split(enc.component)
+        value = comps[component - 1] if component <= len(comps) else ""
+        return unescape(value, enc)
+
+    def __len__(self):
+        fields = self._fields or self._split()
+        return len(fields) - 1
+
+    def __str__(self):
+        return self.raw
+
+
+class ER7Message:
+    """Vue légère sur un message ER7"""
+
+    def __init__(self, raw):
+        """
+        Initialise la vue sur le message
+
+        Args:
+            raw (str): Message ER7 brut (éventuellement encadré MLLP)
+
+        Raises:
+            ER7ParseError: Si aucun segment MSH n'est trouvé
+        """
+        raw = raw.strip("\x0b\x1c\r\n")
+        start = raw.find("MSH")
+        if start < 0:
+            raise ER7ParseError("Message HL7 invalide: pas de segment MSH")
+        self.raw = raw
+        self.encoding = EncodingCharacters.from_msh(raw[start:start + 9])
+        self._segments = None
+        self._index = None
+
+    @property
+    def segments(self):
+        """Liste de tous les segments, découpée au premier accès"""
+        if self._segments is None:
+            raw = self.raw
+            if "\n" in raw:
+                raw = raw.replace("\r\n", "\r").replace("\n", "\r")
+            enc = self.encoding
+            self._segments = [ER7Segment(s, enc) for s in raw.split("\r") if s]
+        return self._segments
+
+    def _segment_index(self):
+        if self._index is None:
+            index = {}
+            for segment in self.segments:
+                index.setdefault(segment.name, []).append(segment)
+            self._index = index
+        return self._index
+
+    def segment(self, name):
+        """
+        Renvoie le premier segment portant ce nom
+
+        Args:
+            name (str): Nom du segment (ex: 'PID')
+
+        Returns:
+            ER7Segment: Segment trouvé ou None
+        """
+        found = self._segment_index().get(name)
+        return found[0] if found else None
+
+    def get_segments(self, name):
+        """Renvoie tous les segments portant ce nom (ex: tous les OBX)"""
+        return self._segment_index().get(name, [])
+
+    def value(self, path):
+        """
+        Renvoie une valeur à partir d'un chemin 'SEG-champ[-composant]'
+
+        Args:
+            path (str): Chemin, ex: 'MSH-9', 'PID-5-1'
+
+        Returns:
+            str: Champ brut (sans composant) ou composant décodé,
+                chaîne vide si absent
+        """
+        parts = path.replace(".", "-").split("-")
+        segment = self.segment(parts[0].upper())
+        if segment is None:
+            return ""
+        if len(parts) == 2:
+            return segment.field(int(parts[1]))
+        return segment.component(int(parts[1]), int(parts[2]))
+
+    @property
+    def message_type(self):
+        """MSH-9 brut (ex: 'ADT^A01')"""
+        return self.value("MSH-9")
+
+    @property
+    def control_id(self):
+        """MSH-10 (ID de contrôle)"""
+        return self.value("MSH-10")
+
+    def __getattr__(self, name):
+        # Accesseurs de type msh_9 / pid_5_2
+        parts = name.split("_")
+        if len(parts) in (2, 3) and len(parts[0]) == 3 and all(p.isdigit() for p in parts[1:]):
+            return self.value("-".join(parts))
+        raise AttributeError(name)
+
+    def __str__(self):
+        return self.raw
+
+
+def parse_er7(raw_message):
+    """
+    Parse un message ER7 sans dépendance externe
+
+    Args:
+        raw_message (str or bytes): Message HL7 brut
+
+    Returns:
+        ER7Message: Vue paresseuse sur le message
+
+    Raises:
+        ER7ParseError: Si le message ne contient pas de segment MSH
+    """
+    if isinstance(raw_message, bytes):
+        raw_message = raw_message.decode("utf-8", errors="replace")
+    return ER7Message(raw_message)
@@ -3,14 +3,24 @@
 Parser pour les messages HL7.
 """
 from hl7apy import parser
+from hl7apy.consts import VALIDATION_LEVEL
 import logging
 
-def parse_hl7_message(raw_message):
+# Validation tolérante par défaut, comme le reste du moteur: les messages
+# réels dépassent souvent les longueurs maximales ou ajoutent des champs
+# au-delà de la norme 2.5, que la validation stricte rejette.
+# (L'ancienne valeur 0 n'est pas un niveau connu de hl7apy, qui levait
+# UnknownValidationLevel: tous les messages étaient alors refusés.)
+DEFAULT_VALIDATION_LEVEL = VALIDATION_LEVEL.TOLERANT
+
+def parse_hl7_message(raw_message, validation_level=DEFAULT_VALIDATION_LEVEL):
     """
     Parse un message HL7 brut
     
     Args:
         raw_message (str): Message HL7 brut
+        validation_level (int, optional): VALIDATION_LEVEL.TOLERANT (défaut)
+            ou VALIDATION_LEVEL.STRICT (longueurs et champs de la norme)
     
     Returns:
         Message or None: Message HL7 parsé ou None en cas d'erreur
@@ -25,7 +35,7 @@ def parse_hl7_message(raw_message):
             raw_message = raw_message[:-2]
         
         # Parser le message
-        parsed = parser.parse_message(raw_message, validation_level=0)
+        parsed = parser.parse_message(raw_message, validation_level=validation_level)
         logger.info(f"Message parsé avec succès: {parsed.msh.msh_9.value}")
         return parsed
         
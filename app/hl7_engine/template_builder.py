@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+Constructeur de messages HL7 par gabarits précompilés.
+Même interface que HL7MessageBuilder, mais les segments sont produits
+directement en ER7 à partir de gabarits compilés une seule fois, sans
+construire d'arbre hl7apy. Les segments générés sont identiques octet par
+octet à ceux de HL7MessageBuilder; les données utilisateur sont en plus
+échappées (|^~\\& et retours à la ligne).
+"""
+from datetime import datetime
+import uuid
+import logging
+
+from app.hl7_engine.er7 import escape
+
+
+def _compile_segment(name, fields):
+    """
+    Compile un gabarit de segment en chaîne de format
+
+    Args:
+        name (str): Nom du segment
+        fields (dict): {numéro de champ: valeur fixe ou '{nom}' à substituer}
+
+    Returns:
+        str: Gabarit utilisable avec str.format
+    """
+    values = [""] * (max(fields) + 1)
+    values[0] = name
+    for index, value in fields.items():
+        values[index] = value
+    return "|".join(values)
+
+
+# Gabarits précompilés (un champ présent = champ renseigné par HL7MessageBuilder)
+MSH_TEMPLATE = "MSH|^~\\&|{sending_app}|{sending_facility}|{receiving_app}|{receiving_facility}|{timestamp}||{message_type}|{control_id}|P|2.5"
+EVN_TEMPLATE = _compile_segment("EVN", {2: "{timestamp}"})
+ADT_PID_TEMPLATE = _compile_segment("PID", {1: "1", 3: "{id}", 5: "{name}", 7: "{birth_date}", 8: "{gender}"})
+PV1_TEMPLATE = _compile_segment("PV1", {1: "1", 2: "I", 3: "{location}", 44: "{timestamp}"})
+PID_TEMPLATE = _compile_segment("PID", {1: "1", 3: "{id}"})
+ORU_OBR_TEMPLATE = _compile_segment("OBR", {1: "{set_id}", 2: "{order_id}", 3: "{filler_id}",
+                                            4: "{test}", 7: "{timestamp}"})
+OBX_TEMPLATE = _compile_segment("OBX", {1: "{set_id}", 2: "{value_type}", 3: "{code}", 5: "{value}",
+                                        6: "{unit}", 7: "{reference_range}", 8: "{abnormal_flag}",
+                                        11: "F", 14: "{timestamp}"})
+ORC_TEMPLATE = _compile_segment("ORC", {1: "NW", 2: "{order_id}", 9: "{timestamp}"})
+ORM_OBR_TEMPLATE = _compile_segment("OBR", {1: "1", 2: "{order_id}", 4: "{test}", 7: "{timestamp}"})
+ORM_OBR_SCHEDULED_TEMPLATE = _compile_segment("OBR", {1: "1", 2: "{order_id}", 4: "{test}",
+                                                      7: "{timestamp}", 36: "{scheduled_date}"})
+NTE_TEMPLATE = _compile_segment("NTE", {1: "1", 3: "{comment}"})
+
+
+def _value(value):
+    """Échappe une donnée utilisateur (None devient une chaîne vide)"""
+    if value is None:
+        return ""
+    return escape(value if isinstance(value, str) else str(value))
+
+
+def _components(*values):
+    """Assemble des composants échappés, sans composants vides en fin de champ"""
+    return "^".join(_value(v) for v in values).rstrip("^")
+
+
+class TemplateMessageBuilder:
+    """Construit des messages HL7 sortants directement en ER7"""
+
+    def __init__(self, sending_app="HL7MESSENGER", sending_facility="HOSPITAL"):
+        self.logger = logging.getLogger("HL7Messenger.MessageBuilder")
+        self.sending_app = sending_app
+        self.sending_facility = sending_facility
+
+    def _get_timestamp(self):
+        return datetime.now().strftime("%Y%m%d%H%M%S")
+
+    def _get_control_id(self):
+        return str(uuid.uuid4())[:20]
+
+    def _msh(self, message_type, control_id, timestamp, receiving_app, receiving_facility):
+        return MSH_TEMPLATE.format(
+            sending_app=_value(self.sending_app),
+            sending_facility=_value(self.sending_facility),
+            receiving_app=_value(receiving_app),
+            receiving_facility=_value(receiving_facility),
+            timestamp=timestamp,
+            message_type=message_type,
+            control_id=control_id
+        )
+
+    def create_adt_a01(self, patient_data, receiving_app="ADT", receiving_facility="HOSPITAL"):
+        self.logger.info(f"Création d'un message ADT^A01 pour le patient {patient_data.get('id', 'INCONNU')}")
+        control_id = self._get_control_id()
+        timestamp = self._get_timestamp()
+        segments = [
+            self._msh("ADT^A01", control_id, timestamp, receiving_app, receiving_facility),
+            EVN_TEMPLATE.format(timestamp=timestamp),
+            ADT_PID_TEMPLATE.format(
+                id=_value(patient_data.get("id", "")),
+                name=_components(patient_data.get("last_name", ""), patient_data.get("first_name", "")),
+                birth_date=_value(patient_data.get("birth_date", "")),
+                gender=_value(patient_data.get("gender", ""))
+            ),
+            PV1_TEMPLATE.format(
+                location=_components(patient_data.get("ward", ""), patient_data.get("room", "")),
+                timestamp=timestamp
+            ),
+        ]
+        self.logger.info(f"Message ADT^A01 créé avec ID de contrôle {control_id}")
+        return "\r".join(segments), control_id
+
+    def create_oru_r01(self, patient_id, results_data, receiving_app="LAB", receiving_facility="HOSPITAL"):
+        self.logger.info(f"Création d'un message ORU^R01 pour le patient {patient_id}")
+        control_id = self._get_control_id()
+        timestamp = self._get_timestamp()
+        segments = [
+            self._msh("ORU^R01", control_id, timestamp, receiving_app, receiving_facility),
+            PID_TEMPLATE.format(id=_value(patient_id)),
+        ]
+        append = segments.append
+        for result_index, result in enumerate(results_data, 1):
+            append(ORU_OBR_TEMPLATE.format(
+                set_id=result_index,
+                order_id=_value(result.get("order_id", "")),
+                filler_id=_value(result.get("filler_id", "")),
+                test=_components(result.get("test_code", ""), result.get("test_name", "")),
+                timestamp=timestamp
+            ))
+            for obx_index, test_result in enumerate(result.get("results", []), 1):
+                append(OBX_TEMPLATE.format(
+                    set_id=obx_index,
+                    value_type=_value(test_result.get("type", "NM")),
+                    code=_components(test_result.get("code", ""), test_result.get("name", "")),
+                    value=_value(test_result.get("value", "")),
+                    unit=_value(test_result.get("unit", "")),
+                    reference_range=_value(test_result.get("reference_range", "")),
+                    abnormal_flag=_value(test_result.get("abnormal_flag", "")),
+                    timestamp=timestamp
+                ))
+        self.logger.info(f"Message ORU^R01 créé avec ID de contrôle {control_id}")
+        return "\r".join(segments), control_id
+
+    def create_orm_o01(self, patient_id, order_data, receiving_app="ORDER", receiving_facility="HOSPITAL"):
+        self.logger.info(f"Création d'un message ORM^O01 pour le patient {patient_id}")
+        control_id = self._get_control_id()
+        timestamp = self._get_timestamp()
+        order_id = order_data["order_id"] if "order_id" in order_data else self._get_control_id()
+        test = _components(order_data.get("test_code", ""), order_data.get("test_name", ""))
+        segments = [
+            self._msh("ORM^O01", control_id, timestamp, receiving_app, receiving_facility),
+            PID_TEMPLATE.format(id=_value(patient_id)),
+            ORC_TEMPLATE.format(order_id=_value(order_id), timestamp=timestamp),
+        ]
+        if "scheduled_date" in order_data:
+            segments.append(ORM_OBR_SCHEDULED_TEMPLATE.format(
+                order_id=_value(order_data.get("order_id", "")), test=test, timestamp=timestamp,
+                scheduled_date=_value(order_data.get("scheduled_date", ""))
+            ))
+        else:
+            segments.append(ORM_OBR_TEMPLATE.format(
+                order_id=_value(order_data.get("order_id", "")), test=test, timestamp=timestamp
+            ))
+        if "comments" in order_data and order_data["comments"]:
+            segments.append(NTE_TEMPLATE.format(comment=_value(order_data["comments"])))
+        self.logger.info(f"Message ORM^O01 créé avec ID de contrôle {control_id}")
+        return "\r".join(segments), control_id
@@ -5,7 +5,7 @@ import uuid
 class Message:
     """Représentation d'un message HL7 dans le système"""
     def __init__(self, message_type=None, content=None, source=None, 
-                 destination=None, patient_id=None, status="PENDING", id=None):
+                 destination=None, patient_id=None, status="PENDING", id=None, ack_code=None):
         """
         Initialise un message HL7
         Args:
@@ -16,6 +16,7 @@ class Message:
             patient_id (str, optional): ID du patient concerné
             status (str, optional): Statut du message
             id (str, optional): ID unique du message
+            ack_code (str, optional): Code de l'ACK renvoyé (AA, AE, AR)
         """
         self.id = id or str(uuid.uuid4())
         self.message_type = message_type
@@ -24,6 +25,7 @@ class Message:
         self.destination = destination
         self.patient_id = patient_id
         self.status = status
+        self.ack_code = ack_code
         self.created_at = datetime.now().isoformat()
     def to_dict(self):
         """
@@ -39,6 +41,7 @@ class Message:
             'destination': self.destination,
             'patient_id': self.patient_id,
             'status': self.status,
+            'ack_code': self.ack_code,
             'created_at': self.created_at
         }
     @classmethod
@@ -57,7 +60,8 @@ class Message:
             destination=data.get('destination'),
             patient_id=data.get('patient_id'),
             status=data.get('status'),
-            id=data.get('id')
+            id=data.get('id'),
+            ack_code=data.get('ack_code')
         )
         if 'created_at' in data:
             message.created_at = data['created_at']
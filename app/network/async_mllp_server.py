@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+Serveur MLLP basé sur asyncio.
+Toutes les connexions sont gérées dans une seule boucle d'événements au lieu
+d'un thread par connexion, ce qui permet de maintenir des milliers de flux
+persistants. Le traitement des messages (handle_message) est identique à
+celui de MLLPServer et s'exécute dans un pool de threads borné.
+"""
+import asyncio
+import socket
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.network.mllp_framing import DEFAULT_MAX_FRAME_SIZE, MLLPFrameDecoder, MLLPFrameError
+from app.network.mllp_server import MLLPServer
+from app.network.processing_pool import Overloaded
+from app.utils.tracing import NULL_TRACE
+
+
+class AsyncMLLPServer(MLLPServer):
+    """Serveur MLLP asynchrone partageant la logique de traitement de MLLPServer"""
+
+    def __init__(self, host="0.0.0.0", port=2575, backlog=socket.SOMAXCONN, timeout=30,
+                 max_workers=None, max_message_size=DEFAULT_MAX_FRAME_SIZE, persistence="sync",
+                 reuse_port=False, pool_size=None, max_in_flight=256, max_per_source=None,
+                 lanes=None, log_level="INFO", payload_sample_every=100,
+                 metrics_port=None, metrics_host="127.0.0.1", trace_file=None,
+                 rate_limits=None, timeouts=None, write_behind_journal=None):
+        """
+        Initialise le serveur MLLP asynchrone
+
+        Args:
+            host (str): Host d'écoute
+            port (int): Port d'écoute
+            backlog (int, optional): Taille de la file d'attente des connexions
+            timeout (int, optional): Délai par défaut (voir MLLPServer)
+            max_workers (int, optional): Nombre de threads pour handle_message
+            max_message_size (int, optional): Taille maximale d'un message (octets)
+            persistence (str, optional): Mode de persistance (voir MLLPServer)
+            reuse_port (bool, optional): Activer SO_REUSEPORT
+            pool_size (int, optional): Threads du pool borné (voir MLLPServer)
+            max_in_flight (int, optional): Limite globale de messages en cours
+            max_per_source (int, optional): Limite de messages en cours par source
+            lanes (int, optional): Nombre de files ordonnées par patient
+            log_level (str, optional): Niveau du journal par message
+            payload_sample_every (int, optional): Contenu journalisé pour un message sur N
+            metrics_port (int, optional): Port HTTP de l'endpoint /metrics
+            metrics_host (str, optional): Adresse de l'endpoint /metrics
+            trace_file (str, optional): Fichier tournant des traces par message
+            rate_limits (dict, optional): Limites de connexions et de messages par IP
+            timeouts (dict, optional): Délais {"read", "idle", "write"} (secondes)
+            write_behind_journal (str, optional): Journal ack-then-commit (voir MLLPServer)
+        """
+        super().__init__(host, port, backlog=backlog, timeout=timeout,
+                         max_message_size=max_message_size, persistence=persistence,
+                         reuse_port=reuse_port, pool_size=pool_size,
+                         max_in_flight=max_in_flight, max_per_source=max_per_source,
+                         lanes=lanes, log_level=log_level,
+                         payload_sample_every=payload_sample_every,
+                         metrics_port=metrics_port, metrics_host=metrics_host,
+                         trace_file=trace_file, rate_limits=rate_limits,
+                         timeouts=timeouts, write_behind_journal=write_behind_journal)
+        self.max_workers = max_workers
+        self._loop = None
+        self._server = None
+        self._executor = None
+        self._writers = set()
+        self._tarpit_held = 0
+
+    def start(self):
+        """
+        Démarre le serveur et bloque jusqu'à son arrêt
+
+        Returns:
+            bool: True si le serveur s'est arrêté proprement, False sinon
+        """
+        try:
+            print("🚀 Démarrage du serveur HL7 (asyncio)...")
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("\n🛑 Arrêt demandé par l'utilisateur...")
+        except OSError as e:
+            print(f"❌ Erreur de binding: {e}")
+            return False
+        except Exception as e:
+            print(f"❌ Erreur fatale du serveur: {str(e)}")
+            traceback.print_exc()
+            return False
+        finally:
+            self._cleanup()
+
+        return True
+
+    async def serve(self):
+        """Coroutine principale: écoute et sert les connexions jusqu'à l'arrêt"""
+        self._loop = asyncio.get_running_loop()
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix="mllp-handler"
+        )
+
+        try:
+            self._server = await asyncio.start_server(
+                self._handle_connection,
+                self.host,
+                self.port,
+                backlog=self.backlog,
+                reuse_address=True,
+                reuse_port=self.reuse_port or None
+            )
+            self.running = True
+
+            print("=" * 60)
+            print(f"🎉 SERVEUR HL7 (ASYNCIO) DÉMARRÉ AVEC SUCCÈS!")
+            print(f"🌐 Écoute sur {self.host}:{self.port} (backlog {self.backlog})")
+            print(f"⏰ Démarré le {datetime.now().strftime('%d/%m/%Y à %H:%M:%S')}")
+            print("=" * 60)
+            self.logger.info(f"Serveur MLLP asyncio démarré sur {self.host}:{self.port}")
+            self._start_metrics_endpoint()
+            # Délais de toutes les connexions: un tic de la roue dans la boucle
+            self.timer_wheel.run_in_loop(self._loop)
+
+            async with self._server:
+                try:
+                    await self._server.serve_forever()
+                except asyncio.CancelledError:
+                    pass
+        finally:
+            self.running = False
+            self.timer_wheel.stop()
+            self._executor.shutdown(wait=False)
+
+    async def _handle_connection(self, reader, writer):
+        """
+        Gère une connexion client: lit les trames MLLP et renvoie les ACK
+
+        Args:
+            reader (asyncio.StreamReader): Flux de lecture
+            writer (asyncio.StreamWriter): Flux d'écriture
+        """
+        client_address = writer.get_extra_info("peername")[:2]
+        if not self._admit_connection(client_address):
+            # Tarpit: la connexion reste ouverte sans être lue, puis est fermée
+            # par la boucle (aucune coroutine ni décodeur n'est conservé)
+            if self.tarpit.delay > 0 and self._tarpit_held < self.tarpit.max_held:
+                self._tarpit_held += 1
+                self._loop.call_later(self.tarpit.delay, self._release_tarpit, writer)
+            else:
+                writer.close()
+            return
+        client_id = f"{client_address[0]}:{client_address[1]}"
+        self.clients_connected += 1
+        self.connections_open += 1
+        self._writers.add(writer)
+        self.logger.info(f"Nouvelle connexion #{self.clients_connected} depuis {client_id}")
+
+        decoder = MLLPFrameDecoder(self.max_message_size)
+        # Aucun timer ni tâche par lecture: à l'expiration, la roue coupe le
+        # transport et la lecture (ou l'écriture) en cours se termine
+        deadline = self._connection_deadline(lambda kind: writer.transport.abort())
+
+        try:
+            deadline.received(0)
+            while self.running:
+                data = await reader.read(65536)
+                if not data:
+                    # Fermeture par le client
+                    break
+                received_at = time.perf_counter()
+                self._bytes_received.inc(amount=len(data))
+
+                try:
+                    frames = decoder.feed(data)
+                except MLLPFrameError as e:
+                    self.logger.error(f"Trame rejetée de {client_id}: {str(e)}")
+                    writer.write(self._frame_response(self.create_error_ack(str(e))))
+                    await writer.drain()
+                    break
+
+                if frames:
+                    # Durée de décodage répartie entre les trames de cette lecture
+                    decode_time = (time.perf_counter() - received_at) / len(frames)
+
+                for raw_message in frames:
+                    message = raw_message.decode('utf-8', errors='replace')
+
+                    self.messages_received += 1
+                    self._log_received_message(message, client_id)
+                    trace = self.tracer.begin(source=client_id)
+                    trace.add("decode", decode_time)
+
+                    deadline.processing()
+                    response = await self._dispatch_async(message, client_address, trace)
+                    writer.write(response)
+                    self._bytes_sent.inc(amount=len(response))
+                    self._ack_latency.observe(time.perf_counter() - received_at)
+                    self.tracer.finish(trace)
+                if frames:
+                    deadline.writing()
+                await writer.drain()
+                deadline.received(len(decoder), len(frames))
+
+        except (ConnectionError, OSError) as e:
+            if deadline.expired is None:
+                self.logger.error(f"Erreur client {client_id}: {str(e)}")
+        finally:
+            deadline.cancel()
+            self._log_timeout(deadline, client_id)
+            self.connections_open -= 1
+            self._writers.discard(writer)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    def _release_tarpit(self, writer):
+        """Ferme une connexion retenue par le tarpit"""
+        self._tarpit_held -= 1
+        writer.close()
+
+    async def _dispatch_async(self, message, client_address, trace=NULL_TRACE):
+        """
+        Traite un message hors de la boucle: pool borné ou files patients
+        s'ils sont configurés, sinon pool de threads de la boucle
+
+        Args:
+            message (str): Message HL7 reçu
+            client_address (tuple): Adresse du client
+            trace (Trace, optional): Trace du message
+
+        Returns:
+            bytes: Trame MLLP de l'ACK
+        """
+        rejection = self._admit_message(message, client_address)
+        if rejection is not None:
+            return rejection
+        try:
+            future = self._submit(message, client_address, trace)
+        except Overloaded as e:
+            return self._reject(message, str(e))
+        if future is None:
+            # Le traitement (accès base de données) reste synchrone
+            return await self._loop.run_in_executor(
+                self._executor, self._process_frame, message, client_address, trace
+            )
+        return await asyncio.wrap_future(future)
+
+    def stop(self):
+        """Arrête le serveur proprement (appelable depuis un autre thread)"""
+        print("\n🛑 Arrêt du serveur en cours...")
+        self.running = False
+        if self._loop and self._server:
+            self._loop.call_soon_threadsafe(self._close_all)
+
+    def _close_all(self):
+        """Ferme l'écoute et toutes les connexions ouvertes (dans la boucle)"""
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
@@ -5,17 +5,180 @@ Implémentation du protocole MLLP (Minimal Lower Layer Protocol) pour HL7.
 """
 import socket
 import logging
+import threading
+import time
+from collections import OrderedDict, deque
 from datetime import datetime
 
+from app.network.mllp_framing import MLLPFrameDecoder, encode_frame
+
+
+class _ConnectionClosed(Exception):
+    """Le serveur a fermé la connexion avant d'envoyer un ACK"""
+
+
+class _NothingSent(Exception):
+    """L'envoi a échoué avant qu'un seul octet ne soit écrit"""
+    
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+
+class PooledConnection:
+    """Connexion TCP persistante vers une destination MLLP"""
+    
+    def __init__(self, sock, endpoint):
+        self.sock = sock
+        self.endpoint = endpoint
+        self.decoder = MLLPFrameDecoder()
+        self.frames = deque()   # Trames décodées non encore consommées
+        self.last_used = time.monotonic()
+        self.reused = False
+    
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+class MLLPConnectionPool:
+    """Pool de connexions persistantes (keep-alive) par destination"""
+    
+    def __init__(self, max_size=4, idle_timeout=8.0):
+        """
+        Initialise le pool
+        
+        Args:
+            max_size (int, optional): Nombre maximum de connexions inactives
+                conservées par destination
+            idle_timeout (float, optional): Durée (secondes) au-delà de laquelle
+                une connexion inactive est fermée
+        """
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._next_eviction = time.monotonic() + idle_timeout
+    
+    def acquire(self, host, port, timeout):
+        """
+        Fournit une connexion saine vers host:port, réutilisée si possible
+        
+        Args:
+            host (str): Hôte de destination
+            port (int): Port de destination
+            timeout (float): Timeout des opérations socket
+        
+        Returns:
+            PooledConnection: Connexion prête à l'emploi
+        
+        Raises:
+            OSError: Si la connexion ne peut pas être établie
+        """
+        self._maybe_evict()
+        endpoint = (host, port)
+        while True:
+            with self._lock:
+                idle = self._idle.get(endpoint)
+                conn = idle.pop() if idle else None
+            if conn is None:
+                break
+            if (time.monotonic() - conn.last_used > self.idle_timeout
+                    or not self._is_alive(conn.sock)):
+                conn.close()
+                continue
+            conn.sock.settimeout(timeout)
+            conn.reused = True
+            return conn
+        
+        sock = socket.create_connection(endpoint, timeout=timeout)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        return PooledConnection(sock, endpoint)
+    
+    def release(self, conn):
+        """
+        Rend une connexion au pool après un échange complet
+        
+        Args:
+            conn (PooledConnection): Connexion à rendre
+        """
+        if len(conn.decoder) or conn.frames:
+            # Données inattendues en attente: connexion non réutilisable
+            conn.close()
+            return
+        conn.last_used = time.monotonic()
+        self._maybe_evict()
+        with self._lock:
+            idle = self._idle.setdefault(conn.endpoint, [])
+            if len(idle) < self.max_size:
+                idle.append(conn)
+                return
+        conn.close()
+    
+    def evict_idle(self):
+        """Ferme les connexions inactives depuis plus de idle_timeout"""
+        now = time.monotonic()
+        with self._lock:
+            expired = []
+            for endpoint, idle in self._idle.items():
+                expired.extend(c for c in idle if now - c.last_used > self.idle_timeout)
+                idle[:] = [c for c in idle if now - c.last_used <= self.idle_timeout]
+        for conn in expired:
+            conn.close()
+    
+    def _maybe_evict(self):
+        """Appelle evict_idle() au plus une fois par idle_timeout (destinations délaissées)"""
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_eviction:
+                return
+            self._next_eviction = now + self.idle_timeout
+        self.evict_idle()
+    
+    def close_all(self):
+        """Ferme toutes les connexions du pool"""
+        with self._lock:
+            connections = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for conn in connections:
+            conn.close()
+    
+    @staticmethod
+    def _is_alive(sock):
+        """
+        Vérifie sans bloquer qu'une connexion inactive n'a pas été fermée
+        par le serveur
+        
+        Args:
+            sock (socket.socket): Socket à vérifier
+        
+        Returns:
+            bool: True si la connexion est utilisable
+        """
+        try:
+            sock.setblocking(False)
+            # b'' = fermeture par le pair, données = octets orphelins
+            sock.recv(1, socket.MSG_PEEK)
+            return False
+        except (BlockingIOError, InterruptedError):
+            return True
+        except OSError:
+            return False
+
+
 class MLLPClient:
     SB = b'\x0b'
     EB = b'\x1c'
     CR = b'\x0d'
     
-    def __init__(self, host_config=None):
+    def __init__(self, host_config=None, keep_alive=True, pool_size=4, idle_timeout=8.0):
         self.logger = logging.getLogger("HL7Messenger.MLLPClient")
         self.host_config = host_config or {}
         self.timeout = 30
+        self.keep_alive = keep_alive
+        self.pool = MLLPConnectionPool(max_size=pool_size, idle_timeout=idle_timeout)
         self.default_hosts = {
             "ADMISSION_SYSTEM": {"host": "localhost", "port": 2576},
             "LAB_SYSTEM": {"host": "localhost", "port": 2577},
@@ -28,7 +191,8 @@ class MLLPClient:
         self.logger.info(f"[{timestamp}] {direction} | {endpoint} | {message[:50]}...")
     
     def test_connection(self, destination):
-        """Teste la connexion à une destination sans envoyer de message
+        """Teste la connexion à une destination sans envoyer de message.
+        La connexion ouverte est conservée dans le pool pour le prochain envoi.
         
         Args:
             destination (str): Nom de la destination à tester
@@ -41,10 +205,12 @@ class MLLPClient:
             return False, f"Destination inconnue: {destination}"
             
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(5)  # Timeout court pour le test
-                s.connect((host, port))
-                return True, "Connexion établie"
+            conn = self.pool.acquire(host, port, 5)  # Timeout court pour le test
+            if self.keep_alive:
+                self.pool.release(conn)
+            else:
+                conn.close()
+            return True, "Connexion établie"
         except socket.timeout:
             return False, f"Timeout lors de la connexion à {host}:{port}"
         except ConnectionRefusedError:
@@ -73,40 +239,201 @@ class MLLPClient:
             self.logger.error(error_msg)
             return False, error_msg
             
-        mllp_message = self.SB + message.encode('utf-8') + self.EB + self.CR
+        mllp_message = encode_frame(message)
         self.log_message("ENVOI", message, f"{host}:{port}")
         
+        conn = None
+        try:
+            conn = self.pool.acquire(host, port, self.timeout)
+            while True:
+                try:
+                    ack_message = self._exchange(conn, mllp_message)
+                    break
+                except _NothingSent as e:
+                    if not conn.reused:
+                        raise e.error
+                    # Connexion fermée pendant l'inactivité sans qu'aucun octet
+                    # n'ait été écrit: le serveur n'a rien reçu, un seul nouvel
+                    # essai sur une nouvelle connexion ne peut pas dupliquer
+                    conn.close()
+                    conn = self.pool.acquire(host, port, self.timeout)
+            
+            if self.keep_alive:
+                self.pool.release(conn)
+            else:
+                conn.close()
+            
+            self.log_message("ACK", ack_message, f"{host}:{port}")
+            return self._validate_ack(ack_message)
+                
+        except _ConnectionClosed:
+            conn.close()
+            self.logger.warning(f"Pas d'accusé de réception reçu de {destination}")
+            return False, "Pas d'accusé de réception"
+        except socket.timeout:
+            conn_error = f"Timeout lors de la connexion à {host}:{port}"
+        except ConnectionRefusedError:
+            conn_error = f"Connexion refusée par {host}:{port} - Vérifiez que le serveur MLLP est démarré"
+        except Exception as e:
+            conn_error = f"Erreur lors de l'envoi du message: {str(e)}"
+        
+        if conn is not None:
+            conn.close()
+        return False, conn_error
+    
+    def send_batch(self, messages, destination, window=16, test_mode=False):
+        """Envoie un lot de messages HL7 en pipeline sur une connexion persistante.
+        Jusqu'à `window` messages sont en vol simultanément; les ACK sont associés
+        aux messages par MSA-2 (ID de contrôle), dans l'ordre d'envoi s'ils n'ont
+        pas de MSA-2; un ACK d'un ID inconnu ou déjà acquitté est ignoré.
+        
+        Args:
+            messages (list): Messages HL7 à envoyer
+            destination (str): Destination (nom ou host:port)
+            window (int, optional): Nombre maximum de messages sans ACK
+            test_mode (bool, optional): Mode test (pas d'envoi réel)
+            
+        Returns:
+            list: Un tuple (success, response) par message, dans l'ordre d'entrée
+        """
+        if test_mode:
+            self.logger.info(f"[MODE TEST] {len(messages)} messages simulés envoyés à {destination}")
+            return [(True, "Message accepté (simulation)") for _ in messages]
+        
+        host, port = self._get_destination_endpoint(destination)
+        if not host or not port:
+            error_msg = f"Destination inconnue: {destination}"
+            self.logger.error(error_msg)
+            return [(False, error_msg) for _ in messages]
+        
+        results = [None] * len(messages)
+        pending = OrderedDict()   # index -> ID de contrôle, dans l'ordre d'envoi
+        by_control_id = {}        # ID de contrôle -> deque d'index en attente
+        next_index = 0
+        window = max(1, window)
+        self.logger.info(f"Envoi en lot de {len(messages)} messages vers {host}:{port} (fenêtre {window})")
+        
+        conn = None
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-                s.settimeout(self.timeout)
-                s.connect((host, port))
-                s.sendall(mllp_message)
-                ack_data = b''
-                while True:
-                    chunk = s.recv(4096)
-                    if not chunk:
-                        break
-                    ack_data += chunk
-                    if self.EB in chunk:
-                        break
-                        
-                if ack_data:
-                    start = ack_data.find(self.SB) + 1
-                    end = ack_data.find(self.EB)
-                    if start > 0 and end > start:
-                        ack_message = ack_data[start:end].decode('utf-8')
-                        self.log_message("ACK", ack_message, f"{host}:{port}")
-                        return self._validate_ack(ack_message)
-                        
-                self.logger.warning(f"Pas d'accusé de réception reçu de {destination}")
-                return False, "Pas d'accusé de réception"
+            conn = self.pool.acquire(host, port, self.timeout)
+            while next_index < len(messages) or pending:
+                # Remplir la fenêtre d'envoi
+                frames = []
+                while next_index < len(messages) and len(pending) < window:
+                    message = messages[next_index]
+                    control_id = self._get_message_control_id(message)
+                    pending[next_index] = control_id
+                    by_control_id.setdefault(control_id, deque()).append(next_index)
+                    frames.append(encode_frame(message))
+                    next_index += 1
+                if frames:
+                    conn.sock.sendall(b''.join(frames))
                 
+                chunk = conn.sock.recv(65536)
+                if not chunk:
+                    raise _ConnectionClosed()
+                for frame in conn.decoder.feed(chunk):
+                    ack_message = frame.decode('utf-8')
+                    ack_control_id = self._get_ack_control_id(ack_message)
+                    queue = by_control_id.get(ack_control_id)
+                    if queue:
+                        index = queue.popleft()
+                    elif not ack_control_id and pending:
+                        # ACK sans MSA-2: les serveurs MLLP répondent dans l'ordre
+                        index = next(iter(pending))
+                        by_control_id[pending[index]].remove(index)
+                    else:
+                        # ACK en double, non sollicité ou d'un autre message
+                        self.logger.warning(f"ACK non corrélé ignoré (MSA-2={ack_control_id!r}) "
+                                            f"de {host}:{port}")
+                        continue
+                    del pending[index]
+                    results[index] = self._validate_ack(ack_message)
+            
+            if self.keep_alive:
+                self.pool.release(conn)
+            else:
+                conn.close()
+            conn = None
+            
+        except _ConnectionClosed:
+            batch_error = "Pas d'accusé de réception"
         except socket.timeout:
-            return False, f"Timeout lors de la connexion à {host}:{port}"
+            batch_error = f"Timeout lors de l'envoi vers {host}:{port}"
         except ConnectionRefusedError:
-            return False, f"Connexion refusée par {host}:{port} - Vérifiez que le serveur MLLP est démarré"
+            batch_error = f"Connexion refusée par {host}:{port} - Vérifiez que le serveur MLLP est démarré"
         except Exception as e:
-            return False, f"Erreur lors de l'envoi du message: {str(e)}"
+            batch_error = f"Erreur lors de l'envoi du lot: {str(e)}"
+        else:
+            batch_error = None
+        
+        if conn is not None:
+            conn.close()
+        if batch_error:
+            self.logger.error(f"Lot interrompu vers {destination}: {batch_error}")
+            results = [result or (False, batch_error) for result in results]
+        
+        accepted = sum(1 for success, _ in results if success)
+        self.logger.info(f"Lot terminé: {accepted}/{len(messages)} messages acceptés")
+        return results
+    
+    def close(self):
+        """Ferme toutes les connexions persistantes"""
+        self.pool.close_all()
+    
+    def _exchange(self, conn, mllp_message):
+        """
+        Envoie une trame et attend l'ACK correspondant sur une connexion.
+        Les trames décodées en plus de l'ACK restent dans conn.frames: la
+        connexion n'est alors pas rendue au pool, et la requête suivante ne
+        peut pas recevoir l'ACK d'une autre.
+        
+        Idempotence: une fois un octet écrit, l'échange n'est jamais rejoué;
+        si l'ACK manque, l'échec est remonté à l'appelant, car le serveur
+        a pu traiter le message (le renvoyer risquerait un doublon).
+        
+        Args:
+            conn (PooledConnection): Connexion à utiliser
+            mllp_message (bytes): Trame MLLP à envoyer
+        
+        Returns:
+            str: Message ACK reçu
+        
+        Raises:
+            _NothingSent: Si l'envoi échoue avant le premier octet écrit
+            _ConnectionClosed: Si le serveur ferme la connexion sans ACK
+        """
+        self._send(conn, mllp_message)
+        while True:
+            if conn.frames:
+                return conn.frames.popleft().decode('utf-8')
+            chunk = conn.sock.recv(65536)
+            if not chunk:
+                raise _ConnectionClosed()
+            conn.frames.extend(conn.decoder.feed(chunk))
+    
+    @staticmethod
+    def _send(conn, data):
+        """
+        Écrit une trame entière en comptant les octets écrits
+        
+        Args:
+            conn (PooledConnection): Connexion à utiliser
+            data (bytes): Trame MLLP
+        
+        Raises:
+            _NothingSent: Si l'écriture échoue avant le premier octet
+            OSError: Si elle échoue après un envoi partiel
+        """
+        view = memoryview(data)
+        sent = 0
+        while sent < len(view):
+            try:
+                sent += conn.sock.send(view[sent:])
+            except OSError as e:
+                if not sent:
+                    raise _NothingSent(e) from e
+                raise
     
     def _get_destination_endpoint(self, destination):
         if destination in self.host_config:
@@ -121,6 +448,23 @@ class MLLPClient:
                 return parts[0], int(parts[1])
         return None, None
 
+    @staticmethod
+    def _get_message_control_id(message):
+        """Renvoie MSH-10 (ID de contrôle) d'un message HL7, ou None"""
+        if not message.startswith("MSH") or len(message) < 4:
+            return None
+        fields = message.split("\r", 1)[0].split(message[3])
+        return fields[9] if len(fields) > 9 else None
+    
+    @staticmethod
+    def _get_ack_control_id(ack_message):
+        """Renvoie MSA-2 (ID de contrôle acquitté) d'un ACK, ou None"""
+        for segment in ack_message.replace("\n", "\r").split("\r"):
+            if segment.startswith("MSA|"):
+                fields = segment.split("|")
+                return fields[2] if len(fields) > 2 else None
+        return None
+    
     def _validate_ack(self, ack_message):
         try:
             if "MSA|AA|" in ack_message:
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+Décodage et encodage des trames MLLP (<SB> message <EB><CR>).
+Le décodeur est incrémental: il accumule les octets reçus dans un bytearray,
+ne reparcourt jamais les octets déjà analysés et renvoie toutes les trames
+complètes disponibles après chaque lecture.
+"""
+
+SB = b'\x0b'  # Start Block
+EB = b'\x1c'  # End Block
+CR = b'\x0d'  # Carriage Return
+
+DEFAULT_MAX_FRAME_SIZE = 16 * 1024 * 1024
+
+
+class MLLPFrameError(ValueError):
+    """Erreur de trame MLLP (message trop volumineux)"""
+
+
+def encode_frame(message, encoding='utf-8'):
+    """
+    Encapsule un message dans une trame MLLP
+
+    Args:
+        message (str or bytes): Message HL7
+        encoding (str, optional): Encodage utilisé si message est une chaîne
+
+    Returns:
+        bytes: Trame MLLP
+    """
+    if isinstance(message, str):
+        message = message.encode(encoding)
+    return SB + message + EB + CR
+
+
+class MLLPFrameDecoder:
+    """Décodeur incrémental de trames MLLP"""
+
+    def __init__(self, max_frame_size=DEFAULT_MAX_FRAME_SIZE):
+        """
+        Initialise le décodeur
+
+        Args:
+            max_frame_size (int, optional): Taille maximale d'un message (octets)
+        """
+        self.max_frame_size = max_frame_size
+        self._buffer = bytearray()
+        self._in_frame = False  # Le buffer commence par SB
+        self._scan_pos = 0      # Position à partir de laquelle chercher EB
+
+    def __len__(self):
+        """Nombre d'octets en attente dans le buffer"""
+        return len(self._buffer)
+
+    def reset(self):
+        """Vide le buffer et réinitialise l'état du décodeur"""
+        self._buffer.clear()
+        self._in_frame = False
+        self._scan_pos = 0
+
+    def feed(self, data):
+        """
+        Ajoute des octets reçus et extrait toutes les trames complètes
+
+        Args:
+            data (bytes): Octets reçus du socket
+
+        Returns:
+            list: Contenus (bytes) des trames complètes, dans l'ordre de réception
+
+        Raises:
+            MLLPFrameError: Si un message dépasse max_frame_size
+        """
+        buffer = self._buffer
+        buffer += data
+        frames = []
+
+        while buffer:
+            if not self._in_frame:
+                start = buffer.find(SB)
+                if start < 0:
+                    # Octets hors trame (CR final, bruit): ignorés
+                    buffer.clear()
+                    break
+                if start:
+                    del buffer[:start]
+                self._in_frame = True
+                self._scan_pos = 1
+
+            end = buffer.find(EB, self._scan_pos)
+            if end < 0:
+                self._scan_pos = len(buffer)
+                if len(buffer) - 1 > self.max_frame_size:
+                    self.reset()
+                    raise MLLPFrameError(
+                        f"Message MLLP supérieur à {self.max_frame_size} octets"
+                    )
+                break
+
+            if end - 1 > self.max_frame_size:
+                self.reset()
+                raise MLLPFrameError(
+                    f"Message MLLP supérieur à {self.max_frame_size} octets"
+                )
+
+            with memoryview(buffer) as view:
+                frames.append(bytes(view[1:end]))
+
+            # Consommer EB et le CR qui le suit s'il est déjà arrivé
+            consumed = end + 1
+            if buffer[consumed:consumed + 1] == CR:
+                consumed += 1
+            del buffer[:consumed]
+            self._in_frame = False
+            self._scan_pos = 0
+
+        return frames
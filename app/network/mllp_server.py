@@ -3,9 +3,11 @@
 Serveur MLLP pour recevoir les messages HL7 - VERSION CORRIGÉE
 Tous les problèmes de démarrage et de fonctionnement résolus
 """
+import argparse
 import socket
 import logging
 import threading
+import time
 from datetime import datetime
 import traceback
 import sys
@@ -13,6 +15,34 @@ import os
 
 # Ajouter le répertoire parent au PYTHONPATH
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# ... et la racine du projet pour les imports app.* (moteurs asyncio et multi-processus)
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+try:
+    from app.network.mllp_framing import (
+        DEFAULT_MAX_FRAME_SIZE, MLLPFrameDecoder, MLLPFrameError, encode_frame
+    )
+    from app.network.processing_pool import Overloaded, ProcessingPool
+    from app.network.patient_lanes import PatientLaneScheduler
+    from app.network.rate_limit import DEFAULT_CONFIG_PATH, SourceRateLimiter, Tarpit, load_rate_limits
+    from app.network.timeouts import ConnectionDeadline, TimerWheel, load_timeouts
+    from app.hl7_engine.er7 import ER7ParseError, ER7Segment, escape, parse_er7
+    from app.utils.logging_utils import PayloadSampler, instance_logger, setup_queue_logger, stop_queue_logger
+    from app.utils.metrics import MetricsEndpoint, MetricsRegistry
+    from app.utils.tracing import NULL_TRACE, RollingFileExporter, Tracer
+except ImportError:
+    # Exécution directe du script (python app/network/mllp_server.py)
+    from mllp_framing import (
+        DEFAULT_MAX_FRAME_SIZE, MLLPFrameDecoder, MLLPFrameError, encode_frame
+    )
+    from processing_pool import Overloaded, ProcessingPool
+    from patient_lanes import PatientLaneScheduler
+    from rate_limit import DEFAULT_CONFIG_PATH, SourceRateLimiter, Tarpit, load_rate_limits
+    from timeouts import ConnectionDeadline, TimerWheel, load_timeouts
+    from hl7_engine.er7 import ER7ParseError, ER7Segment, escape, parse_er7
+    from utils.logging_utils import PayloadSampler, instance_logger, setup_queue_logger, stop_queue_logger
+    from utils.metrics import MetricsEndpoint, MetricsRegistry
+    from utils.tracing import NULL_TRACE, RollingFileExporter, Tracer
 
 # Import des modules avec gestion d'erreur
 try:
@@ -20,6 +50,7 @@ try:
     from app.db.repositories.patient_repository import PatientRepository
     from app.models.message import Message
     from app.db.repositories.message_repository import MessageRepository
+    from app.db.write_behind import WriteBehindFull, WriteBehindQueue
 except ImportError as e:
     print(f"⚠️ Certains modules ne sont pas disponibles: {e}")
     print("Le serveur fonctionnera en mode basique")
@@ -27,6 +58,21 @@ except ImportError as e:
     PatientRepository = None
     Message = None
     MessageRepository = None
+    WriteBehindQueue = None
+    WriteBehindFull = None
+
+# Modes de persistance: écriture synchrone ou file d'écriture différée
+PERSISTENCE_MODES = ("sync", "commit-before-ack", "ack-then-commit")
+
+# Types de message connus, seules valeurs de l'étiquette message_type de
+# hl7_acks_total: MSH-9 est fourni par l'émetteur, les autres valeurs sont
+# regroupées sous OTHER pour borner le nombre de séries exposées
+METRIC_MESSAGE_TYPES = frozenset({
+    "ACK",
+    "ADT^A01", "ADT^A02", "ADT^A03", "ADT^A04", "ADT^A05", "ADT^A06", "ADT^A07",
+    "ADT^A08", "ADT^A11", "ADT^A12", "ADT^A13", "ADT^A28", "ADT^A31", "ADT^A40",
+    "ORM^O01", "OML^O21", "ORU^R01", "RDE^O11", "RDS^O13", "SIU^S12", "MDM^T02",
+})
 
 class MLLPServer:
     """Serveur pour recevoir et traiter les messages HL7 via MLLP - Version corrigée"""
@@ -36,45 +82,199 @@ class MLLPServer:
     EB = b'\x1c'  # End Block
     CR = b'\x0d'  # Carriage Return
     
-    def __init__(self, host="0.0.0.0", port=2575):
+    def __init__(self, host="0.0.0.0", port=2575, backlog=5, timeout=30,
+                 max_message_size=DEFAULT_MAX_FRAME_SIZE, persistence="sync",
+                 reuse_port=False, pool_size=None, max_in_flight=256, max_per_source=None,
+                 lanes=None, log_level="INFO", payload_sample_every=100,
+                 metrics_port=None, metrics_host="127.0.0.1", trace_file=None,
+                 rate_limits=None, timeouts=None, write_behind_journal=None):
         """
         Initialise le serveur MLLP
         
         Args:
             host (str): Host d'écoute
             port (int): Port d'écoute
+            backlog (int, optional): Taille de la file d'attente des connexions
+            timeout (int, optional): Délai par défaut (secondes) de lecture,
+                d'inactivité et d'écriture, si timeouts n'est pas fourni
+            max_message_size (int, optional): Taille maximale d'un message (octets)
+            persistence (str, optional): 'sync' (écriture avant l'ACK),
+                'commit-before-ack' ou 'ack-then-commit' (file d'écriture différée)
+            reuse_port (bool, optional): Activer SO_REUSEPORT (plusieurs processus
+                à l'écoute sur le même port)
+            pool_size (int, optional): Nombre de threads de traitement; si défini,
+                les messages passent par un pool borné avec contrôle d'admission
+            max_in_flight (int, optional): Messages en cours au-delà desquels
+                les nouveaux messages sont rejetés (ACK AR)
+            max_per_source (int, optional): Même limite pour une seule source (IP)
+            lanes (int, optional): Nombre de files ordonnées par patient (PID-3);
+                remplace le pool: un même patient est traité dans l'ordre d'arrivée
+            log_level (str, optional): Niveau du journal par message ('DEBUG',
+                'INFO', 'WARNING'...); 'WARNING' = mode silencieux de production
+            payload_sample_every (int, optional): Journaliser le contenu d'un
+                message sur N (niveau INFO); 0 pour ne jamais l'écrire
+            metrics_port (int, optional): Port HTTP de l'endpoint /metrics
+                (format Prometheus); désactivé par défaut
+            metrics_host (str, optional): Adresse de l'endpoint (locale par défaut)
+            trace_file (str, optional): Fichier tournant des durées de chaque
+                étape par message (JSON); traçage désactivé par défaut
+            rate_limits (dict, optional): Limites de connexions et de messages
+                par IP (section "rate_limit" de config.json); aucune par défaut
+            timeouts (dict, optional): Délais {"read", "idle", "write"} en
+                secondes (section "timeouts" de config.json)
+            write_behind_journal (str, optional): Journal sur disque des
+                messages acquittés non encore écrits (ack-then-commit); à
+                côté de la base par défaut
         """
         self.host = host
         self.port = port
+        self.backlog = backlog
+        self.timeout = timeout
+        self.timeouts = timeouts or {"read": timeout, "idle": timeout, "write": timeout}
+        self.max_message_size = max_message_size
+        self.reuse_port = reuse_port
         self.server = None
         self.running = False
-        self.logger = self._setup_logger()
+        self.logger = self._setup_logger(log_level)
+        self.payload_sampler = PayloadSampler(payload_sample_every)
         self.clients_connected = 0
         self.messages_received = 0
+        self.connections_open = 0
+        self._connections_lock = threading.Lock()
         
         # Initialiser les repositories si disponibles
         self.patient_repo = PatientRepository() if PatientRepository else None
         self.message_repo = MessageRepository() if MessageRepository else None
         
+        # File d'écriture différée (optionnelle)
+        self.write_behind = None
+        if persistence not in PERSISTENCE_MODES:
+            raise ValueError(f"Mode de persistance inconnu: {persistence}")
+        if persistence != "sync" and self.message_repo and WriteBehindQueue:
+            self.write_behind = WriteBehindQueue(self.message_repo.db, mode=persistence,
+                                                 journal_path=write_behind_journal)
+            if self.write_behind.journal_path:
+                # Écrire dès maintenant les messages acquittés avant un arrêt brutal
+                self.write_behind.start()
+        
+        # Pool de traitement borné (optionnel): réception et traitement séparés
+        self.processing_pool = None
+        self.lane_scheduler = None
+        if lanes and pool_size:
+            raise ValueError("pool_size et lanes sont exclusifs")
+        if lanes:
+            self.lane_scheduler = PatientLaneScheduler(
+                self._process_frame, lanes=lanes, max_in_flight=max_in_flight
+            )
+        elif pool_size:
+            self.processing_pool = ProcessingPool(
+                self._process_frame, workers=pool_size,
+                max_in_flight=max_in_flight, max_per_source=max_per_source
+            )
+        
+        # Métriques (toujours collectées, exposées en HTTP si metrics_port est défini)
+        self.metrics = self._setup_metrics()
+        self.metrics_endpoint = None
+        if metrics_port is not None:
+            self.metrics_endpoint = MetricsEndpoint(self.metrics, metrics_host, metrics_port)
+        
+        # Traces par message (sans coût si aucun exportateur n'est branché)
+        self.tracer = Tracer()
+        self.trace_exporter = None
+        if trace_file:
+            self.trace_exporter = RollingFileExporter(trace_file)
+            self.tracer.add_exporter(self.trace_exporter)
+        
+        # Limitation de débit par IP (refus avant toute allocation par connexion)
+        self.rate_limiter = None
+        self.tarpit = None
+        if rate_limits:
+            self.rate_limiter = SourceRateLimiter(rate_limits)
+            self.tarpit = Tarpit(self.rate_limiter.tarpit_seconds)
+        
+        # Délais de toutes les connexions dans une seule roue temporelle
+        self.timer_wheel = TimerWheel()
+        
         print(f"🏥 Serveur HL7 MLLP initialisé")
         print(f"📍 Adresse: {self.host}:{self.port}")
         print(f"📚 Base de données: {'✅ Disponible' if self.patient_repo else '❌ Mode basique'}")
     
-    def _setup_logger(self):
-        """Configure le logger du serveur"""
-        logger = logging.getLogger("HL7Messenger.MLLPServer")
-        logger.setLevel(logging.INFO)
+    def _setup_logger(self, level="INFO"):
+        """
+        Configure le logger du serveur: les appels du chemin de traitement
+        déposent l'enregistrement dans une file, l'écriture (console et
+        journal de l'application) se fait dans un thread dédié et ne bloque
+        jamais la réception. Le niveau est propre à cette instance.
         
-        # Handler console s'il n'existe pas déjà
-        if not logger.handlers:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter(
-                '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-            )
-            handler.setFormatter(formatter)
-            logger.addHandler(handler)
+        Args:
+            level (str, optional): Niveau de log
         
-        return logger
+        Returns:
+            logging.Logger: Logger configuré
+        """
+        shared = setup_queue_logger("HL7Messenger.MLLPServer", level=logging.DEBUG)
+        return instance_logger(shared, self.port, level)
+    
+    def _setup_metrics(self):
+        """
+        Crée le registre des métriques du serveur
+        
+        Returns:
+            MetricsRegistry: Compteurs, jauges et histogrammes du serveur
+        """
+        registry = MetricsRegistry()
+        registry.counter_function("hl7_messages_received_total", "Messages HL7 reçus",
+                                  lambda: self.messages_received)
+        registry.counter_function("hl7_connections_total", "Connexions acceptées",
+                                  lambda: self.clients_connected)
+        registry.gauge("hl7_connections_open", "Connexions ouvertes",
+                       lambda: self.connections_open)
+        registry.gauge("hl7_processing_queue_depth",
+                       "Messages en attente ou en traitement (pool borné ou files patients)",
+                       self._processing_depth)
+        registry.gauge("hl7_write_behind_pending", "Enregistrements en attente d'écriture",
+                       lambda: len(self.write_behind) if self.write_behind else 0)
+        registry.counter_function("hl7_write_behind_failed_total",
+                                  "Enregistrements abandonnés par la file d'écriture après nouvelles tentatives",
+                                  lambda: self.write_behind.failed if self.write_behind else 0)
+        registry.counter_function("hl7_write_behind_lost_total",
+                                  "Messages déjà acquittés AA perdus (ack-then-commit)",
+                                  lambda: self.write_behind.lost if self.write_behind else 0)
+        self._bytes_received = registry.counter("hl7_bytes_received_total", "Octets reçus")
+        self._bytes_sent = registry.counter("hl7_bytes_sent_total", "Octets envoyés (ACK)")
+        self._acks = registry.counter("hl7_acks_total", "ACK envoyés par code et type de message",
+                                      ("code", "message_type"))
+        self._ack_latency = registry.histogram("hl7_ack_latency_seconds",
+                                               "Délai entre la réception d'une trame et l'envoi de l'ACK")
+        self._parse_time = registry.histogram("hl7_parse_seconds", "Durée d'analyse d'un message")
+        self._persistence_time = registry.histogram("hl7_persistence_seconds",
+                                                    "Durée d'enregistrement (ou de mise en file) d'un message")
+        self._rate_limited = registry.counter("hl7_rate_limited_total",
+                                              "Connexions et messages refusés par la limite de débit par IP",
+                                              ("kind",))
+        self._timeouts_expired = registry.counter("hl7_connection_timeouts_total",
+                                                  "Connexions fermées par un délai de lecture, "
+                                                  "d'inactivité ou d'écriture", ("kind",))
+        return registry
+    
+    def _processing_depth(self):
+        """Messages en cours dans le pool borné ou les files patients"""
+        if self.lane_scheduler is not None:
+            return self.lane_scheduler.in_flight
+        if self.processing_pool is not None:
+            return self.processing_pool.in_flight
+        return 0
+    
+    def _start_metrics_endpoint(self):
+        """Ouvre l'endpoint HTTP des métriques s'il est configuré"""
+        if self.metrics_endpoint is None:
+            return
+        try:
+            port = self.metrics_endpoint.start()
+            print(f"📈 Métriques disponibles sur http://{self.metrics_endpoint.host}:{port}/metrics")
+        except OSError as e:
+            self.logger.error(f"Endpoint de métriques indisponible: {str(e)}")
+            self.metrics_endpoint = None
     
     def start(self):
         """Démarre le serveur MLLP avec gestion d'erreur robuste"""
@@ -84,6 +284,8 @@ class MLLPServer:
             # Créer le socket
             self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.reuse_port:
+                self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
             
             # Binding avec gestion d'erreur
             try:
@@ -102,7 +304,7 @@ class MLLPServer:
                     return False
             
             # Écouter les connexions
-            self.server.listen(5)
+            self.server.listen(self.backlog)
             self.running = True
             
             print("=" * 60)
@@ -116,14 +318,22 @@ class MLLPServer:
             print("=" * 60)
             
             self.logger.info(f"Serveur MLLP démarré sur {self.host}:{self.port}")
+            self._start_metrics_endpoint()
+            self.timer_wheel.run_thread()
             
             # Boucle principale d'acceptation des clients
             while self.running:
                 try:
                     client_socket, client_address = self.server.accept()
+                    if not self._admit_connection(client_address):
+                        self.tarpit.hold(client_socket)
+                        continue
                     self.clients_connected += 1
+                    with self._connections_lock:
+                        self.connections_open += 1
                     
-                    print(f"🔗 Nouvelle connexion #{self.clients_connected} depuis {client_address[0]}:{client_address[1]}")
+                    self.logger.info(f"Nouvelle connexion #{self.clients_connected} depuis "
+                                     f"{client_address[0]}:{client_address[1]}")
                     
                     # Créer un thread pour gérer ce client
                     client_thread = threading.Thread(
@@ -140,7 +350,6 @@ class MLLPServer:
                 except Exception as e:
                     if self.running:  # Ne pas logger si on s'arrête
                         self.logger.error(f"Erreur lors de l'acceptation du client: {str(e)}")
-                        print(f"❌ Erreur client: {str(e)}")
             
         except Exception as e:
             print(f"❌ Erreur fatale du serveur: {str(e)}")
@@ -163,6 +372,35 @@ class MLLPServer:
             except:
                 pass
         
+        if self.metrics_endpoint:
+            self.metrics_endpoint.stop()
+        
+        self.timer_wheel.stop()
+        
+        if self.processing_pool:
+            self.processing_pool.shutdown()
+            print(f"🚦 Messages rejetés pour surcharge: {self.processing_pool.rejected}")
+        
+        if self.lane_scheduler:
+            self.lane_scheduler.shutdown()
+            lane_stats = self.lane_scheduler.stats()
+            print(f"🛤️ Files patients: traités {lane_stats['processed']}, "
+                  f"profondeur max {lane_stats['max_depths']}, rejetés {lane_stats['rejected']}")
+        
+        if self.trace_exporter:
+            self.trace_exporter.close()
+        
+        if self.rate_limiter:
+            self.tarpit.close()
+            print(f"⛔ Limite de débit: {sum(self.rate_limiter.refused_connections.values())} connexion(s), "
+                  f"{sum(self.rate_limiter.refused_messages.values())} message(s) refusés")
+        
+        if self.write_behind:
+            self.write_behind.close()
+            print(f"💾 File d'écriture vidée ({self.write_behind.written} enregistrements)")
+            if self.write_behind.lost:
+                print(f"⚠️ {self.write_behind.lost} message(s) acquitté(s) perdu(s) par la file d'écriture")
+        
         print(f"📊 Statistiques de session:")
         print(f"   - Connexions reçues: {self.clients_connected}")
         print(f"   - Messages traités: {self.messages_received}")
@@ -177,86 +415,320 @@ class MLLPServer:
             client_address (tuple): Adresse du client (ip, port)
         """
         client_id = f"{client_address[0]}:{client_address[1]}"
+        # Pas de timeout sur la socket: la roue temporelle interrompt la
+        # lecture ou l'écriture bloquée en fermant la connexion
+        deadline = self._connection_deadline(lambda kind: self._shutdown_socket(client_socket))
         
         try:
-            client_socket.settimeout(30)  # 30 secondes de timeout
-            print(f"🔄 Traitement du client {client_id}...")
+            self.logger.debug("Traitement du client %s", client_id)
             
-            # Buffer pour stocker les données reçues
-            buffer = b''
+            # Décodeur incrémental: toutes les trames complètes à chaque lecture
+            decoder = MLLPFrameDecoder(self.max_message_size)
             
             # Recevoir les données
+            deadline.received(0)
             while self.running:
                 try:
-                    data = client_socket.recv(4096)
+                    data = client_socket.recv(65536)
                     if not data:
-                        print(f"📪 Client {client_id} a fermé la connexion")
+                        if deadline.expired is None:
+                            self.logger.debug("Client %s a fermé la connexion", client_id)
                         break
                     
-                    buffer += data
-                    print(f"📥 Reçu {len(data)} bytes de {client_id}")
+                    received_at = time.perf_counter()
+                    self._bytes_received.inc(amount=len(data))
+                    self.logger.debug("Reçu %d bytes de %s", len(data), client_id)
                     
-                    # Chercher un message complet
-                    start = buffer.find(self.SB)
-                    end = buffer.find(self.EB, start)
+                    frames = decoder.feed(data)
+                    if frames:
+                        # Durée de décodage répartie entre les trames de cette lecture
+                        decode_time = (time.perf_counter() - received_at) / len(frames)
                     
-                    if start >= 0 and end > start:
-                        # Extraire le message
-                        raw_message = buffer[start+1:end]
+                    for raw_message in frames:
                         message = raw_message.decode('utf-8', errors='replace')
-                        buffer = buffer[end+2:]  # +2 pour inclure EB et CR
                         
                         self.messages_received += 1
+                        self._log_received_message(message, client_id)
+                        trace = self.tracer.begin(source=client_id)
+                        trace.add("decode", decode_time)
                         
-                        print("=" * 50)
-                        print(f"📨 MESSAGE HL7 #{self.messages_received} REÇU DE {client_id}")
-                        print("=" * 50)
-                        print(f"📏 Taille: {len(message)} caractères")
-                        print(f"⏰ Heure: {datetime.now().strftime('%H:%M:%S')}")
-                        print("📄 Contenu (extrait):")
-                        print(message[:200] + ("..." if len(message) > 200 else ""))
-                        print("=" * 50)
-                        
-                        # Traiter le message
-                        try:
-                            response = self.handle_message(message, client_address)
-                            
-                            # Envoyer la réponse au format MLLP
-                            mllp_response = self.SB + response.encode('utf-8') + self.EB + self.CR
-                            client_socket.sendall(mllp_response)
-                            
-                            print(f"✅ ACK envoyé à {client_id}")
-                            
-                        except Exception as e:
-                            error_msg = f"Erreur traitement message: {str(e)}"
-                            print(f"❌ {error_msg}")
-                            self.logger.error(error_msg)
-                            
-                            # Envoyer un ACK d'erreur
-                            error_ack = self.create_error_ack(str(e))
-                            mllp_error = self.SB + error_ack.encode('utf-8') + self.EB + self.CR
-                            client_socket.sendall(mllp_error)
-                            
-                            print(f"⚠️ ACK d'erreur envoyé à {client_id}")
+                        # Traiter le message et renvoyer l'ACK au format MLLP
+                        deadline.processing()
+                        response = self._dispatch(message, client_address, trace)
+                        deadline.writing()
+                        client_socket.sendall(response)
+                        self._bytes_sent.inc(amount=len(response))
+                        self._ack_latency.observe(time.perf_counter() - received_at)
+                        self.tracer.finish(trace)
+                    
+                    deadline.received(len(decoder), len(frames))
                         
-                except socket.timeout:
-                    print(f"⏰ Timeout pour le client {client_id}")
+                except MLLPFrameError as e:
+                    self.logger.error(f"Trame rejetée de {client_id}: {str(e)}")
+                    client_socket.sendall(self._frame_response(self.create_error_ack(str(e))))
                     break
                 except Exception as e:
-                    print(f"❌ Erreur lors de la réception: {str(e)}")
+                    if deadline.expired is None:
+                        self.logger.error(f"Erreur lors de la réception de {client_id}: {str(e)}")
                     break
                     
         except Exception as e:
-            print(f"❌ Erreur générale client {client_id}: {str(e)}")
             self.logger.error(f"Erreur client {client_id}: {str(e)}")
             
         finally:
+            deadline.cancel()
+            self._log_timeout(deadline, client_id)
+            with self._connections_lock:
+                self.connections_open -= 1
             try:
                 client_socket.close()
-                print(f"🔌 Connexion fermée avec {client_id}")
+                self.logger.debug("Connexion fermée avec %s", client_id)
             except:
                 pass
     
+    def _connection_deadline(self, on_expire):
+        """
+        Crée le délai d'une nouvelle connexion dans la roue du serveur
+        
+        Args:
+            on_expire (callable): Ferme la connexion (appelé avec le type de délai)
+        
+        Returns:
+            ConnectionDeadline: Délai de la connexion
+        """
+        return ConnectionDeadline(self.timer_wheel, self.timeouts, on_expire)
+    
+    def _log_timeout(self, deadline, client_id):
+        """
+        Compte et journalise la fermeture d'une connexion par un délai expiré
+        
+        Args:
+            deadline (ConnectionDeadline): Délai de la connexion
+            client_id (str): Identifiant du client (ip:port)
+        """
+        if deadline.expired is None:
+            return
+        self._timeouts_expired.inc(deadline.expired)
+        self.logger.warning(f"Timeout ({deadline.expired}) pour le client {client_id}")
+    
+    @staticmethod
+    def _shutdown_socket(client_socket):
+        """Interrompt les appels bloquants sur une socket (recv renvoie b'')"""
+        try:
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+    
+    def _log_received_message(self, message, client_id):
+        """
+        Journalise la réception d'un message; le contenu n'est écrit que pour
+        un message sur payload_sample_every
+        
+        Args:
+            message (str): Message HL7 reçu
+            client_id (str): Identifiant du client (ip:port)
+        """
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        if self.payload_sampler():
+            excerpt = message[:200] + ("..." if len(message) > 200 else "")
+            self.logger.info("Message #%d reçu de %s (%d caractères): %r",
+                             self.messages_received, client_id, len(message), excerpt)
+        else:
+            self.logger.info("Message #%d reçu de %s (%d caractères)",
+                             self.messages_received, client_id, len(message))
+    
+    def _frame_response(self, response):
+        """
+        Encapsule une réponse HL7 dans une trame MLLP
+        
+        Args:
+            response (str): Message ACK
+        
+        Returns:
+            bytes: Trame MLLP prête à être envoyée
+        """
+        return encode_frame(response)
+    
+    def _process_frame(self, message, client_address, trace=NULL_TRACE):
+        """
+        Traite un message décodé et construit la trame ACK à renvoyer.
+        Partagé par tous les moteurs (threads, asyncio).
+        
+        Args:
+            message (str): Message HL7 reçu
+            client_address (tuple): Adresse du client
+            trace (Trace, optional): Trace du message (étapes mesurées par
+                self.tracer.span() dans le thread de traitement)
+        
+        Returns:
+            bytes: Trame MLLP contenant l'ACK (succès ou erreur)
+        """
+        client_id = f"{client_address[0]}:{client_address[1]}"
+        with self.tracer.activate(trace):
+            try:
+                response = self.handle_message(message, client_address)
+                self.logger.debug("ACK envoyé à %s", client_id)
+            except Exception as e:
+                self.logger.error(f"Erreur traitement message de {client_id}: {str(e)}")
+                
+                # Envoyer un ACK d'erreur
+                response = self.create_error_ack(str(e))
+            
+            self._count_ack(message, response)
+            # L'étape "ack" (création de l'ACK) est mesurée dans handle_message
+            return self._frame_response(response)
+    
+    def _count_ack(self, message, response):
+        """
+        Compte un ACK par code (MSA-1) et type du message reçu (MSH-9)
+        
+        Args:
+            message (str): Message HL7 reçu
+            response (str): ACK renvoyé
+        """
+        position = response.find("MSA|")
+        code = response[position + 4:position + 6] if position >= 0 else "??"
+        self._acks.inc(code, self._message_type_label(message))
+    
+    @staticmethod
+    def _message_type_label(message):
+        """
+        Type de message (MSH-9.1^MSH-9.2) lu directement dans le segment MSH,
+        sans analyse complète du message
+        
+        Args:
+            message (str): Message HL7 brut
+        
+        Returns:
+            str: Type de message de METRIC_MESSAGE_TYPES, ex: 'ADT^A01',
+                'OTHER' pour un type hors liste, ou 'UNKNOWN' sans MSH-9
+        """
+        if not message.startswith("MSH") or len(message) < 5:
+            return "UNKNOWN"
+        end = message.find("\r")
+        fields = message[:end if end >= 0 else len(message)].split(message[3], 9)
+        if len(fields) < 9 or not fields[8]:
+            return "UNKNOWN"
+        label = "^".join(fields[8].split(message[4])[:2])
+        return label if label in METRIC_MESSAGE_TYPES else "OTHER"
+    
+    def _admit_connection(self, client_address):
+        """
+        Applique la limite de connexions par IP, avant toute allocation
+        
+        Args:
+            client_address (tuple): Adresse du client
+        
+        Returns:
+            bool: True si la connexion est acceptée
+        """
+        if self.rate_limiter is None or self.rate_limiter.allow_connection(client_address[0]):
+            return True
+        self._rate_limited.inc("connection")
+        # Ligne comptée comme échec par security_audit.py
+        self.logger.warning("Connexion refusée (limite de débit) depuis %s:%s", *client_address)
+        return False
+    
+    def _admit_message(self, message, client_address):
+        """
+        Applique la limite de messages par IP
+        
+        Args:
+            message (str): Message HL7 reçu
+            client_address (tuple): Adresse du client
+        
+        Returns:
+            bytes: Trame de l'ACK AR si la limite est dépassée, sinon None
+        """
+        if self.rate_limiter is None or self.rate_limiter.allow_message(client_address[0]):
+            return None
+        self._rate_limited.inc("message")
+        return self._reject(message, f"Limite de débit dépassée pour {client_address[0]}")
+    
+    def _dispatch(self, message, client_address, trace=NULL_TRACE):
+        """
+        Traite un message, via le pool borné ou les files patients s'ils sont configurés
+        
+        Args:
+            message (str): Message HL7 reçu
+            client_address (tuple): Adresse du client
+            trace (Trace, optional): Trace du message
+        
+        Returns:
+            bytes: Trame MLLP de l'ACK (AR immédiat si le serveur est saturé
+                ou la source au-delà de sa limite de débit)
+        """
+        rejection = self._admit_message(message, client_address)
+        if rejection is not None:
+            return rejection
+        try:
+            future = self._submit(message, client_address, trace)
+        except Overloaded as e:
+            return self._reject(message, str(e))
+        if future is None:
+            return self._process_frame(message, client_address, trace)
+        return future.result()
+    
+    def _submit(self, message, client_address, trace=NULL_TRACE):
+        """
+        Soumet un message au pool borné ou à la file de son patient
+        
+        Args:
+            message (str): Message HL7 reçu
+            client_address (tuple): Adresse du client
+            trace (Trace, optional): Trace du message
+        
+        Returns:
+            Future: Trame de l'ACK à venir, ou None sans pool ni files
+        
+        Raises:
+            Overloaded: Si la capacité de traitement est atteinte
+        """
+        if self.lane_scheduler is not None:
+            return self.lane_scheduler.submit(
+                self._lane_key(message, client_address), message, client_address, trace
+            )
+        if self.processing_pool is not None:
+            return self.processing_pool.submit(client_address[0], message, client_address, trace)
+        return None
+    
+    def _lane_key(self, message, client_address):
+        """
+        Clé d'ordonnancement: ID patient (PID-3), sinon adresse de la source
+        
+        Args:
+            message (str): Message HL7 reçu
+            client_address (tuple): Adresse du client
+        
+        Returns:
+            str: Clé de la file
+        """
+        try:
+            patient_id = parse_er7(message).value("PID-3-1")
+        except ER7ParseError:
+            patient_id = ""
+        return patient_id or client_address[0]
+    
+    def _reject(self, message, reason):
+        """
+        Construit un ACK de rejet (AR) sans traiter le message
+        
+        Args:
+            message (str): Message HL7 rejeté
+            reason (str): Motif du rejet
+        
+        Returns:
+            bytes: Trame MLLP de l'ACK AR
+        """
+        try:
+            control_id = parse_er7(message).control_id or ""
+        except ER7ParseError:
+            control_id = ""
+        self.logger.warning(f"Message {control_id} rejeté: {reason}")
+        self._acks.inc("AR", self._message_type_label(message))
+        return self._frame_response(self.create_error_ack(reason, ack_code="AR", control_id=control_id))
+    
     def handle_message(self, message, client_address):
         """
         Traite un message HL7 reçu
@@ -268,85 +740,124 @@ class MLLPServer:
         Returns:
             str: Message ACK à renvoyer
         """
+        msg_obj = None
+        # MSA-2 vide tant que MSH-10 est inconnu: le client ne peut pas
+        # confondre l'ACK avec celui d'un autre message
+        control_id = ""
         try:
-            # Parser le message basique (sans bibliothèque HL7)
-            lines = message.replace('\r', '\n').split('\n')
-            msh_line = None
-            pid_line = None
-            
-            for line in lines:
-                if line.startswith('MSH|'):
-                    msh_line = line
-                elif line.startswith('PID|'):
-                    pid_line = line
-            
-            if not msh_line:
-                return self.create_error_ack("Message HL7 invalide: pas de segment MSH")
-            
-            # Extraire les informations de base
-            msh_parts = msh_line.split('|')
-            message_type = msh_parts[8] if len(msh_parts) > 8 else "UNKNOWN"
-            control_id = msh_parts[9] if len(msh_parts) > 9 else "1"
+            parse_started = time.perf_counter()
+            # Parser le message (parser ER7 natif, découpage à la demande)
+            with self.tracer.span("parse"):
+                try:
+                    parsed = parse_er7(message)
+                except ER7ParseError:
+                    parsed = None
+                msh = parsed.segment('MSH') if parsed else None
+                
+                if msh is None:
+                    return self.create_error_ack("Message HL7 invalide: pas de segment MSH",
+                                                 control_id=control_id)
+                
+                # Extraire les informations de base
+                message_type = msh.field(9) if len(msh) > 8 else "UNKNOWN"
+                control_id = msh.field(10) if len(msh) > 9 else ""
+                # Source stable pour les statistiques: application émettrice
+                # (MSH-3), sinon adresse IP sans le port éphémère
+                source = (msh.component(3, 1) if len(msh) > 2 else "") or client_address[0]
+                pid_segment = parsed.segment('PID')
+            self.tracer.annotate(message_type=message_type, control_id=control_id)
             
-            print(f"📋 Type de message: {message_type}")
-            print(f"🆔 ID de contrôle: {control_id}")
+            self.logger.debug("Message %s de type %s", control_id, message_type)
             
             # Extraire les informations patient si disponibles
             patient_data = {}
-            if pid_line:
-                patient_data = self.extract_patient_info_basic(pid_line)
+            patient = None
+            if pid_segment:
+                with self.tracer.span("extract_patient"):
+                    patient_data = self.extract_patient_info_basic(pid_segment)
                 if patient_data.get('id'):
-                    print(f"👤 Patient trouvé: {patient_data['id']} - {patient_data.get('name', 'N/A')}")
+                    self.logger.debug("Patient trouvé: %s", patient_data['id'])
                     
-                    # Sauvegarder le patient si repository disponible
                     if self.patient_repo and Patient:
-                        try:
-                            patient = Patient(
-                                id=patient_data.get('id'),
-                                first_name=patient_data.get('first_name'),
-                                last_name=patient_data.get('last_name'),
-                                birth_date=patient_data.get('birth_date'),
-                                gender=patient_data.get('gender')
-                            )
-                            
-                            self.patient_repo.create(patient)
-                            print(f"💾 Patient {patient.id} enregistré en base")
-                            
-                        except Exception as e:
-                            print(f"⚠️ Erreur sauvegarde patient: {str(e)}")
+                        patient = Patient(
+                            id=patient_data.get('id'),
+                            first_name=patient_data.get('first_name'),
+                            last_name=patient_data.get('last_name'),
+                            birth_date=patient_data.get('birth_date'),
+                            gender=patient_data.get('gender')
+                        )
+            self._parse_time.observe(time.perf_counter() - parse_started)
             
-            # Sauvegarder le message si repository disponible
             if self.message_repo and Message:
-                try:
-                    msg_obj = Message(
-                        message_type=message_type,
-                        content=message,
-                        source=f"{client_address[0]}:{client_address[1]}",
-                        destination="HL7_SERVER",
-                        patient_id=patient_data.get('id'),
-                        status="PROCESSED"
-                    )
-                    
-                    self.message_repo.save(msg_obj)
-                    print(f"💾 Message sauvegardé avec ID: {msg_obj.id[:8]}")
-                    
-                except Exception as e:
-                    print(f"⚠️ Erreur sauvegarde message: {str(e)}")
+                msg_obj = Message(
+                    message_type=message_type,
+                    content=message,
+                    source=source,
+                    destination="HL7_SERVER",
+                    patient_id=patient_data.get('id'),
+                    status="PROCESSED",
+                    ack_code="AA"
+                )
+            
+            persist_started = time.perf_counter()
+            with self.tracer.span("persist"):
+                if self.write_behind:
+                    # Écriture différée: l'ACK n'attend pas le disque (ou attend
+                    # le lot groupé en mode commit-before-ack)
+                    try:
+                        self.write_behind.submit(patient, msg_obj)
+                    except WriteBehindFull as e:
+                        self.logger.warning(str(e))
+                        return self.create_error_ack(f"Serveur saturé: {str(e)}", control_id=control_id)
+                    except Exception as e:
+                        self.logger.warning(f"Erreur sauvegarde: {str(e)}")
+                        return self.create_error_ack(f"Erreur sauvegarde: {str(e)}", control_id=control_id)
+                else:
+                    self._save_sync(patient, msg_obj)
+            self._persistence_time.observe(time.perf_counter() - persist_started)
             
             # Créer et renvoyer un ACK de succès
-            return self.create_success_ack(message_type, control_id)
+            with self.tracer.span("ack"):
+                return self.create_success_ack(message_type, control_id)
             
         except Exception as e:
             error_msg = f"Erreur traitement message: {str(e)}"
-            print(f"❌ {error_msg}")
-            return self.create_error_ack(error_msg)
+            self.logger.error(error_msg)
+            if msg_obj is not None and not self.write_behind:
+                # Conserver la trace de l'échec (statistiques AE)
+                msg_obj.status = "ERROR"
+                msg_obj.ack_code = "AE"
+                self._save_sync(None, msg_obj)
+            return self.create_error_ack(error_msg, control_id=control_id)
+    
+    def _save_sync(self, patient, msg_obj):
+        """
+        Enregistre le patient et le message avant de renvoyer l'ACK
+        
+        Args:
+            patient (Patient): Patient à enregistrer ou None
+            msg_obj (Message): Message à enregistrer ou None
+        """
+        if patient is not None:
+            try:
+                self.patient_repo.create(patient)
+                self.logger.debug("Patient %s enregistré en base", patient.id)
+            except Exception as e:
+                self.logger.warning(f"Erreur sauvegarde patient: {str(e)}")
+        
+        if msg_obj is not None:
+            try:
+                self.message_repo.save(msg_obj)
+                self.logger.debug("Message sauvegardé avec ID: %s", msg_obj.id[:8])
+            except Exception as e:
+                self.logger.warning(f"Erreur sauvegarde message: {str(e)}")
     
     def extract_patient_info_basic(self, pid_line):
         """
-        Extrait les informations patient d'une ligne PID de manière basique
+        Extrait les informations patient d'un segment PID
         
         Args:
-            pid_line (str): Ligne PID du message HL7
+            pid_line (str or ER7Segment): Ligne PID du message HL7
         
         Returns:
             dict: Informations du patient
@@ -354,31 +865,30 @@ class MLLPServer:
         patient_info = {}
         
         try:
-            parts = pid_line.split('|')
+            pid = pid_line if isinstance(pid_line, ER7Segment) else ER7Segment(pid_line)
             
             # PID-3: ID patient
-            if len(parts) > 3 and parts[3]:
-                patient_info['id'] = parts[3].split('^')[0]
+            if pid.field(3):
+                patient_info['id'] = pid.component(3, 1)
             
             # PID-5: Nom du patient (Nom^Prénom)
-            if len(parts) > 5 and parts[5]:
-                name_parts = parts[5].split('^')
-                if len(name_parts) >= 1:
-                    patient_info['last_name'] = name_parts[0]
-                if len(name_parts) >= 2:
-                    patient_info['first_name'] = name_parts[1]
+            name_field = pid.field(5)
+            if name_field:
+                patient_info['last_name'] = pid.component(5, 1)
+                if pid.encoding.component in name_field:
+                    patient_info['first_name'] = pid.component(5, 2)
                 patient_info['name'] = f"{patient_info.get('last_name', '')} {patient_info.get('first_name', '')}".strip()
             
             # PID-7: Date de naissance
-            if len(parts) > 7 and parts[7]:
-                patient_info['birth_date'] = parts[7]
+            if pid.field(7):
+                patient_info['birth_date'] = pid.field(7)
             
             # PID-8: Sexe
-            if len(parts) > 8 and parts[8]:
-                patient_info['gender'] = parts[8]
+            if pid.field(8):
+                patient_info['gender'] = pid.field(8)
             
         except Exception as e:
-            print(f"⚠️ Erreur extraction infos patient: {str(e)}")
+            self.logger.warning(f"Erreur extraction infos patient: {str(e)}")
         
         return patient_info
     
@@ -398,12 +908,15 @@ class MLLPServer:
         
         return ack
     
-    def create_error_ack(self, error_message):
+    @staticmethod
+    def create_error_ack(error_message, ack_code="AE", control_id="1"):
         """
         Crée un ACK d'erreur
         
         Args:
             error_message (str): Description de l'erreur
+            ack_code (str, optional): AE (erreur) ou AR (rejet, ex: surcharge)
+            control_id (str, optional): ID de contrôle du message concerné
         
         Returns:
             str: Message ACK négatif
@@ -412,8 +925,9 @@ class MLLPServer:
         # Limiter la longueur du message d'erreur
         if len(error_message) > 100:
             error_message = error_message[:97] + "..."
+        error_message = escape(error_message)
         
-        ack = f"""MSH|^~\\&|HL7_SERVER|HOSPITAL|HL7_CLIENT|HOSPITAL|{current_time}||ACK|1|P|2.5\rMSA|AE|1|{error_message}\r"""
+        ack = f"""MSH|^~\\&|HL7_SERVER|HOSPITAL|HL7_CLIENT|HOSPITAL|{current_time}||ACK|{control_id}|P|2.5\rMSA|{ack_code}|{control_id}|{error_message}\r"""
         
         return ack
     
@@ -425,25 +939,116 @@ class MLLPServer:
             self.server.close()
 
 
+def parse_arguments(argv=None):
+    """
+    Analyse les arguments de ligne de commande du serveur
+    
+    Args:
+        argv (list, optional): Arguments (sys.argv[1:] par défaut)
+    
+    Returns:
+        argparse.Namespace: Arguments analysés
+    """
+    parser = argparse.ArgumentParser(description="Serveur HL7 MLLP")
+    parser.add_argument("port", nargs="?", default="2575",
+                        help="Port d'écoute (2575 par défaut)")
+    parser.add_argument("--host", default="0.0.0.0",
+                        help="Adresse d'écoute (0.0.0.0 par défaut)")
+    parser.add_argument("--engine", choices=("threads", "asyncio"), default="threads",
+                        help="Moteur réseau: un thread par connexion ou boucle asyncio unique")
+    parser.add_argument("--backlog", type=int, default=None,
+                        help="Taille de la file d'attente des connexions")
+    parser.add_argument("--persistence", choices=PERSISTENCE_MODES, default="sync",
+                        help="Écriture en base: synchrone ou différée (commit avant/après l'ACK)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Nombre de processus partageant le port (SO_REUSEPORT)")
+    parser.add_argument("--pool-size", type=int, default=None,
+                        help="Threads de traitement (active le contrôle d'admission)")
+    parser.add_argument("--max-in-flight", type=int, default=256,
+                        help="Messages en cours au-delà desquels le serveur répond AR")
+    parser.add_argument("--max-per-source", type=int, default=None,
+                        help="Même limite pour une seule adresse IP source (aucune par défaut)")
+    parser.add_argument("--lanes", type=int, default=None,
+                        help="Files ordonnées par patient (PID-3), traitées en parallèle")
+    parser.add_argument("--log-level", choices=("DEBUG", "INFO", "WARNING", "ERROR"), default="INFO",
+                        help="Niveau du journal par message (INFO par défaut)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="Mode production: seuls les avertissements et erreurs sont journalisés")
+    parser.add_argument("--log-payload-every", type=int, default=100,
+                        help="Journaliser le contenu d'un message sur N (0 = jamais)")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Port HTTP local de l'endpoint /metrics (format Prometheus)")
+    parser.add_argument("--trace-file", default=None,
+                        help="Fichier tournant des durées par étape de chaque message (JSON)")
+    parser.add_argument("--config", default=DEFAULT_CONFIG_PATH,
+                        help="Fichier de configuration (sections \"rate_limit\" et \"timeouts\")")
+    parser.add_argument("--no-rate-limit", action="store_true",
+                        help="Désactiver la limite de débit par IP même si la configuration l'active")
+    parser.add_argument("--department", default=None,
+                        help="Département dont les délais s'appliquent (section \"timeouts\")")
+    return parser.parse_args(argv)
+
+
 def main():
     """Point d'entrée principal du serveur"""
     print("🏥 Serveur HL7 MLLP - Version Corrigée")
     print("=" * 50)
     
+    args = parse_arguments()
+    log_level = "WARNING" if args.quiet else args.log_level
+    
     # Configuration par défaut
-    host = "0.0.0.0"
+    host = args.host
     port = 2575
     
-    # Vérifier les arguments de ligne de commande
-    if len(sys.argv) > 1:
-        try:
-            port = int(sys.argv[1])
+    # Vérifier le port passé en ligne de commande
+    try:
+        port = int(args.port)
+        if port != 2575:
             print(f"🔧 Port personnalisé: {port}")
-        except ValueError:
-            print(f"⚠️ Port invalide '{sys.argv[1]}', utilisation du port par défaut {port}")
+    except ValueError:
+        print(f"⚠️ Port invalide '{args.port}', utilisation du port par défaut {port}")
+    
+    rate_limits = None if args.no_rate_limit else load_rate_limits(args.config)
+    if rate_limits:
+        print(f"⛔ Limite par IP: {rate_limits['connections_per_second']} connexion(s)/s, "
+              f"{rate_limits['messages_per_second']} message(s)/s")
+    timeouts = load_timeouts(args.config, args.department)
+    print(f"⏱️ Délais: lecture {timeouts['read']}s, inactivité {timeouts['idle'] or '∞'}s, "
+          f"écriture {timeouts['write']}s")
     
     # Créer et démarrer le serveur
-    server = MLLPServer(host, port)
+    if args.engine == "asyncio":
+        from app.network.async_mllp_server import AsyncMLLPServer
+        print("⚡ Moteur asyncio: toutes les connexions dans une seule boucle")
+        server_class = AsyncMLLPServer
+        backlog = args.backlog or socket.SOMAXCONN
+    else:
+        server_class = MLLPServer
+        backlog = args.backlog or 5
+    
+    if args.workers > 1:
+        from app.network.multiprocess_server import MultiProcessMLLPServer
+        print(f"🧩 Mode multi-processus: {args.workers} ouvriers sur le port {port}")
+        server = MultiProcessMLLPServer(host, port, workers=args.workers,
+                                        server_class=server_class, backlog=backlog,
+                                        persistence=args.persistence, pool_size=args.pool_size,
+                                        max_in_flight=args.max_in_flight,
+                                        max_per_source=args.max_per_source, lanes=args.lanes,
+                                        log_level=log_level,
+                                        payload_sample_every=args.log_payload_every,
+                                        metrics_port=args.metrics_port,
+                                        trace_file=args.trace_file,
+                                        rate_limits=rate_limits, timeouts=timeouts)
+    else:
+        server = server_class(host, port, backlog=backlog, persistence=args.persistence,
+                              pool_size=args.pool_size, max_in_flight=args.max_in_flight,
+                              max_per_source=args.max_per_source,
+                              lanes=args.lanes, log_level=log_level,
+                              payload_sample_every=args.log_payload_every,
+                              metrics_port=args.metrics_port,
+                              trace_file=args.trace_file,
+                              rate_limits=rate_limits, timeouts=timeouts)
     
     try:
         success = server.start()
@@ -456,8 +1061,10 @@ def main():
         traceback.print_exc()
         sys.exit(1)
     finally:
+        # Écrire les enregistrements encore en file avant de quitter
+        stop_queue_logger("HL7Messenger.MLLPServer")
         print("👋 Au revoir!")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
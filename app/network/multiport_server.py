@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+Écoute MLLP multi-ports dans une seule boucle asyncio.
+Tous les ports départementaux (section "hosts" de resources/config.json)
+sont ouverts dans la même boucle d'événements, sans thread d'acceptation ni
+thread par client. Chaque port est associé à un gestionnaire de département
+qui reçoit le message décodé et renvoie l'ACK. Les délais de lecture,
+d'inactivité et d'écriture (propres à chaque département) sont gérés par
+une roue temporelle commune à tous les ports.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.network.mllp_framing import DEFAULT_MAX_FRAME_SIZE, MLLPFrameDecoder, MLLPFrameError, encode_frame
+from app.network.mllp_server import MLLPServer
+from app.network.timeouts import ConnectionDeadline, TimerWheel
+
+logger = logging.getLogger("HL7Messenger.MultiPortMLLPServer")
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_CONFIG_PATH = os.path.join(ROOT_DIR, 'resources', 'config.json')
+
+
+def load_department_ports(config_path=DEFAULT_CONFIG_PATH):
+    """
+    Lit les ports départementaux dans la section "hosts" de la configuration
+
+    Args:
+        config_path (str, optional): Chemin du fichier config.json
+
+    Returns:
+        dict: {port: nom du département}, ex: {2576: 'ADMISSION_SYSTEM'}
+    """
+    with open(config_path, 'r', encoding='utf-8') as f:
+        hosts = json.load(f).get('hosts', {})
+    return {int(info['port']): name for name, info in hosts.items() if 'port' in info}
+
+
+class MultiPortMLLPServer:
+    """Serveur MLLP écoutant sur plusieurs ports dans une seule boucle"""
+
+    def __init__(self, departments, host="0.0.0.0", timeout=10,
+                 max_message_size=DEFAULT_MAX_FRAME_SIZE, max_workers=0, timeouts=None):
+        """
+        Initialise le serveur
+
+        Args:
+            departments (dict): {port: (nom, gestionnaire)}; le gestionnaire
+                reçoit (message, nom, adresse client) et renvoie l'ACK (str)
+            host (str, optional): Adresse d'écoute
+            timeout (int, optional): Délai par défaut (secondes) de lecture,
+                d'inactivité et d'écriture des départements sans délais propres
+            max_message_size (int, optional): Taille maximale d'un message (octets)
+            max_workers (int, optional): Threads pour les gestionnaires bloquants
+                (accès base...); 0 pour les exécuter directement dans la boucle
+            timeouts (dict, optional): {nom du département: {"read", "idle", "write"}}
+                (voir timeouts.load_timeouts)
+        """
+        self.departments = departments
+        self.host = host
+        self.timeout = timeout
+        default_timeouts = {"read": timeout, "idle": timeout, "write": timeout}
+        self.timeouts = {name: (timeouts or {}).get(name, default_timeouts)
+                         for name, _ in departments.values()}
+        self.timer_wheel = TimerWheel()
+        self.max_message_size = max_message_size
+        self.max_workers = max_workers
+        self.running = False
+        self.messages_received = {name: 0 for name, _ in departments.values()}
+        self.connections_open = 0
+        self._loop = None
+        self._servers = []
+        self._writers = set()
+        self._executor = None
+        self._ready = threading.Event()
+
+    def start(self):
+        """
+        Démarre l'écoute sur tous les ports et bloque jusqu'à l'arrêt
+
+        Returns:
+            bool: True si le serveur s'est arrêté proprement, False sinon
+        """
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("\n🛑 Arrêt demandé par l'utilisateur...")
+        except OSError as e:
+            print(f"❌ Erreur de binding: {e}")
+            return False
+        finally:
+            self._ready.set()
+        return True
+
+    def wait_ready(self, timeout=None):
+        """Attend que tous les ports soient ouverts (ou que le démarrage échoue)"""
+        return self._ready.wait(timeout)
+
+    async def serve(self):
+        """Coroutine principale: ouvre tous les ports et sert jusqu'à l'arrêt"""
+        self._loop = asyncio.get_running_loop()
+        self.timer_wheel.run_in_loop(self._loop)
+        if self.max_workers:
+            self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="mllp-dept")
+
+        try:
+            for port, (name, handler) in self.departments.items():
+                server = await asyncio.start_server(
+                    lambda r, w, name=name, handler=handler: self._handle_connection(r, w, name, handler),
+                    self.host, port, reuse_address=True
+                )
+                self._servers.append(server)
+                print(f"✅ {name} en écoute sur {self.host}:{port}")
+
+            self.running = True
+            self._ready.set()
+            await asyncio.gather(*(server.serve_forever() for server in self._servers))
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.running = False
+            self.timer_wheel.stop()
+            for server in self._servers:
+                server.close()
+            if self._executor:
+                self._executor.shutdown(wait=False)
+
+    async def _handle_connection(self, reader, writer, name, handler):
+        """
+        Lit les trames d'un client et renvoie les ACK du gestionnaire du port
+
+        Args:
+            reader (asyncio.StreamReader): Flux de lecture
+            writer (asyncio.StreamWriter): Flux d'écriture
+            name (str): Département associé au port
+            handler (callable): Gestionnaire du département
+        """
+        address = writer.get_extra_info("peername")[:2]
+        self.connections_open += 1
+        self._writers.add(writer)
+        decoder = MLLPFrameDecoder(self.max_message_size)
+        deadline = ConnectionDeadline(self.timer_wheel, self.timeouts[name],
+                                      lambda kind: writer.transport.abort())
+
+        try:
+            deadline.received(0)
+            while self.running:
+                data = await reader.read(65536)
+                if not data:
+                    break
+
+                try:
+                    frames = decoder.feed(data)
+                except MLLPFrameError as e:
+                    # Même réponse que MLLPServer: ACK d'erreur puis fermeture
+                    logger.error("Trame rejetée de %s:%s (%s): %s", address[0], address[1], name, e)
+                    writer.write(encode_frame(MLLPServer.create_error_ack(str(e))))
+                    deadline.writing()
+                    await writer.drain()
+                    break
+
+                for raw_message in frames:
+                    message = raw_message.decode('utf-8', errors='replace')
+                    self.messages_received[name] += 1
+                    deadline.processing()
+                    if self._executor:
+                        ack = await self._loop.run_in_executor(
+                            self._executor, handler, message, name, address
+                        )
+                    else:
+                        ack = handler(message, name, address)
+                    writer.write(encode_frame(ack))
+                if frames:
+                    deadline.writing()
+                await writer.drain()
+                deadline.received(len(decoder), len(frames))
+        except (ConnectionError, OSError) as e:
+            if deadline.expired is None:
+                logger.error("Erreur client %s:%s (%s): %s", address[0], address[1], name, e)
+        finally:
+            deadline.cancel()
+            if deadline.expired:
+                logger.info("Timeout (%s) pour %s:%s (%s)", deadline.expired, address[0], address[1], name)
+            self.connections_open -= 1
+            self._writers.discard(writer)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    def stop(self):
+        """Arrête l'écoute sur tous les ports (appelable depuis un autre thread)"""
+        self.running = False
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._close_all)
+
+    def _close_all(self):
+        """Ferme tous les ports et toutes les connexions (dans la boucle)"""
+        for server in self._servers:
+            server.close()
+        for writer in list(self._writers):
+            writer.close()
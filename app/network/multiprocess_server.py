@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+"""
+Serveur MLLP multi-processus.
+N processus ouvriers écoutent sur le même port grâce à SO_REUSEPORT: le
+noyau répartit les connexions entrantes entre eux et chaque ouvrier exécute
+le traitement habituel (MLLPServer ou AsyncMLLPServer) avec son propre GIL.
+Un superviseur redémarre les ouvriers qui s'arrêtent anormalement et agrège
+leurs compteurs, publiés dans une mémoire partagée.
+"""
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+from app.db.write_behind import ACK_THEN_COMMIT, default_journal_path
+from app.network.mllp_server import MLLPServer
+
+# Compteurs publiés par chaque ouvrier (un emplacement par ouvrier et compteur)
+COUNTERS = ("messages_received", "clients_connected")
+
+
+def _worker_main(index, server_class, server_kwargs, counters, report_interval):
+    """
+    Point d'entrée d'un processus ouvrier
+
+    Args:
+        index (int): Numéro de l'ouvrier
+        server_class (type): MLLPServer ou une sous-classe
+        server_kwargs (dict): Arguments du serveur
+        counters (multiprocessing.Array): Compteurs partagés
+        report_interval (float): Période de publication des compteurs (secondes)
+    """
+    if server_kwargs.get("metrics_port"):
+        # Un endpoint de métriques par ouvrier: port de base + numéro
+        server_kwargs = dict(server_kwargs, metrics_port=server_kwargs["metrics_port"] + index)
+    if server_kwargs.get("trace_file"):
+        # Un fichier de traces par ouvrier (la rotation n'est pas partageable)
+        root, ext = os.path.splitext(server_kwargs["trace_file"])
+        server_kwargs = dict(server_kwargs, trace_file=f"{root}.{index}{ext}")
+    if server_kwargs.get("persistence") == ACK_THEN_COMMIT:
+        # Un journal d'écriture différée par ouvrier, rejoué à son redémarrage
+        root, ext = os.path.splitext(server_kwargs.get("write_behind_journal") or default_journal_path())
+        server_kwargs = dict(server_kwargs, write_behind_journal=f"{root}.{index}{ext}")
+    server = server_class(reuse_port=True, **server_kwargs)
+    base = index * len(COUNTERS)
+
+    def publish():
+        for offset, name in enumerate(COUNTERS):
+            counters[base + offset] = getattr(server, name)
+
+    def reporter():
+        while True:
+            publish()
+            time.sleep(report_interval)
+
+    threading.Thread(target=reporter, name="counters", daemon=True).start()
+    # Arrêt propre demandé par le superviseur
+    signal.signal(signal.SIGTERM, lambda signum, frame: server.stop())
+
+    success = server.start()
+    publish()
+    sys.exit(0 if success else 1)
+
+
+class MultiProcessMLLPServer:
+    """Superviseur d'un groupe de processus MLLP partageant le même port"""
+
+    def __init__(self, host="0.0.0.0", port=2575, workers=None, server_class=MLLPServer,
+                 restart_delay=1.0, max_restart_delay=30.0, report_interval=1.0,
+                 **server_kwargs):
+        """
+        Initialise le superviseur
+
+        Args:
+            host (str): Host d'écoute
+            port (int): Port d'écoute
+            workers (int, optional): Nombre de processus (nombre de cœurs par défaut)
+            server_class (type, optional): Classe de serveur exécutée par chaque ouvrier
+            restart_delay (float, optional): Délai avant redémarrage d'un ouvrier
+            max_restart_delay (float, optional): Délai maximal quand un ouvrier
+                s'arrête à répétition juste après son démarrage
+            report_interval (float, optional): Période de publication des compteurs
+            **server_kwargs: Arguments transmis au serveur (backlog, persistence...)
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.server_class = server_class
+        self.server_kwargs = dict(server_kwargs, host=host, port=port)
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.report_interval = report_interval
+        self.running = False
+        self.restarts = 0
+
+        self._context = multiprocessing.get_context()
+        self._counters = self._context.Array('q', self.workers * len(COUNTERS), lock=False)
+        self._retired = [0] * len(COUNTERS)  # Compteurs des ouvriers remplacés
+        self._processes = [None] * self.workers
+        self._started_at = [0.0] * self.workers
+        self._delays = [restart_delay] * self.workers
+        self._restart_at = {}
+        self._stop_event = threading.Event()
+
+    @property
+    def messages_received(self):
+        """Nombre total de messages reçus par tous les ouvriers"""
+        return self.stats()["messages_received"]
+
+    def stats(self):
+        """
+        Agrège les compteurs de tous les ouvriers (actuels et remplacés)
+
+        Returns:
+            dict: Compteurs totaux, nombre de redémarrages et d'ouvriers actifs
+        """
+        totals = {}
+        for offset, name in enumerate(COUNTERS):
+            totals[name] = self._retired[offset] + sum(
+                self._counters[i * len(COUNTERS) + offset] for i in range(self.workers)
+            )
+        totals["restarts"] = self.restarts
+        totals["workers_alive"] = sum(1 for p in self._processes if p is not None and p.is_alive())
+        return totals
+
+    def worker_pids(self):
+        """Renvoie les PID des ouvriers en cours d'exécution"""
+        return [p.pid for p in self._processes if p is not None and p.is_alive()]
+
+    def start(self):
+        """
+        Démarre les ouvriers et les supervise jusqu'à l'arrêt
+
+        Returns:
+            bool: True si le serveur s'est arrêté proprement, False sinon
+        """
+        if not hasattr(socket, "SO_REUSEPORT"):
+            print("❌ SO_REUSEPORT n'est pas disponible sur ce système: utilisez --workers 1")
+            return False
+
+        print(f"🚀 Démarrage de {self.workers} processus HL7 sur {self.host}:{self.port}...")
+        self.running = True
+        if threading.current_thread() is threading.main_thread():
+            # SIGTERM (kill, systemd): arrêter aussi les ouvriers
+            signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        try:
+            for index in range(self.workers):
+                self._spawn(index)
+            self._supervise()
+        except KeyboardInterrupt:
+            print("\n🛑 Arrêt demandé par l'utilisateur...")
+        finally:
+            self._shutdown()
+
+        return True
+
+    def stop(self):
+        """Arrête le superviseur et ses ouvriers (appelable depuis un autre thread)"""
+        self._stop_event.set()
+
+    def _spawn(self, index):
+        base = index * len(COUNTERS)
+        for offset in range(len(COUNTERS)):
+            self._counters[base + offset] = 0
+        process = self._context.Process(
+            target=_worker_main,
+            args=(index, self.server_class, self.server_kwargs,
+                  self._counters, self.report_interval),
+            name=f"mllp-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+        self._started_at[index] = time.monotonic()
+        print(f"👷 Ouvrier #{index} démarré (PID {process.pid})")
+
+    def _supervise(self):
+        """Boucle du superviseur: détecte les ouvriers arrêtés et les redémarre"""
+        while not self._stop_event.is_set():
+            sentinels = [p.sentinel for p in self._processes if p is not None]
+            multiprocessing.connection.wait(sentinels, timeout=0.2)
+
+            now = time.monotonic()
+            for index, process in enumerate(self._processes):
+                if process is None or process.is_alive() or self._stop_event.is_set():
+                    continue
+                process.join()
+                self._retire(index)
+                self._processes[index] = None
+
+                # Ouvrier arrêté juste après son démarrage: espacer les tentatives
+                if now - self._started_at[index] < 5.0:
+                    delay = min(self._delays[index] * 2, self.max_restart_delay)
+                else:
+                    delay = self.restart_delay
+                self._delays[index] = delay
+                self._restart_at[index] = now + delay
+                print(f"💥 Ouvrier #{index} arrêté (code {process.exitcode}), "
+                      f"redémarrage dans {delay:.1f}s")
+
+            for index, due in list(self._restart_at.items()):
+                if now >= due and not self._stop_event.is_set():
+                    del self._restart_at[index]
+                    self.restarts += 1
+                    self._spawn(index)
+
+    def _retire(self, index):
+        """Ajoute les compteurs d'un ouvrier arrêté aux totaux"""
+        base = index * len(COUNTERS)
+        for offset in range(len(COUNTERS)):
+            self._retired[offset] += self._counters[base + offset]
+            self._counters[base + offset] = 0
+
+    def _shutdown(self):
+        """Arrête tous les ouvriers et affiche les statistiques agrégées"""
+        self.running = False
+        processes = [p for p in self._processes if p is not None]
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join(5)
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+        stats = self.stats()
+        print(f"📊 Statistiques agrégées ({self.workers} processus):")
+        print(f"   - Connexions reçues: {stats['clients_connected']}")
+        print(f"   - Messages traités: {stats['messages_received']}")
+        print(f"   - Redémarrages d'ouvriers: {stats['restarts']}")
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Files de traitement ordonnées par patient.
+Chaque message est affecté à l'une des N files (lanes) selon un hachage
+stable de son identifiant patient (PID-3). Une file est servie par un seul
+thread: les messages d'un même patient (ex: ADT^A01 puis ADT^A08) sont donc
+traités strictement dans leur ordre d'arrivée, tandis que des patients
+différents sont traités en parallèle sur les autres files.
+"""
+import queue
+import threading
+import zlib
+from concurrent.futures import Future
+
+from app.network.processing_pool import Overloaded
+
+
+class PatientLaneScheduler:
+    """Répartiteur de messages sur des files ordonnées par patient"""
+
+    def __init__(self, handler, lanes=8, max_in_flight=256):
+        """
+        Initialise le répartiteur (un thread par file, démarré immédiatement)
+
+        Args:
+            handler (callable): Fonction de traitement appelée avec les
+                arguments passés à submit()
+            lanes (int, optional): Nombre de files
+            max_in_flight (int, optional): Nombre maximal de messages en cours,
+                toutes files confondues
+        """
+        self.handler = handler
+        self.lanes = lanes
+        self.max_in_flight = max_in_flight
+
+        self._lock = threading.Lock()
+        self._queues = [queue.SimpleQueue() for _ in range(lanes)]
+        self._in_flight = 0
+        self._closed = False
+
+        # Métriques par file
+        self.depths = [0] * lanes       # Messages en file ou en traitement
+        self.max_depths = [0] * lanes   # Profondeur maximale observée
+        self.processed = [0] * lanes
+        self.rejected = 0
+
+        self._threads = [
+            threading.Thread(target=self._worker, args=(lane,), name=f"hl7-lane-{lane}", daemon=True)
+            for lane in range(lanes)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def in_flight(self):
+        """Nombre de messages en file ou en traitement"""
+        return self._in_flight
+
+    def lane_for(self, key):
+        """
+        Renvoie la file d'un identifiant (hachage stable d'un processus à l'autre)
+
+        Args:
+            key (str): Identifiant patient (PID-3)
+
+        Returns:
+            int: Numéro de la file
+        """
+        return zlib.crc32(str(key).encode('utf-8')) % self.lanes
+
+    def submit(self, key, *args):
+        """
+        Place un message dans la file de son patient
+
+        Args:
+            key (str): Identifiant patient (PID-3) ou, à défaut, de la source
+            *args: Arguments transmis au gestionnaire
+
+        Returns:
+            Future: Résultat du gestionnaire
+
+        Raises:
+            Overloaded: Si max_in_flight messages sont déjà en cours, ou si
+                le répartiteur est arrêté
+        """
+        lane = self.lane_for(key)
+        future = Future()
+        with self._lock:
+            if self._closed:
+                self.rejected += 1
+                raise Overloaded("Files patients arrêtées")
+            if self._in_flight >= self.max_in_flight:
+                self.rejected += 1
+                raise Overloaded(f"Serveur saturé ({self.max_in_flight} messages en cours)")
+            self._in_flight += 1
+            depth = self.depths[lane] + 1
+            self.depths[lane] = depth
+            if depth > self.max_depths[lane]:
+                self.max_depths[lane] = depth
+            # Sous le verrou: aucun message ne peut suivre le marqueur d'arrêt
+            self._queues[lane].put((future, args))
+        return future
+
+    def stats(self):
+        """
+        Renvoie les métriques des files
+
+        Returns:
+            dict: Profondeurs actuelles et maximales, messages traités par
+                file, et nombre de rejets
+        """
+        with self._lock:
+            return {
+                'lanes': self.lanes,
+                'depths': list(self.depths),
+                'max_depths': list(self.max_depths),
+                'processed': list(self.processed),
+                'rejected': self.rejected,
+            }
+
+    def shutdown(self, wait=True):
+        """
+        Arrête les files: les messages en cours de traitement se terminent,
+        ceux encore en attente sont annulés (leur Future lève CancelledError)
+        et toute soumission ultérieure est refusée
+
+        Args:
+            wait (bool, optional): Attendre la fin des threads
+        """
+        with self._lock:
+            if not self._closed:
+                self._closed = True
+                for lane, lane_queue in enumerate(self._queues):
+                    self._cancel_pending(lane, lane_queue)
+                    lane_queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _cancel_pending(self, lane, lane_queue):
+        """Annule les messages encore en attente dans une file (verrou détenu)"""
+        while True:
+            try:
+                future, _ = lane_queue.get_nowait()
+            except queue.Empty:
+                return
+            future.cancel()
+            self._in_flight -= 1
+            self.depths[lane] -= 1
+
+    def _worker(self, lane):
+        lane_queue = self._queues[lane]
+        while True:
+            item = lane_queue.get()
+            if item is None:
+                return
+            future, args = item
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(self.handler(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+
+            with self._lock:
+                self._in_flight -= 1
+                self.depths[lane] -= 1
+                self.processed[lane] += 1
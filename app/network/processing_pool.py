@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+Pool de traitement borné pour les messages HL7 reçus.
+Les connexions ne traitent plus les messages elles-mêmes: elles déposent
+les trames décodées dans une file par source (adresse IP de l'interface
+émettrice), servie à tour de rôle par un nombre fixe de threads. Le nombre
+de messages en cours (en file + en traitement) est borné globalement et
+par source: au-delà, submit() lève Overloaded immédiatement et le serveur
+répond par un ACK de rejet, sans attendre.
+"""
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+
+class Overloaded(Exception):
+    """Capacité de traitement atteinte (globale ou pour une source)"""
+
+
+class ProcessingPool:
+    """Threads de traitement avec admission bornée et équité entre sources"""
+
+    def __init__(self, handler, workers=8, max_in_flight=256, max_per_source=None):
+        """
+        Initialise le pool (les threads démarrent immédiatement)
+
+        Args:
+            handler (callable): Fonction de traitement appelée avec les
+                arguments passés à submit(); sa valeur de retour devient
+                le résultat du Future
+            workers (int, optional): Nombre de threads de traitement
+            max_in_flight (int, optional): Nombre maximal de messages en cours
+            max_per_source (int, optional): Nombre maximal de messages en cours
+                pour une même source (moitié de max_in_flight par défaut)
+        """
+        self.handler = handler
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+        self.max_per_source = max_per_source or max(1, max_in_flight // 2)
+
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._queues = {}         # source -> deque de (future, args)
+        self._ready = deque()     # sources ayant des messages en attente (tour de rôle)
+        self._in_flight = {}      # source -> messages en file ou en traitement
+        self._total_in_flight = 0
+        self._running = True
+
+        # Statistiques
+        self.processed = 0
+        self.rejected = 0
+
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"hl7-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    @property
+    def in_flight(self):
+        """Nombre de messages en file ou en traitement"""
+        return self._total_in_flight
+
+    def submit(self, source, *args):
+        """
+        Soumet un message au traitement
+
+        Args:
+            source (str): Identifiant de la source (ex: adresse IP)
+            *args: Arguments transmis au gestionnaire
+
+        Returns:
+            Future: Résultat du gestionnaire
+
+        Raises:
+            Overloaded: Si la limite globale ou celle de la source est atteinte
+        """
+        future = Future()
+        with self._lock:
+            if not self._running:
+                raise Overloaded("Pool de traitement arrêté")
+            if self._total_in_flight >= self.max_in_flight:
+                self.rejected += 1
+                raise Overloaded(f"Serveur saturé ({self.max_in_flight} messages en cours)")
+            source_in_flight = self._in_flight.get(source, 0)
+            if source_in_flight >= self.max_per_source:
+                self.rejected += 1
+                raise Overloaded(f"Trop de messages en cours pour {source} ({self.max_per_source})")
+
+            self._in_flight[source] = source_in_flight + 1
+            self._total_in_flight += 1
+            queue = self._queues.get(source)
+            if queue is None:
+                queue = self._queues[source] = deque()
+            if not queue:
+                self._ready.append(source)
+            queue.append((future, args))
+            self._not_empty.notify()
+        return future
+
+    def shutdown(self, wait=True):
+        """
+        Arrête les threads après traitement des messages déjà acceptés
+
+        Args:
+            wait (bool, optional): Attendre la fin des threads
+        """
+        with self._lock:
+            self._running = False
+            self._not_empty.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _next(self):
+        """Prend le prochain message, une source après l'autre (verrou détenu)"""
+        source = self._ready.popleft()
+        queue = self._queues[source]
+        item = queue.popleft()
+        if queue:
+            # Encore des messages: la source repasse en fin de tour
+            self._ready.append(source)
+        else:
+            del self._queues[source]
+        return source, item
+
+    def _worker(self):
+        while True:
+            with self._lock:
+                while not self._ready and self._running:
+                    self._not_empty.wait()
+                if not self._ready:
+                    return
+                source, (future, args) = self._next()
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(self.handler(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+
+            with self._lock:
+                self.processed += 1
+                self._total_in_flight -= 1
+                remaining = self._in_flight[source] - 1
+                if remaining:
+                    self._in_flight[source] = remaining
+                else:
+                    del self._in_flight[source]
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Limitation de débit par adresse IP pour le serveur MLLP (seaux à jetons).
+Chaque source dispose de deux seaux: connexions acceptées et messages reçus.
+Une connexion hors limite est refusée dès accept(), avant la création du
+thread ou le traitement par la boucle, et peut être retenue quelques
+secondes (tarpit) pour freiner un émetteur qui se reconnecte en boucle.
+Un message hors limite reçoit un ACK AR sans être traité.
+
+Désactivée par défaut: la section "rate_limit" de resources/config.json doit
+contenir "enabled": true.
+    {"enabled": true, "connections_per_second": 10, "connection_burst": 50,
+     "messages_per_second": 1000, "message_burst": 2000,
+     "tarpit_seconds": 2.0, "exempt": ["127.0.0.1"]}
+"""
+import heapq
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_CONFIG_PATH = os.path.join(ROOT_DIR, 'resources', 'config.json')
+
+DEFAULT_RATE_LIMITS = {
+    "enabled": False,
+    "connections_per_second": 10.0,
+    "connection_burst": 50,
+    "messages_per_second": 1000.0,
+    "message_burst": 2000,
+    "tarpit_seconds": 2.0,
+    "exempt": [],
+}
+
+
+def load_rate_limits(config_path=DEFAULT_CONFIG_PATH):
+    """
+    Lit la section "rate_limit" de la configuration
+
+    Args:
+        config_path (str, optional): Chemin du fichier config.json
+
+    Returns:
+        dict: Limites (valeurs par défaut pour les clés absentes), ou None
+            si la section est absente ou non activée explicitement
+    """
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            section = json.load(f).get('rate_limit')
+    except (OSError, ValueError):
+        return None
+    if not section or not section.get("enabled", False):
+        return None
+    return dict(DEFAULT_RATE_LIMITS, **section)
+
+
+class TokenBucketLimiter:
+    """Seau à jetons par clé: `rate` jetons par seconde, au plus `burst` en réserve"""
+
+    def __init__(self, rate, burst, max_sources=100000, clock=time.monotonic):
+        """
+        Args:
+            rate (float): Jetons ajoutés par seconde
+            burst (int): Capacité du seau (rafale tolérée)
+            max_sources (int, optional): Nombre de seaux au-delà duquel les
+                seaux pleins (sources inactives) sont oubliés
+            clock (callable, optional): Horloge monotone (secondes)
+        """
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_sources = max_sources
+        self.clock = clock
+        self._buckets = {}        # clé -> [jetons, instant de la dernière mise à jour]
+        self._lock = threading.Lock()
+
+    def allow(self, key, cost=1.0):
+        """
+        Consomme des jetons pour une clé
+
+        Args:
+            key (str): Source (adresse IP)
+            cost (float, optional): Jetons consommés
+
+        Returns:
+            bool: True si la source est dans sa limite
+        """
+        now = self.clock()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_sources:
+                    self._evict(now)
+                bucket = self._buckets[key] = [self.burst, now]
+            else:
+                bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+            if bucket[0] >= cost:
+                bucket[0] -= cost
+                return True
+            return False
+
+    def _evict(self, now):
+        """Oublie les seaux redevenus pleins (équivalents à un seau neuf)"""
+        refill = self.burst / self.rate if self.rate else float("inf")
+        for key in [key for key, (_, last) in self._buckets.items() if now - last >= refill]:
+            del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class SourceRateLimiter:
+    """Limites de connexions et de messages par adresse IP, avec compteurs de refus"""
+
+    def __init__(self, limits=None, clock=time.monotonic):
+        """
+        Args:
+            limits (dict, optional): Limites (clés de DEFAULT_RATE_LIMITS)
+            clock (callable, optional): Horloge monotone (secondes)
+        """
+        limits = dict(DEFAULT_RATE_LIMITS, **(limits or {}))
+        self.limits = limits
+        self.exempt = frozenset(limits["exempt"])
+        self.tarpit_seconds = float(limits["tarpit_seconds"])
+        self.connections = TokenBucketLimiter(limits["connections_per_second"],
+                                              limits["connection_burst"], clock=clock)
+        self.messages = TokenBucketLimiter(limits["messages_per_second"],
+                                           limits["message_burst"], clock=clock)
+        # Refus par source, pour l'audit et les statistiques de session
+        self.refused_connections = Counter()
+        self.refused_messages = Counter()
+
+    def allow_connection(self, ip):
+        """True si une nouvelle connexion de cette adresse est acceptée"""
+        if ip in self.exempt or self.connections.allow(ip):
+            return True
+        self.refused_connections[ip] += 1
+        return False
+
+    def allow_message(self, ip):
+        """True si un nouveau message de cette adresse est traité"""
+        if ip in self.exempt or self.messages.allow(ip):
+            return True
+        self.refused_messages[ip] += 1
+        return False
+
+
+class Tarpit:
+    """
+    Retient les connexions refusées avant de les fermer. Un seul thread
+    ferme les sockets à échéance; au-delà de max_held connexions retenues,
+    les nouvelles sont fermées immédiatement (le tarpit ne doit pas devenir
+    lui-même une source d'épuisement des descripteurs).
+    """
+
+    def __init__(self, delay, max_held=1000):
+        """
+        Args:
+            delay (float): Durée de rétention (secondes); 0 = fermeture immédiate
+            max_held (int, optional): Nombre maximal de connexions retenues
+        """
+        self.delay = delay
+        self.max_held = max_held
+        self._held = []           # tas de (échéance, numéro, socket)
+        self._counter = 0
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = True
+
+    def hold(self, sock):
+        """
+        Retient une socket refusée (ou la ferme si le tarpit est plein)
+
+        Args:
+            sock (socket.socket): Connexion refusée
+        """
+        with self._condition:
+            if self.delay > 0 and self._running and len(self._held) < self.max_held:
+                self._counter += 1
+                heapq.heappush(self._held, (time.monotonic() + self.delay, self._counter, sock))
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="mllp-tarpit", daemon=True)
+                    self._thread.start()
+                self._condition.notify()
+                return
+        self._close(sock)
+
+    def __len__(self):
+        return len(self._held)
+
+    def close(self):
+        """Ferme toutes les connexions retenues et arrête le thread"""
+        with self._condition:
+            self._running = False
+            held, self._held = self._held, []
+            self._condition.notify()
+        for _, _, sock in held:
+            self._close(sock)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._running and (not self._held or self._held[0][0] > time.monotonic()):
+                    timeout = self._held[0][0] - time.monotonic() if self._held else None
+                    self._condition.wait(timeout)
+                if not self._running:
+                    return
+                _, _, sock = heapq.heappop(self._held)
+            self._close(sock)
+
+    @staticmethod
+    def _close(sock):
+        try:
+            sock.close()
+        except OSError:
+            pass
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+"""
+Délais de lecture, d'inactivité et d'écriture des connexions MLLP, gérés
+par une roue temporelle (timer wheel) unique au lieu d'un timeout par socket.
+
+Trois délais par connexion:
+    - read: une trame commencée doit être complète dans ce délai, compté
+      depuis son premier octet et jamais prolongé par les octets suivants
+      (un client qui envoie goutte à goutte est évincé);
+    - idle: délai maximal sans trame entre deux messages (0 = flux
+      persistant conservé indéfiniment);
+    - write: délai maximal d'envoi des ACK à un client qui ne lit plus.
+
+Le traitement d'un message (analyse, base de données, file du pool ou des
+files patients) n'est couvert par aucun de ces délais: il est borné par le
+contrôle d'admission du serveur, pas par le comportement du client.
+
+Configuration (section "timeouts" de resources/config.json):
+    {"read": 30, "idle": 300, "write": 10,
+     "departments": {"LAB_SYSTEM": {"idle": 0}}}
+"""
+import json
+import os
+import threading
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_CONFIG_PATH = os.path.join(ROOT_DIR, 'resources', 'config.json')
+
+DEFAULT_TIMEOUTS = {"read": 30.0, "idle": 300.0, "write": 10.0}
+
+# Granularité de la roue: un délai expire au plus une résolution en retard
+TIMER_RESOLUTION = 0.1
+TIMER_SLOTS = 1024
+
+
+def load_timeouts(config_path=DEFAULT_CONFIG_PATH, department=None):
+    """
+    Lit les délais de la section "timeouts" de la configuration
+
+    Args:
+        config_path (str, optional): Chemin du fichier config.json
+        department (str, optional): Département dont les valeurs de
+            "departments" remplacent les valeurs générales
+
+    Returns:
+        dict: {"read", "idle", "write"} en secondes (valeurs par défaut pour
+            les clés absentes ou si le fichier est illisible)
+    """
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            section = json.load(f).get('timeouts') or {}
+    except (OSError, ValueError):
+        section = {}
+    timeouts = dict(DEFAULT_TIMEOUTS)
+    timeouts.update({key: section[key] for key in DEFAULT_TIMEOUTS if key in section})
+    if department:
+        overrides = section.get('departments', {}).get(department, {})
+        timeouts.update({key: overrides[key] for key in DEFAULT_TIMEOUTS if key in overrides})
+    return timeouts
+
+
+class Timer:
+    """Échéance enregistrée dans une roue temporelle"""
+
+    __slots__ = ("when", "callback", "cancelled")
+
+    def __init__(self, when, callback):
+        self.when = when
+        self.callback = callback
+        self.cancelled = False
+
+
+class TimerWheel:
+    """
+    Roue temporelle hachée: une échéance est rangée dans la case de son
+    instant (modulo le nombre de cases). Chaque tic ne parcourt que les cases
+    écoulées depuis le tic précédent, quel que soit le nombre de connexions.
+    Les échéances au-delà d'un tour de roue restent dans leur case jusqu'au
+    passage correspondant.
+
+    La roue avance soit dans une boucle asyncio (run_in_loop), soit dans un
+    thread dédié (run_thread); les rappels s'exécutent dans ce contexte.
+    """
+
+    def __init__(self, resolution=TIMER_RESOLUTION, slots=TIMER_SLOTS, clock=time.monotonic):
+        """
+        Args:
+            resolution (float, optional): Durée d'une case (secondes)
+            slots (int, optional): Nombre de cases
+            clock (callable, optional): Horloge monotone (secondes)
+        """
+        self.resolution = resolution
+        self.clock = clock
+        self._slots = [[] for _ in range(slots)]
+        self._tick = int(clock() / resolution)   # dernier tic traité
+        self._active = 0
+        self.lock = threading.RLock()
+        self._stopped = threading.Event()
+        self._handle = None
+        self._thread = None
+
+    def schedule(self, when, callback):
+        """
+        Enregistre une échéance
+
+        Args:
+            when (float): Instant d'expiration (horloge de la roue)
+            callback (callable): Appelé sans argument à l'expiration
+
+        Returns:
+            Timer: Échéance, annulable par cancel()
+        """
+        timer = Timer(when, callback)
+        with self.lock:
+            tick = max(int(when / self.resolution) + 1, self._tick + 1)
+            self._slots[tick % len(self._slots)].append(timer)
+            self._active += 1
+        return timer
+
+    def cancel(self, timer):
+        """Annule une échéance (retirée de sa case au prochain passage)"""
+        with self.lock:
+            if not timer.cancelled:
+                timer.cancelled = True
+                self._active -= 1
+
+    def advance(self, now=None):
+        """
+        Déclenche les échéances écoulées
+
+        Args:
+            now (float, optional): Instant courant (horloge de la roue par défaut)
+
+        Returns:
+            int: Nombre d'échéances déclenchées
+        """
+        now = self.clock() if now is None else now
+        due = []
+        with self.lock:
+            target = int(now / self.resolution)
+            # Après une longue pause, un seul tour suffit à visiter toutes les cases
+            start = max(self._tick + 1, target - len(self._slots) + 1)
+            for tick in range(start, target + 1):
+                slot = self._slots[tick % len(self._slots)]
+                if not slot:
+                    continue
+                kept = []
+                for timer in slot:
+                    if timer.cancelled:
+                        continue
+                    if timer.when <= now:
+                        timer.cancelled = True
+                        self._active -= 1
+                        due.append(timer)
+                    else:
+                        kept.append(timer)
+                slot[:] = kept
+            self._tick = max(self._tick, target)
+        # Rappels hors du verrou: ils peuvent réenregistrer une échéance
+        for timer in due:
+            timer.callback()
+        return len(due)
+
+    def __len__(self):
+        """Nombre d'échéances actives"""
+        return self._active
+
+    def run_in_loop(self, loop):
+        """Fait avancer la roue dans une boucle asyncio (un tic par résolution)"""
+        self._stopped.clear()
+        self._handle = loop.call_later(self.resolution, self._loop_tick, loop)
+
+    def _loop_tick(self, loop):
+        self.advance()
+        if not self._stopped.is_set():
+            self._handle = loop.call_later(self.resolution, self._loop_tick, loop)
+
+    def run_thread(self):
+        """Fait avancer la roue dans un thread dédié"""
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._thread_loop, name="mllp-deadlines", daemon=True)
+        self._thread.start()
+
+    def _thread_loop(self):
+        while not self._stopped.wait(self.resolution):
+            self.advance()
+
+    def stop(self):
+        """Arrête l'avancement de la roue (boucle ou thread)"""
+        self._stopped.set()
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+
+class ConnectionDeadline:
+    """
+    Délai courant d'une connexion (lecture, inactivité ou écriture).
+    Réarmer le délai à chaque lecture ne crée pas d'échéance: seul l'instant
+    visé est mis à jour, et l'échéance déjà enregistrée (plus proche) se
+    réenregistre à cet instant lorsqu'elle arrive à terme.
+    """
+
+    def __init__(self, wheel, timeouts, on_expire):
+        """
+        Args:
+            wheel (TimerWheel): Roue partagée par toutes les connexions
+            timeouts (dict): Délais {"read", "idle", "write"} en secondes
+                (0 ou None: pas de délai de ce type)
+            on_expire (callable): Appelé avec le type de délai expiré
+                ('read', 'idle' ou 'write'); doit fermer la connexion
+        """
+        self.wheel = wheel
+        self.timeouts = timeouts
+        self.on_expire = on_expire
+        self.kind = None          # délai en cours
+        self.when = None          # instant visé
+        self.expired = None       # type du délai expiré, le cas échéant
+        self._frame_deadline = None
+        self._timer = None
+
+    def received(self, pending, frames_completed=0):
+        """
+        Réarme le délai après une lecture (et l'envoi des ACK)
+
+        Args:
+            pending (int): Octets d'une trame incomplète en attente
+            frames_completed (int, optional): Trames complètes de cette lecture
+                (la trame en attente a alors commencé pendant cette lecture)
+        """
+        now = self.wheel.clock()
+        if not pending:
+            self._frame_deadline = None
+            self._arm("idle", now, self.timeouts.get("idle"))
+            return
+        if self._frame_deadline is None or frames_completed:
+            seconds = self.timeouts.get("read")
+            self._frame_deadline = now + seconds if seconds else None
+        self._arm_at("read", self._frame_deadline)
+
+    def processing(self):
+        """Suspend le délai pendant le traitement d'un message reçu"""
+        self.cancel()
+
+    def writing(self):
+        """Arme le délai d'écriture juste avant l'envoi des ACK"""
+        self._arm("write", self.wheel.clock(), self.timeouts.get("write"))
+
+    def cancel(self):
+        """Désarme le délai (fermeture de la connexion)"""
+        with self.wheel.lock:
+            self.kind = None
+            if self._timer is not None:
+                self.wheel.cancel(self._timer)
+                self._timer = None
+
+    def _arm(self, kind, now, seconds):
+        self._arm_at(kind, now + seconds if seconds else None)
+
+    def _arm_at(self, kind, when):
+        with self.wheel.lock:
+            if when is None:
+                self.cancel()
+                return
+            self.kind = kind
+            self.when = when
+            if self._timer is not None and self._timer.when <= when:
+                return
+            if self._timer is not None:
+                self.wheel.cancel(self._timer)
+            self._timer = self.wheel.schedule(when, self._fire)
+
+    def _fire(self):
+        with self.wheel.lock:
+            self._timer = None
+            if self.kind is None:
+                return
+            if self.when > self.wheel.clock():
+                # Délai repoussé depuis l'enregistrement de l'échéance
+                self._timer = self.wheel.schedule(self.when, self._fire)
+                return
+            kind, self.expired = self.kind, self.kind
+            self.kind = None
+        self.on_expire(kind)
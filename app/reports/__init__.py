@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+Rapports d'activité de l'application HL7 Messenger.
+"""
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+Moteur de rapports d'activité HL7.
+Les messages sont lus en flux sur une plage de dates, sans jamais charger
+tout l'historique:
+  - base SQLite: compteurs horaires précalculés (table message_stats), soit
+    une ligne par (heure, type, source, destination, statut);
+  - archive JSON-lines (une ligne par message) ou ancien messages.json
+    (tableau JSON lu objet par objet).
+Tous les agrégats (totaux, types, sources, taux de succès, compteurs par
+heure) sont calculés en un seul passage par ReportAggregator, puis rendus
+en HTML ou en CSV.
+"""
+import csv
+import html
+import json
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from app.db.repositories.stats_repository import StatsRepository
+
+# Statuts comptés comme succès (PROCESSED: serveur MLLP, SUCCESS: ancien format)
+SUCCESS_STATUSES = frozenset(("SUCCESS", "PROCESSED"))
+
+# Formats d'horodatage HL7 (TS) selon leur nombre de chiffres
+HL7_TIMESTAMP_FORMATS = {8: "%Y%m%d", 10: "%Y%m%d%H", 12: "%Y%m%d%H%M", 14: "%Y%m%d%H%M%S"}
+
+def date_range_bounds(start, end=None):
+    """
+    Bornes ISO d'une plage de jours [start, end] (end inclus)
+
+    Args:
+        start (date): Premier jour
+        end (date, optional): Dernier jour (start par défaut)
+
+    Returns:
+        tuple: (début inclus, fin exclue) au format ISO 8601
+    """
+    end = end or start
+    lower = datetime.combine(start, time.min)
+    upper = datetime.combine(end + timedelta(days=1), time.min)
+    return lower.isoformat(), upper.isoformat()
+
+def parse_timestamp(value):
+    """
+    Lit un horodatage ISO 8601 ou HL7 (YYYYMMDD[HHMM[SS]])
+
+    Args:
+        value (str): Horodatage
+
+    Returns:
+        datetime: Horodatage lu, ou None s'il est invalide
+    """
+    if not value:
+        return None
+    try:
+        if len(value) >= 10 and value[4] == "-":
+            return datetime.fromisoformat(value)
+        digits = value[:14].split("+")[0].split("-")[0].split(".")[0]
+        return datetime.strptime(digits, HL7_TIMESTAMP_FORMATS[len(digits)])
+    except (KeyError, ValueError):
+        return None
+
+class ReportAggregator:
+    """Calcule tous les agrégats d'un rapport en un seul passage"""
+
+    def __init__(self, start, end=None):
+        """
+        Args:
+            start (date): Premier jour du rapport
+            end (date, optional): Dernier jour inclus (start par défaut)
+        """
+        self.start = start
+        self.end = end or start
+        self.total = 0
+        self.succeeded = 0
+        self.types = Counter()
+        self.sources = Counter()
+        self.statuses = Counter()
+        self.hours = Counter()   # "YYYY-MM-DDTHH" -> messages
+
+    def add(self, hour, message_type, source, status, count=1):
+        """
+        Ajoute des messages au rapport
+
+        Args:
+            hour (str): Heure au format "YYYY-MM-DDTHH"
+            message_type (str): Type de message (MSH-9)
+            source (str): Source du message
+            status (str): Statut du message
+            count (int, optional): Nombre de messages identiques
+        """
+        self.total += count
+        if status in SUCCESS_STATUSES:
+            self.succeeded += count
+        self.types[message_type or ""] += count
+        self.sources[source or ""] += count
+        self.statuses[status or ""] += count
+        self.hours[hour] += count
+
+    def add_message(self, message):
+        """
+        Ajoute un message au format dict (archive JSON)
+
+        Args:
+            message (dict): Message avec created_at/timestamp, type, source, status
+        """
+        timestamp = parse_timestamp(message.get("created_at") or message.get("timestamp"))
+        if timestamp is None or not self.start <= timestamp.date() <= self.end:
+            return
+        self.add(timestamp.strftime("%Y-%m-%dT%H"),
+                 message.get("message_type") or message.get("type"),
+                 message.get("source"), message.get("status"))
+
+    @property
+    def success_rate(self):
+        """Pourcentage de messages traités avec succès"""
+        return self.succeeded / self.total * 100 if self.total else 0.0
+
+    def hourly(self):
+        """
+        Compteurs par heure, y compris les heures sans message
+
+        Returns:
+            list: [(datetime de l'heure, nombre de messages)] dans l'ordre
+        """
+        buckets = []
+        current = datetime.combine(self.start, time.min)
+        stop = datetime.combine(self.end + timedelta(days=1), time.min)
+        while current < stop:
+            buckets.append((current, self.hours.get(current.strftime("%Y-%m-%dT%H"), 0)))
+            current += timedelta(hours=1)
+        return buckets
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: Agrégats du rapport (sérialisable en JSON)
+        """
+        return {
+            "start": self.start.isoformat(),
+            "end": self.end.isoformat(),
+            "total_messages": self.total,
+            "success_rate": round(self.success_rate, 2),
+            "types_distribution": dict(self.types.most_common()),
+            "departments": dict(self.sources.most_common()),
+            "statuses": dict(self.statuses.most_common()),
+            "hourly": {hour.strftime("%Y-%m-%dT%H:00"): count for hour, count in self.hourly()},
+        }
+
+def aggregate_database(database, start, end=None):
+    """
+    Agrège les messages de la base sur une plage de dates
+
+    Args:
+        database (Database): Base SQLite de l'application
+        start (date): Premier jour
+        end (date, optional): Dernier jour inclus
+
+    Returns:
+        ReportAggregator: Agrégats du rapport
+    """
+    report = ReportAggregator(start, end)
+    for hour, message_type, source, _, status, _, count in StatsRepository(database).rows(start, end, "hour"):
+        report.add(hour, message_type, source, status, count)
+    return report
+
+def iter_json_lines(path):
+    """
+    Lit une archive JSON-lines message par message
+
+    Args:
+        path (str): Fichier .jsonl
+
+    Yields:
+        dict: Message
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def iter_json_array(path, chunk_size=1 << 16):
+    """
+    Lit un tableau JSON (ancien resources/messages.json) objet par objet,
+    sans charger le fichier entier
+
+    Args:
+        path (str): Fichier JSON contenant un tableau d'objets
+        chunk_size (int, optional): Taille des lectures
+
+    Yields:
+        dict: Message
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buffer = f.read(chunk_size).lstrip()
+        if not buffer.startswith("["):
+            raise ValueError(f"{path} ne contient pas de tableau JSON")
+        buffer = buffer[1:]
+        while True:
+            buffer = buffer.lstrip().lstrip(",").lstrip()
+            if buffer.startswith("]"):
+                return
+            try:
+                item, position = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    if buffer.strip():
+                        raise
+                    return
+                buffer += chunk
+                continue
+            yield item
+            buffer = buffer[position:]
+
+def aggregate_messages(messages, start, end=None):
+    """
+    Agrège un flux de messages (archives JSON)
+
+    Args:
+        messages (iterable): Messages au format dict
+        start (date): Premier jour
+        end (date, optional): Dernier jour inclus
+
+    Returns:
+        ReportAggregator: Agrégats du rapport
+    """
+    report = ReportAggregator(start, end)
+    for message in messages:
+        report.add_message(message)
+    return report
+
+def _period_label(report):
+    if report.start == report.end:
+        return report.start.isoformat()
+    return f"{report.start.isoformat()} - {report.end.isoformat()}"
+
+def render_html(report):
+    """
+    Rend un rapport en HTML
+
+    Args:
+        report (ReportAggregator): Agrégats du rapport
+
+    Returns:
+        str: Document HTML
+    """
+    period = html.escape(_period_label(report))
+    items = lambda counter: "".join(
+        f"<li>{html.escape(key or '(vide)')}: {count}</li>" for key, count in counter.most_common()
+    )
+    hourly = report.hourly()
+    peak = max((count for _, count in hourly), default=0) or 1
+    rows = "".join(
+        f"<tr><td>{hour.strftime('%Y-%m-%d %H:00')}</td><td>{count}</td>"
+        f"<td><div style=\"background:#4a90d9;height:10px;width:{count * 300 // peak}px\"></div></td></tr>"
+        for hour, count in hourly
+    )
+    return f"""<html>
+<head><meta charset="utf-8"><title>Rapport HL7 - {period}</title></head>
+<body>
+    <h1>📊 Rapport d'activité HL7 - {period}</h1>
+    <h2>Statistiques générales</h2>
+    <ul>
+        <li>Total messages: {report.total}</li>
+        <li>Taux de succès: {report.success_rate:.1f}%</li>
+    </ul>
+
+    <h2>Répartition par type</h2>
+    <ul>{items(report.types)}</ul>
+
+    <h2>Activité par département</h2>
+    <ul>{items(report.sources)}</ul>
+
+    <h2>Activité par heure</h2>
+    <table>
+        <tr><th>Heure</th><th>Messages</th><th></th></tr>
+        {rows}
+    </table>
+</body>
+</html>
+"""
+
+def write_csv(report, path):
+    """
+    Écrit un rapport en CSV (colonnes: section, clé, nombre)
+
+    Args:
+        report (ReportAggregator): Agrégats du rapport
+        path (str): Fichier CSV
+    """
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["section", "key", "count"])
+        writer.writerow(["total", "messages", report.total])
+        writer.writerow(["total", "success_rate", f"{report.success_rate:.2f}"])
+        for section, counter in (("type", report.types), ("source", report.sources),
+                                 ("status", report.statuses)):
+            for key, count in counter.most_common():
+                writer.writerow([section, key, count])
+        for hour, count in report.hourly():
+            writer.writerow(["hour", hour.strftime("%Y-%m-%dT%H:00"), count])
@@ -224,6 +224,9 @@ class HL7MessengerApp:
             if self.current_screen:
                 self._safe_destroy_widget(self.current_screen)
             
+            # Fermer les connexions MLLP persistantes
+            self.mllp_client.close()
+            
             print("✅ Nettoyage terminé")
             
         except Exception as e:
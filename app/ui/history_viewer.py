@@ -3,7 +3,10 @@ Interface pour visualiser l'historique des messages HL7 - VERSION CORRIGÉE
 """
 import tkinter as tk
 from tkinter import ttk, messagebox
+import heapq
+import itertools
 import logging
+from datetime import date
 
 class HistoryViewer(tk.Toplevel):
     """Fenêtre pour afficher l'historique des messages HL7"""
@@ -20,9 +23,16 @@ class HistoryViewer(tk.Toplevel):
         
         try:
             from app.db.repositories.message_repository import MessageRepository
+            from app.db.repositories.patient_repository import CachedPatientRepository
+            from app.db.repositories.stats_repository import StatsRepository
             self.repo = MessageRepository()
+            self.stats = StatsRepository(self.repo.db)
+            # Recherche patient à chaque frappe: index en mémoire (PatientSearchIndex)
+            self.patients = CachedPatientRepository(self.repo.db)
         except ImportError:
             self.repo = None
+            self.stats = None
+            self.patients = None
             print("⚠️ MessageRepository non disponible")
 
         self._create_widgets()
@@ -44,6 +54,13 @@ class HistoryViewer(tk.Toplevel):
         )
         title_label.pack(side=tk.LEFT)
         
+        # Filtre par patient (ID, prénom ou nom, accents ignorés)
+        self.search_var = tk.StringVar()
+        search_entry = ttk.Entry(header_frame, textvariable=self.search_var, width=25)
+        search_entry.pack(side=tk.RIGHT, padx=(5, 10))
+        search_entry.bind("<KeyRelease>", lambda event: self._load_messages())
+        ttk.Label(header_frame, text="🔎 Patient:").pack(side=tk.RIGHT)
+        
         # Bouton refresh
         refresh_btn = ttk.Button(
             header_frame, 
@@ -123,7 +140,7 @@ class HistoryViewer(tk.Toplevel):
         
         try:
             if self.repo:
-                messages = self.repo.get_recent(50)  # Derniers 50 messages
+                messages = self._find_messages(self.search_var.get().strip())
                 
                 for msg in messages:
                     # Formater la date
@@ -140,7 +157,12 @@ class HistoryViewer(tk.Toplevel):
                     ))
                 
                 count = len(messages)
-                self.status_var.set(f"✅ {count} message(s) chargé(s)")
+                # Compteurs précalculés: pas de parcours des messages du jour
+                today = self.stats.totals(date.today(), by="ack_code")
+                self.status_var.set(
+                    f"✅ {count} message(s) chargé(s) - aujourd'hui: {sum(today.values())} "
+                    f"message(s), {today.get('AA', 0)} acceptés"
+                )
                 
             else:
                 # Données de démonstration si pas de repository
@@ -159,6 +181,32 @@ class HistoryViewer(tk.Toplevel):
             self.status_var.set(f"❌ Erreur: {str(e)}")
             messagebox.showerror("Erreur", f"Impossible de charger les messages : {e}")
 
+    def _find_messages(self, query, limit=50):
+        """
+        Messages récents, ou ceux des patients correspondant à la recherche
+        
+        Args:
+            query (str): Recherche patient (vide: tous les messages)
+            limit (int, optional): Nombre maximum de messages
+        
+        Returns:
+            list: Messages, les plus récents d'abord
+        """
+        if not query or self.patients is None:
+            return self.repo.get_recent(limit)
+        patient_ids = [patient.id for patient in self.patients.search(query, limit=20)]
+        # Listes déjà triées par date décroissante: fusion sans tri complet
+        merged = heapq.merge(*(self.repo.get_by_patient(patient_id) for patient_id in patient_ids),
+                             key=lambda msg: msg.created_at, reverse=True)
+        return list(itertools.islice(merged, limit))
+    
+    def destroy(self):
+        """Ferme la fenêtre et la connexion de l'index patients"""
+        patients = getattr(self, "patients", None)
+        if patients is not None:
+            patients.close()
+        super().destroy()
+
 def show_history_popup(parent):
     """Fonction utilitaire pour lancer la fenêtre d'historique"""
     viewer = HistoryViewer(parent)
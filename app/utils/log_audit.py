@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+Analyse incrémentale des journaux de sécurité (connexions réussies et échouées).
+Le fichier est suivi comme avec `tail -F`: la position (octet) et l'inode du
+dernier passage sont enregistrés dans un fichier d'état, seules les nouvelles
+lignes sont lues et une rotation (renommage en .1 par RotatingFileHandler,
+troncature ou réécriture: début du fichier différent) est détectée.
+Les lignes sont analysées par une seule expression régulière précompilée,
+appliquée bloc par bloc; les échecs sont comptés par IP sur une fenêtre
+glissante.
+
+Le journal suivi est celui qu'écrit le serveur MLLP
+(logging_utils.DEFAULT_LOG_FILE).
+
+Usage:
+    auditor = LogAuditor(DEFAULT_LOG_FILE)
+    for alert in auditor.poll():      # nouvelles lignes depuis le dernier passage
+        print(alert)
+    auditor.save_state()
+"""
+import functools
+import json
+import os
+import re
+import time
+from collections import Counter, deque
+from datetime import datetime
+
+# Événements reconnus et leur nature
+EVENTS = {
+    "Connection refused": "failure",
+    "Authentication failed": "failure",
+    "Connexion refusée": "failure",
+    "Limite de débit dépassée": "failure",
+    "Connection established": "success",
+    "Nouvelle connexion": "success",
+}
+
+IP_PATTERN = r"(?<![\d.])\d{1,3}(?:\.\d{1,3}){3}(?![\d.])"
+
+# Un seul passage par ligne: événement puis IP dans la même expression.
+# Alternative de littéraux sans groupe par nature: le moteur peut écarter
+# rapidement les lignes sans événement (la grande majorité)
+LINE_PATTERN = re.compile(
+    "(?P<event>" + "|".join(re.escape(event) for event in EVENTS) + ")"
+    "(?:.*?(?P<ip>" + IP_PATTERN + "))?"
+)
+_IP = re.compile(IP_PATTERN)
+
+# Octets de début de fichier comparés d'un passage à l'autre (réécriture sur place)
+SIGNATURE_SIZE = 64
+
+# Horodatage en tête de ligne (format de logging_utils: '2025-06-01 10:00:00,123')
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def parse_line(line):
+    """
+    Extrait l'événement et l'adresse IP d'une ligne de journal
+
+    Args:
+        line (str): Ligne du journal
+
+    Returns:
+        tuple: ('failure' ou 'success', IP), ou None si la ligne est sans intérêt
+    """
+    match = LINE_PATTERN.search(line)
+    return _event(line, match, 0) if match else None
+
+def _event(text, match, line_start):
+    """Nature et IP d'un événement trouvé par LINE_PATTERN dans text"""
+    ip = match.group("ip")
+    if ip is None:
+        # IP placée avant l'événement ("10.0.0.5: Connection refused")
+        found = _IP.search(text, line_start, match.start())
+        if found is None:
+            return None
+        ip = found.group()
+    return EVENTS[match.group("event")], ip
+
+@functools.lru_cache(maxsize=64)
+def _parse_timestamp(prefix):
+    # Les lignes d'une même seconde partagent le préfixe: cache des conversions
+    return datetime.strptime(prefix, TIMESTAMP_FORMAT).timestamp()
+
+def line_timestamp(line, default):
+    """Horodatage d'une ligne de journal (default si absent ou invalide)"""
+    try:
+        return _parse_timestamp(line[:19])
+    except ValueError:
+        return default
+
+class SlidingWindowCounter:
+    """Nombre d'événements par clé sur les `window` dernières secondes"""
+
+    def __init__(self, window=300.0):
+        """
+        Args:
+            window (float, optional): Durée de la fenêtre (secondes)
+        """
+        self.window = window
+        self._events = {}
+
+    def add(self, key, timestamp):
+        """
+        Enregistre un événement
+
+        Args:
+            key (str): Clé (adresse IP)
+            timestamp (float): Instant de l'événement (secondes epoch)
+
+        Returns:
+            int: Nombre d'événements de la clé dans la fenêtre
+        """
+        events = self._events.get(key)
+        if events is None:
+            events = self._events[key] = deque()
+        events.append(timestamp)
+        limit = timestamp - self.window
+        while events and events[0] <= limit:
+            events.popleft()
+        return len(events)
+
+    def count(self, key, now):
+        """Nombre d'événements de la clé dans la fenêtre se terminant à now"""
+        events = self._events.get(key)
+        if not events:
+            return 0
+        limit = now - self.window
+        return sum(1 for timestamp in events if timestamp > limit)
+
+    def prune(self, now):
+        """Oublie les clés sans événement dans la fenêtre (mémoire bornée)"""
+        limit = now - self.window
+        for key in [key for key, events in self._events.items() if not events or events[-1] <= limit]:
+            del self._events[key]
+
+    def to_dict(self):
+        """Événements en mémoire, par clé (pour l'état enregistré)"""
+        return {key: list(events) for key, events in self._events.items() if events}
+
+    def load(self, data):
+        """Restaure les événements enregistrés par to_dict()"""
+        self._events = {key: deque(events) for key, events in data.items()}
+
+    def keys(self):
+        """Clés ayant des événements en mémoire"""
+        return list(self._events)
+
+    def __len__(self):
+        return len(self._events)
+
+class LogAuditor:
+    """Analyse incrémentale d'un journal avec reprise après arrêt et rotation"""
+
+    def __init__(self, path, state_path=None, window=300.0, threshold=10, chunk_size=1 << 20):
+        """
+        Args:
+            path (str): Journal analysé
+            state_path (str, optional): Fichier d'état (position, inode,
+                totaux); par défaut `<path>.audit.json`
+            window (float, optional): Fenêtre glissante des échecs (secondes)
+            threshold (int, optional): Nombre d'échecs dans la fenêtre au-delà
+                duquel une IP est signalée (strictement plus)
+            chunk_size (int, optional): Taille des lectures (octets)
+        """
+        self.path = path
+        self.state_path = state_path or f"{path}.audit.json"
+        self.threshold = threshold
+        self.chunk_size = chunk_size
+        self.failures = SlidingWindowCounter(window)
+        self.inode = None
+        self.offset = 0
+        self.signature = ""
+        self.failed_total = Counter()
+        self.success_total = Counter()
+        self.lines = 0
+        self.last_timestamp = None
+        self.load_state()
+
+    def load_state(self):
+        """Reprend la position et les totaux du dernier passage"""
+        if not os.path.exists(self.state_path):
+            return
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ État d'audit illisible ({self.state_path}): {e}")
+            return
+        self.inode = state.get("inode")
+        self.offset = state.get("offset", 0)
+        self.signature = state.get("signature", "")
+        self.last_timestamp = state.get("last_timestamp")
+        self.failures.load(state.get("window", {}))
+        self.lines = state.get("lines", 0)
+        self.failed_total = Counter(state.get("failed", {}))
+        self.success_total = Counter(state.get("success", {}))
+
+    def save_state(self):
+        """Enregistre la position et les totaux (écriture atomique)"""
+        state = {
+            "path": self.path,
+            "inode": self.inode,
+            "offset": self.offset,
+            "signature": self.signature,
+            "last_timestamp": self.last_timestamp,
+            "window": self.failures.to_dict(),
+            "lines": self.lines,
+            "failed": dict(self.failed_total),
+            "success": dict(self.success_total),
+        }
+        temp_path = f"{self.state_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+
+    def poll(self):
+        """
+        Analyse les lignes ajoutées depuis le dernier passage
+
+        Returns:
+            list: Alertes (ip, échecs dans la fenêtre) des IP venant de dépasser le seuil
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return []
+        alerts = []
+        if self.inode is not None and stat.st_ino != self.inode:
+            # Rotation: terminer l'ancien fichier (renommé en .1) avant le nouveau
+            rotated = f"{self.path}.1"
+            try:
+                if os.stat(rotated).st_ino == self.inode:
+                    self._read(rotated, self.offset, alerts)
+            except FileNotFoundError:
+                pass
+            self.offset = 0
+        elif stat.st_size < self.offset or self._signature(self.path) != self.signature:
+            # Fichier tronqué ou réécrit: reprendre au début
+            self.offset = 0
+        self.inode = stat.st_ino
+        self.offset = self._read(self.path, self.offset, alerts)
+        self.signature = self._signature(self.path)
+        if self.last_timestamp is not None:
+            self.failures.prune(self.last_timestamp)
+        return alerts
+
+    def _signature(self, path):
+        """Début du fichier (jusqu'à la position lue) en hexadécimal"""
+        if not self.offset:
+            return self.signature
+        with open(path, "rb") as f:
+            return f.read(min(self.offset, SIGNATURE_SIZE)).hex()
+
+    def _read(self, path, offset, alerts):
+        """Lit les lignes complètes à partir de offset; renvoie la nouvelle position"""
+        with open(path, "rb") as f:
+            f.seek(offset)
+            remainder = b""
+            while True:
+                chunk = f.read(self.chunk_size)
+                if not chunk:
+                    break
+                data = remainder + chunk
+                end = data.rfind(b"\n") + 1
+                remainder = data[end:]
+                if end:
+                    self._process(data[:end].decode("utf-8", errors="replace"), alerts)
+                    offset += end
+        # Une ligne incomplète (en cours d'écriture) sera lue au prochain passage
+        return offset
+
+    def _process(self, text, alerts):
+        """Analyse un bloc de lignes complètes en un seul parcours de l'expression"""
+        self.lines += text.count("\n")
+        for match in LINE_PATTERN.finditer(text):
+            line_start = text.rfind("\n", 0, match.start()) + 1
+            parsed = _event(text, match, line_start)
+            if parsed is None:
+                continue
+            event, ip = parsed
+            if event == "success":
+                self.success_total[ip] += 1
+                continue
+            self.failed_total[ip] += 1
+            self.last_timestamp = line_timestamp(text[line_start:line_start + 19], time.time())
+            count = self.failures.add(ip, self.last_timestamp)
+            if count == self.threshold + 1:
+                alerts.append((ip, count))
+
+    def suspicious(self, now=None):
+        """
+        IP au-delà du seuil dans la fenêtre courante
+
+        Args:
+            now (float, optional): Fin de la fenêtre (dernier échec lu par défaut)
+
+        Returns:
+            dict: {ip: échecs dans la fenêtre}
+        """
+        now = now or self.last_timestamp or time.time()
+        counts = {ip: self.failures.count(ip, now) for ip in self.failures.keys()}
+        return {ip: count for ip, count in counts.items() if count > self.threshold}
+
+    def follow(self, interval=1.0, on_alert=None, stop=None):
+        """
+        Analyse le journal en continu
+
+        Args:
+            interval (float, optional): Attente entre deux passages (secondes)
+            on_alert (callable, optional): Appelé avec (ip, échecs) à chaque alerte
+            stop (threading.Event, optional): Arrêt de la boucle
+        """
+        try:
+            while stop is None or not stop.is_set():
+                for ip, count in self.poll():
+                    if on_alert:
+                        on_alert(ip, count)
+                self.save_state()
+                if stop is not None:
+                    stop.wait(interval)
+                else:
+                    time.sleep(interval)
+        finally:
+            self.save_state()
@@ -2,29 +2,56 @@
 """
 Utilitaires de journalisation pour l'application HL7 Messenger.
 """
+import itertools
+import json
 import logging
+import logging.handlers
 import os
+import queue
+import threading
 from datetime import datetime
 
-def setup_logger(name="HL7Messenger", log_file=None, level=logging.INFO, console=True):
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_CONFIG_PATH = os.path.join(ROOT_DIR, 'resources', 'config.json')
+
+def configured_log_file(config_path=DEFAULT_CONFIG_PATH):
     """
-    Configure un logger avec les paramètres spécifiés
+    Fichier de log de l'application (section "logging" de la configuration),
+    relatif à la racine du projet
+
+    Args:
+        config_path (str, optional): Chemin du fichier config.json
+
+    Returns:
+        str: Chemin absolu du fichier, ou None si l'écriture est désactivée
+    """
+    section = {}
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            section = json.load(f).get('logging') or {}
+    except (OSError, ValueError):
+        pass
+    if not section.get('file_enabled', True):
+        return None
+    return os.path.join(ROOT_DIR, section.get('file_path') or os.path.join('logs', 'hl7_messenger.log'))
+
+# Journal de l'application, lu par l'audit de sécurité (security_audit.py)
+DEFAULT_LOG_FILE = configured_log_file()
+
+def _build_handlers(log_file=None, console=True):
+    """
+    Crée les handlers fichier et console avec le format de l'application
     
     Args:
-        name (str): Nom du logger
         log_file (str, optional): Chemin du fichier de log
-        level (int, optional): Niveau de log
         console (bool, optional): Affichage dans la console
     
     Returns:
-        logging.Logger: Logger configuré
+        list: Handlers configurés
     """
-    # Créer le logger
-    logger = logging.getLogger(name)
-    logger.setLevel(level)
-    
     # Format de date et message
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    handlers = []
     
     # Handler pour fichier de log
     if log_file:
@@ -35,16 +62,157 @@ def setup_logger(name="HL7Messenger", log_file=None, level=logging.INFO, console
         
         file_handler = logging.FileHandler(log_file)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
     
     # Handler pour la console
     if console:
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
+        handlers.append(console_handler)
+    
+    return handlers
+
+def setup_logger(name="HL7Messenger", log_file=None, level=logging.INFO, console=True):
+    """
+    Configure un logger avec les paramètres spécifiés
+    
+    Args:
+        name (str): Nom du logger
+        log_file (str, optional): Chemin du fichier de log
+        level (int, optional): Niveau de log
+        console (bool, optional): Affichage dans la console
+    
+    Returns:
+        logging.Logger: Logger configuré
+    """
+    # Créer le logger
+    logger = logging.getLogger(name)
+    logger.setLevel(level)
+    
+    for handler in _build_handlers(log_file, console):
+        logger.addHandler(handler)
     
     return logger
 
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler qui ne bloque jamais: les enregistrements sont abandonnés si la file est pleine"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Le formatage est laissé au thread du listener (même processus:
+        # l'enregistrement n'a pas besoin d'être sérialisable)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+# Listeners actifs, par nom de logger
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+def setup_queue_logger(name="HL7Messenger", log_file=DEFAULT_LOG_FILE, level=logging.INFO, console=True,
+                       queue_size=10000):
+    """
+    Configure un logger non bloquant: les appels ne font que déposer
+    l'enregistrement dans une file bornée, un QueueListener se charge de
+    l'écriture (console, fichier) dans son propre thread. Un second appel
+    avec le même nom réutilise la file existante sans modifier le niveau
+    (voir instance_logger pour un niveau propre à chaque instance).
+
+    Args:
+        name (str): Nom du logger
+        log_file (str, optional): Chemin du fichier de log (journal de
+            l'application par défaut, None pour la console seule)
+        level (int, optional): Niveau de log à la création
+        console (bool, optional): Affichage dans la console
+        queue_size (int, optional): Taille maximale de la file
+
+    Returns:
+        logging.Logger: Logger configuré
+    """
+    logger = logging.getLogger(name)
+
+    with _listeners_lock:
+        if name in _listeners:
+            return logger
+        logger.setLevel(level)
+
+        # Handlers de sortie, exécutés par le thread du listener
+        handlers = _build_handlers(log_file, console)
+
+        handler = DroppingQueueHandler(queue.Queue(queue_size))
+        logger.addHandler(handler)
+
+        listener = logging.handlers.QueueListener(handler.queue, *handlers, respect_handler_level=True)
+        listener.start()
+        _listeners[name] = listener
+
+    return logger
+
+def instance_logger(parent, suffix, level=logging.INFO):
+    """
+    Logger propre à une instance (serveur), avec son propre niveau, dont les
+    enregistrements passent par les handlers du logger parent. Il n'est pas
+    enregistré dans le registre de logging et disparaît avec l'instance.
+
+    Args:
+        parent (logging.Logger): Logger partagé (file, fichier, console)
+        suffix (str): Suffixe du nom affiché (ex: port d'écoute)
+        level (int or str, optional): Niveau de l'instance
+
+    Returns:
+        logging.Logger: Logger de l'instance
+    """
+    logger = logging.Logger(f"{parent.name}.{suffix}", level)
+    logger.parent = parent
+    return logger
+
+def stop_queue_logger(name="HL7Messenger"):
+    """
+    Vide la file d'un logger créé par setup_queue_logger et arrête son listener
+
+    Args:
+        name (str): Nom du logger
+    """
+    with _listeners_lock:
+        listener = _listeners.pop(name, None)
+    if listener is None:
+        return
+    listener.stop()
+    logger = logging.getLogger(name)
+    for handler in list(logger.handlers):
+        if isinstance(handler, DroppingQueueHandler):
+            logger.removeHandler(handler)
+    for handler in listener.handlers:
+        handler.close()
+
+class PayloadSampler:
+    """Décide si le contenu d'un message doit être journalisé (1 message sur N)"""
+
+    def __init__(self, every=100):
+        """
+        Args:
+            every (int, optional): Période d'échantillonnage; 1 = tous les
+                messages, 0 = aucun
+        """
+        self.every = every
+        self._counter = itertools.count()
+
+    def __call__(self):
+        """
+        Returns:
+            bool: True si le message courant doit être journalisé en entier
+        """
+        if self.every <= 0:
+            return False
+        return next(self._counter) % self.every == 0
+
 def log_message(logger, direction, message, endpoint, max_length=100):
     """
     Journalise un message HL7
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Métriques du serveur HL7 (compteurs, jauges, histogrammes) exposées au
+format texte de Prometheus sur un petit serveur HTTP local.
+
+Usage:
+    registry = MetricsRegistry()
+    acks = registry.counter("hl7_acks_total", "ACK envoyés", ("code", "message_type"))
+    acks.inc("AA", "ADT^A01")
+    latency = registry.histogram("hl7_ack_latency_seconds", "Réception -> ACK")
+    latency.observe(0.0012)
+    MetricsEndpoint(registry, port=9100).start()   # GET /metrics
+"""
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Bornes par défaut des histogrammes de durée (secondes)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names, values):
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Compteur monotone, éventuellement décliné par étiquettes"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        """
+        Incrémente le compteur
+
+        Args:
+            *labelvalues: Valeurs des étiquettes, dans l'ordre de labelnames
+            amount (int, optional): Incrément
+        """
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues):
+        """Renvoie la valeur courante pour ces étiquettes"""
+        return self._values.get(labelvalues, 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, _format_labels(self.labelnames, labels), value) for labels, value in items]
+
+class Gauge:
+    """Valeur lue au moment de l'exposition (connexions ouvertes, profondeur de file...)"""
+
+    def __init__(self, name, documentation, function, kind="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+        self.kind = kind
+
+    def samples(self):
+        return [(self.name, "", self.function())]
+
+class Histogram:
+    """Histogramme cumulatif (bornes fixes, somme et nombre d'observations)"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # Dernier emplacement: +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """
+        Enregistre une observation
+
+        Args:
+            value (float): Valeur observée (secondes, octets...)
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    @property
+    def count(self):
+        """Nombre d'observations"""
+        return self._count
+
+    def quantile(self, q):
+        """
+        Estime un quantile à partir des bornes (borne supérieure du seau atteint)
+
+        Args:
+            q (float): Quantile entre 0 et 1 (ex: 0.99)
+
+        Returns:
+            float: Borne estimée, ou None sans observation
+        """
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+        if not total:
+            return None
+        rank = q * total
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        with self._lock:
+            counts = list(self._counts)
+            total_sum = self._sum
+            total = self._count
+        samples = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            samples.append((f"{self.name}_bucket", f'{{le="{_format_value(bound)}"}}', cumulative))
+        samples.append((f"{self.name}_sum", "", total_sum))
+        samples.append((f"{self.name}_count", "", total))
+        return samples
+
+class MetricsRegistry:
+    """Ensemble des métriques d'un processus"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if existing.kind != metric.kind:
+                    raise ValueError(f"Métrique {metric.name} déjà enregistrée ({existing.kind})")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        """Crée (ou renvoie) un compteur"""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, function):
+        """Crée une jauge dont la valeur est lue par function() à chaque exposition"""
+        with self._lock:
+            gauge = self._metrics[name] = Gauge(name, documentation, function)
+        return gauge
+
+    def counter_function(self, name, documentation, function):
+        """Expose comme compteur une valeur monotone tenue ailleurs (ex: attribut du serveur)"""
+        with self._lock:
+            counter = self._metrics[name] = Gauge(name, documentation, function, kind="counter")
+        return counter
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        """Crée (ou renvoie) un histogramme"""
+        return self._register(Histogram(name, documentation, buckets))
+
+    def get(self, name):
+        """Renvoie une métrique par son nom (None si absente)"""
+        return self._metrics.get(name)
+
+    def render(self):
+        """
+        Produit l'exposition texte de toutes les métriques
+
+        Returns:
+            str: Format texte Prometheus 0.0.4
+        """
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    registry = None
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Pas de trace par requête de collecte
+        pass
+
+class MetricsEndpoint:
+    """Serveur HTTP local exposant un registre sur /metrics"""
+
+    def __init__(self, registry, host="127.0.0.1", port=9100):
+        """
+        Args:
+            registry (MetricsRegistry): Métriques exposées
+            host (str, optional): Adresse d'écoute (locale par défaut)
+            port (int, optional): Port HTTP (0 = port libre choisi par le système)
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._httpd = None
+        self._thread = None
+
+    def start(self):
+        """
+        Ouvre le port et sert les requêtes dans un thread dédié
+
+        Returns:
+            int: Port effectivement utilisé
+        """
+        handler = type("MetricsHandler", (_MetricsHandler,), {"registry": self.registry})
+        self._httpd = ThreadingHTTPServer((self.host, self.port), handler)
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+        return self.port
+
+    def stop(self):
+        """Ferme le port HTTP"""
+        if self._httpd:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Traces de traitement par message (décodage, analyse, extraction patient,
+écriture en base, construction de l'ACK).
+Un Tracer sans exportateur est désactivé: begin() renvoie une trace nulle et
+span() un gestionnaire de contexte partagé qui ne fait rien, ce qui rend
+l'instrumentation quasi gratuite en production.
+
+Usage:
+    tracer = Tracer(RollingFileExporter("logs/traces.jsonl"))
+    trace = tracer.begin(source="10.0.0.1:5000")
+    with tracer.activate(trace):
+        with tracer.span("parse"):
+            ...
+    tracer.finish(trace)   # {"ts": ..., "spans_ms": {"parse": 0.12}, ...}
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from app.utils.logging_utils import DroppingQueueHandler
+
+class _NullSpan:
+    """Span sans effet (traçage désactivé)"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _NullTrace:
+    """Trace sans effet (traçage désactivé)"""
+
+    __slots__ = ()
+
+    def span(self, name):
+        return _NULL_SPAN
+
+    def add(self, name, seconds):
+        pass
+
+    def annotate(self, **attributes):
+        pass
+
+NULL_TRACE = _NullTrace()
+
+class _Span:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.trace.add(self.name, time.perf_counter() - self.started)
+        return False
+
+class Trace:
+    """Durées des étapes de traitement d'un message"""
+
+    __slots__ = ("started", "attributes", "spans")
+
+    def __init__(self, **attributes):
+        self.started = time.perf_counter()
+        self.attributes = attributes
+        self.spans = {}
+
+    def span(self, name):
+        """
+        Mesure la durée d'un bloc (cumulée si l'étape se répète)
+
+        Args:
+            name (str): Nom de l'étape (ex: 'parse')
+
+        Returns:
+            Gestionnaire de contexte
+        """
+        return _Span(self, name)
+
+    def add(self, name, seconds):
+        """Ajoute une durée mesurée ailleurs à une étape"""
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def annotate(self, **attributes):
+        """Ajoute des attributs à la trace (type de message, ID de contrôle...)"""
+        self.attributes.update(attributes)
+
+    def to_record(self):
+        """
+        Returns:
+            dict: Enregistrement exporté (durées en millisecondes)
+        """
+        record = {"ts": datetime.now().isoformat(timespec="milliseconds")}
+        record.update(self.attributes)
+        record["total_ms"] = round((time.perf_counter() - self.started) * 1000, 3)
+        record["spans_ms"] = {name: round(seconds * 1000, 3) for name, seconds in self.spans.items()}
+        return record
+
+class Tracer:
+    """Point d'entrée des traces: création, trace courante par thread et export"""
+
+    def __init__(self, *exporters):
+        """
+        Args:
+            *exporters (callable): Fonctions appelées avec chaque
+                enregistrement terminé (dict); aucun = traçage désactivé
+        """
+        self.exporters = list(exporters)
+        self._local = threading.local()
+
+    @property
+    def enabled(self):
+        """True si au moins un exportateur est branché"""
+        return bool(self.exporters)
+
+    def add_exporter(self, exporter):
+        """Branche un exportateur (active le traçage)"""
+        self.exporters.append(exporter)
+
+    def begin(self, **attributes):
+        """
+        Commence la trace d'un message
+
+        Args:
+            **attributes: Attributs initiaux (ex: source)
+
+        Returns:
+            Trace: Nouvelle trace, ou NULL_TRACE si le traçage est désactivé
+        """
+        if not self.exporters:
+            return NULL_TRACE
+        return Trace(**attributes)
+
+    def activate(self, trace):
+        """
+        Rend une trace courante pour le thread appelant (pour span())
+
+        Args:
+            trace (Trace): Trace du message en cours de traitement
+
+        Returns:
+            Gestionnaire de contexte
+        """
+        if trace is NULL_TRACE:
+            return _NULL_SPAN
+        return _Activation(self._local, trace)
+
+    def span(self, name):
+        """
+        Mesure une étape de la trace courante du thread
+
+        Args:
+            name (str): Nom de l'étape
+
+        Returns:
+            Gestionnaire de contexte (sans effet sans trace courante)
+        """
+        if not self.exporters:
+            return _NULL_SPAN
+        trace = getattr(self._local, "trace", None)
+        if trace is None:
+            return _NULL_SPAN
+        return _Span(trace, name)
+
+    def annotate(self, **attributes):
+        """Ajoute des attributs à la trace courante du thread"""
+        if self.exporters:
+            trace = getattr(self._local, "trace", None)
+            if trace is not None:
+                trace.annotate(**attributes)
+
+    def finish(self, trace):
+        """
+        Termine une trace et la transmet aux exportateurs
+
+        Args:
+            trace (Trace): Trace renvoyée par begin()
+        """
+        if trace is NULL_TRACE:
+            return
+        record = trace.to_record()
+        for exporter in self.exporters:
+            exporter(record)
+
+class _Activation:
+    __slots__ = ("local", "trace", "previous")
+
+    def __init__(self, local, trace):
+        self.local = local
+        self.trace = trace
+
+    def __enter__(self):
+        self.previous = getattr(self.local, "trace", None)
+        self.local.trace = self.trace
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        self.local.trace = self.previous
+        return False
+
+class RollingFileExporter:
+    """
+    Écrit les traces en JSON (une ligne par message) dans un fichier
+    tournant. L'écriture se fait dans un thread dédié: l'export ne fait que
+    déposer l'enregistrement dans une file bornée (abandonné si elle est pleine).
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backup_count=5, queue_size=10000):
+        """
+        Args:
+            path (str): Fichier de traces (ex: logs/traces.jsonl)
+            max_bytes (int, optional): Taille au-delà de laquelle le fichier tourne
+            backup_count (int, optional): Nombre d'anciens fichiers conservés
+            queue_size (int, optional): Taille maximale de la file d'écriture
+        """
+        log_dir = os.path.dirname(path)
+        if log_dir and not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
+        file_handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        self.path = path
+        self._handler = DroppingQueueHandler(queue.Queue(queue_size))
+        self._listener = logging.handlers.QueueListener(self._handler.queue, file_handler)
+        self._file_handler = file_handler
+        self._listener.start()
+
+    @property
+    def dropped(self):
+        """Traces abandonnées faute de place dans la file"""
+        return self._handler.dropped
+
+    def __call__(self, record):
+        self._handler.handle(logging.makeLogRecord({"msg": json.dumps(record, ensure_ascii=False)}))
+
+    def close(self):
+        """Écrit les traces en attente et ferme le fichier"""
+        self._listener.stop()
+        self._file_handler.close()
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks de performance pour l'application HL7 Messenger.
+"""
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de la construction de messages ORU^R01: HL7MessageBuilder (arbre
+hl7apy + to_er7) contre TemplateMessageBuilder (gabarits ER7 précompilés).
+
+Usage: python -m benchmarks.bench_hl7_builder [--obx 50] [--duration 2]
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+# Ajouter le répertoire parent au path pour importer les modules de l'application
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.hl7_engine.template_builder import TemplateMessageBuilder
+
+
+def build_results(obx_count):
+    """Résultats de laboratoire avec obx_count observations"""
+    return [{
+        "order_id": "O98765",
+        "filler_id": "LAB123",
+        "test_code": "CBC",
+        "test_name": "Hémogramme complet",
+        "results": [
+            {"code": f"T{i}", "name": f"Analyse {i}", "value": f"{i}.5",
+             "unit": "g/dL", "reference_range": "1-99", "type": "NM"}
+            for i in range(1, obx_count + 1)
+        ]
+    }]
+
+
+def measure(builder, results, duration):
+    """Renvoie le nombre de messages construits par seconde"""
+    count = 0
+    start = time.perf_counter()
+    deadline = start + duration
+    while time.perf_counter() < deadline:
+        builder.create_oru_r01("P12345", results)
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des builders HL7")
+    parser.add_argument("--obx", type=int, default=50, help="Nombre de segments OBX")
+    parser.add_argument("--duration", type=float, default=2.0, help="Durée de mesure (secondes)")
+    args = parser.parse_args()
+
+    # Les logs INFO du builder ne doivent pas fausser la mesure
+    logging.disable(logging.INFO)
+    results = build_results(args.obx)
+
+    template = measure(TemplateMessageBuilder(), results, args.duration)
+    print(f"ORU^R01 avec {args.obx} OBX")
+    print(f"  gabarits : {template:10.0f} msg/s")
+    try:
+        from app.hl7_engine.builder import HL7MessageBuilder
+    except ImportError:
+        print("  hl7apy   : non installé")
+        return
+    reference = measure(HL7MessageBuilder(), results, args.duration)
+    print(f"  hl7apy   : {reference:10.0f} msg/s")
+    print(f"  gain     : {template / reference:10.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmarks du moteur HL7: construction (HL7MessageBuilder,
+TemplateMessageBuilder), analyse (parse_hl7_message, parse_er7), ACK
+(build_ack) et routage (router.route_message, sur une base temporaire),
+pour des messages de petite, moyenne et grande taille.
+
+Chaque cas est mesuré à la manière de timeit: nombre de boucles calibré
+(>= --min-time par répétition), plusieurs répétitions, médiane retenue.
+Les médianes peuvent être enregistrées comme référence (--save-baseline)
+puis comparées (--check): un cas plus lent que la référence de plus de
+--threshold (25 % par défaut) est une régression et le code de sortie vaut 1.
+Les références dépendent de la machine: régénérez-les localement avant
+de comparer deux commits.
+
+Usage: python -m benchmarks.bench_hl7_engine [--filter parse] [--check]
+           [--save-baseline] [--baseline benchmarks/baselines/hl7_engine.json]
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+
+# Ajouter le répertoire parent au path pour importer les modules de l'application
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.hl7_engine.er7 import parse_er7
+from app.hl7_engine.template_builder import TemplateMessageBuilder
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "hl7_engine.json")
+
+# Tailles de messages: nombre d'OBX d'un ORU^R01
+SIZES = {"small": 1, "medium": 20, "large": 100}
+
+PATIENT = {
+    "id": "P12345", "first_name": "JEAN", "last_name": "DUPONT", "birth_date": "19800101",
+    "gender": "M", "ward": "CARDIO", "room": "12"
+}
+ORDER = {"order_id": "ORD1", "test_code": "XR", "test_name": "Radio thorax", "comments": "À jeun"}
+
+
+def build_results(obx_count):
+    """Résultats de laboratoire avec obx_count observations"""
+    return [{
+        "order_id": "O98765", "filler_id": "LAB123", "test_code": "CBC", "test_name": "Hémogramme complet",
+        "results": [
+            {"code": f"T{i}", "name": f"Analyse {i}", "value": f"{i}.5",
+             "unit": "g/dL", "reference_range": "1-99", "type": "NM"}
+            for i in range(1, obx_count + 1)
+        ]
+    }]
+
+
+def build_cases(database):
+    """
+    Construit les cas mesurés
+
+    Args:
+        database (Database): Base temporaire utilisée par route_message
+
+    Returns:
+        dict: {nom du cas: fonction sans argument}
+    """
+    from app.hl7_engine.ack import build_ack
+    from app.hl7_engine.builder import HL7MessageBuilder
+    from app.hl7_engine.parser import parse_hl7_message
+    from app.hl7_engine import router
+    from app.db.repositories.message_repository import MessageRepository
+    from app.db.repositories.patient_repository import PatientRepository
+    from app.models.message import Message
+    from app.models.patient import Patient
+
+    # route_message crée ses repositories: les rediriger vers la base temporaire
+    router.PatientRepository = functools.partial(PatientRepository, database)
+    router.MessageRepository = functools.partial(MessageRepository, database)
+
+    builder = HL7MessageBuilder()
+    template = TemplateMessageBuilder()
+    cases = {
+        "build.hl7apy.adt_a01": lambda: builder.create_adt_a01(PATIENT),
+        "build.hl7apy.orm_o01": lambda: builder.create_orm_o01("P12345", ORDER),
+        "build.template.adt_a01": lambda: template.create_adt_a01(PATIENT),
+        "build.template.orm_o01": lambda: template.create_orm_o01("P12345", ORDER),
+    }
+    patient = Patient(id="P12345", first_name="JEAN", last_name="DUPONT",
+                      birth_date="19800101", gender="M")
+    for size, obx_count in SIZES.items():
+        results = build_results(obx_count)
+        raw, _ = template.create_oru_r01("P12345", results)
+        parsed = parse_hl7_message(raw)
+        if parsed is None:
+            raise RuntimeError("parse_hl7_message a échoué: cas non mesurables")
+
+        def route(raw=raw):
+            message = Message(message_type="ORU^R01", content=raw, source="LAB",
+                              destination="HL7_SERVER", patient_id="P12345")
+            return router.route_message(patient, message)
+
+        cases.update({
+            f"build.hl7apy.oru_r01.{size}": lambda r=results: builder.create_oru_r01("P12345", r),
+            f"build.template.oru_r01.{size}": lambda r=results: template.create_oru_r01("P12345", r),
+            f"parse.hl7apy.{size}": lambda m=raw: parse_hl7_message(m),
+            f"parse.er7.{size}": lambda m=raw: parse_er7(m).pid_3_1,
+            f"ack.build_ack.{size}": lambda p=parsed: build_ack(p),
+            f"route.route_message.{size}": route,
+        })
+    return cases
+
+
+def measure(func, repeat, min_time):
+    """
+    Mesure une fonction à la manière de timeit
+
+    Returns:
+        dict: Durée médiane, minimale et écart-type par appel (µs), nombre de boucles
+    """
+    timer = timeit.Timer(func)
+    loops = 1
+    while True:
+        elapsed = timer.timeit(loops)
+        if elapsed >= min_time:
+            break
+        loops = max(loops * 2, int(loops * min_time / max(elapsed, 1e-9) * 1.1))
+    timings = [elapsed / loops] + [t / loops for t in timer.repeat(repeat - 1, loops)]
+    return {
+        "median_us": round(statistics.median(timings) * 1e6, 3),
+        "min_us": round(min(timings) * 1e6, 3),
+        "stdev_us": round(statistics.stdev(timings) * 1e6, 3) if len(timings) > 1 else 0.0,
+        "loops": loops,
+    }
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks du moteur HL7")
+    parser.add_argument("--filter", default="", help="Ne mesurer que les cas contenant ce texte")
+    parser.add_argument("--repeat", type=int, default=5, help="Répétitions par cas")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Durée minimale d'une répétition (s)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Fichier de référence JSON")
+    parser.add_argument("--save-baseline", action="store_true", help="Enregistrer les mesures comme référence")
+    parser.add_argument("--check", action="store_true",
+                        help="Échouer (code 1) si un cas régresse au-delà du seuil")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Ralentissement toléré par rapport à la référence (0.25 = 25 %%)")
+    args = parser.parse_args()
+
+    # Les logs INFO du builder et du parser ne doivent pas fausser la mesure
+    logging.disable(logging.INFO)
+    baseline = load_baseline(args.baseline)
+    reference = baseline["cases"] if baseline else {}
+
+    from app.db.database import Database
+    results = {}
+    regressions = []
+    with tempfile.TemporaryDirectory() as directory:
+        database = Database(os.path.join(directory, "bench.db"))
+        cases = build_cases(database)
+        print(f"{'cas':<32} {'médiane µs':>12} {'min µs':>10} {'réf. µs':>10} {'écart':>8}")
+        for name, func in cases.items():
+            if args.filter not in name:
+                continue
+            result = measure(func, args.repeat, args.min_time)
+            results[name] = result
+            line = f"{name:<32} {result['median_us']:>12.1f} {result['min_us']:>10.1f}"
+            base = reference.get(name)
+            if base:
+                ratio = result["median_us"] / base["median_us"] - 1
+                line += f" {base['median_us']:>10.1f} {ratio * 100:>+7.1f}%"
+                if ratio > args.threshold:
+                    regressions.append((name, ratio))
+                    line += "  ⚠️ régression"
+            print(line)
+        database.close()
+
+    if args.save_baseline:
+        cases_to_save = dict(reference, **results)
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cases": dict(sorted(cases_to_save.items())),
+            }, f, indent=2, ensure_ascii=False)
+        print(f"Référence enregistrée dans {args.baseline}")
+
+    if args.check:
+        if baseline is None:
+            print(f"❌ Pas de référence dans {args.baseline} (lancer avec --save-baseline)")
+            sys.exit(1)
+        if regressions:
+            print(f"❌ {len(regressions)} régression(s) au-delà de {args.threshold * 100:.0f} %")
+            sys.exit(1)
+        print(f"✅ Aucune régression au-delà de {args.threshold * 100:.0f} %")
+
+
+if __name__ == "__main__":
+    main()
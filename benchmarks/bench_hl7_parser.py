@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark du parsing HL7: parser ER7 natif (app.hl7_engine.er7) contre hl7apy.
+Chaque itération parse le message puis lit MSH-9, MSH-10 et PID-3, comme le
+fait MLLPServer.handle_message.
+
+Usage: python -m benchmarks.bench_hl7_parser [--obx 20] [--duration 2]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Ajouter le répertoire parent au path pour importer les modules de l'application
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.hl7_engine.er7 import parse_er7
+
+
+def build_message(obx_count):
+    """Construit un ORU^R01 avec obx_count segments OBX"""
+    segments = [
+        "MSH|^~\\&|LAB|HOSPITAL|HIS|HOSPITAL|20250101120000||ORU^R01|BENCH0001|P|2.5",
+        "PID|1||P12345^^^HOSPITAL||DOE^JOHN||19800101|M",
+        "OBR|1|O98765|LAB123|CBC^Hémogramme complet|||20250101120000",
+    ]
+    for i in range(1, obx_count + 1):
+        segments.append(f"OBX|{i}|NM|HGB{i}^Hémoglobine {i}||14.{i % 10}|g/dL|13-17|N|||F|||20250101120000")
+    return "\r".join(segments)
+
+
+def measure(func, message, duration):
+    """Renvoie le nombre de messages traités par seconde"""
+    count = 0
+    deadline = time.perf_counter() + duration
+    start = time.perf_counter()
+    while time.perf_counter() < deadline:
+        for _ in range(50):
+            func(message)
+        count += 50
+    return count / (time.perf_counter() - start)
+
+
+def fast_parse(message):
+    msg = parse_er7(message)
+    return msg.msh_9, msg.msh_10, msg.pid_3_1
+
+
+def hl7apy_parse(message):
+    from hl7apy import parser
+    from hl7apy.consts import VALIDATION_LEVEL
+    # find_groups=False: cas le plus favorable à hl7apy (pas de détection des groupes)
+    msg = parser.parse_message(message, validation_level=VALIDATION_LEVEL.TOLERANT, find_groups=False)
+    return msg.msh.msh_9.value, msg.msh.msh_10.value, msg.pid.pid_3.pid_3_1.value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du parsing HL7")
+    parser.add_argument("--obx", type=int, nargs="+", default=[1, 20, 100],
+                        help="Nombres de segments OBX à tester")
+    parser.add_argument("--duration", type=float, default=2.0,
+                        help="Durée de mesure par cas (secondes)")
+    args = parser.parse_args()
+
+    try:
+        import hl7apy  # noqa: F401
+        has_hl7apy = True
+    except ImportError:
+        has_hl7apy = False
+        print("⚠️ hl7apy non installé: seul le parser natif est mesuré")
+
+    print(f"{'OBX':>5} {'taille':>8} {'er7 msg/s':>12} {'hl7apy msg/s':>14} {'gain':>7}")
+    for obx_count in args.obx:
+        message = build_message(obx_count)
+        fast = measure(fast_parse, message, args.duration)
+        if has_hl7apy:
+            slow = measure(hl7apy_parse, message, args.duration)
+            print(f"{obx_count:>5} {len(message):>8} {fast:>12.0f} {slow:>14.0f} {fast / slow:>6.0f}x")
+        else:
+            print(f"{obx_count:>5} {len(message):>8} {fast:>12.0f} {'-':>14} {'-':>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark du décodage des trames MLLP.
+Compare l'ancien découpage (buffer += data, une trame par lecture) au
+MLLPFrameDecoder incrémental sur des messages de plusieurs mégaoctets et
+sur des rafales de petits messages envoyés dans un même segment TCP.
+
+Usage: python -m benchmarks.bench_mllp_framing [--size-mb 4] [--chunk 65536]
+"""
+import argparse
+import os
+import sys
+import time
+
+# Ajouter le répertoire parent au path pour importer les modules de l'application
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.network.mllp_framing import SB, EB, MLLPFrameDecoder, encode_frame
+
+
+def legacy_decode(chunks):
+    """Reproduit l'ancienne boucle de MLLPServer.handle_client"""
+    frames = []
+    buffer = b''
+    for data in chunks:
+        buffer += data
+        start = buffer.find(SB)
+        end = buffer.find(EB, start)
+        if start >= 0 and end > start:
+            frames.append(buffer[start + 1:end])
+            buffer = buffer[end + 2:]
+    return frames
+
+
+def incremental_decode(chunks):
+    """Décodage avec MLLPFrameDecoder"""
+    decoder = MLLPFrameDecoder(max_frame_size=1024 * 1024 * 1024)
+    frames = []
+    for data in chunks:
+        frames.extend(decoder.feed(data))
+    return frames
+
+
+def build_oru_payload(size_bytes):
+    """Construit un ORU^R01 d'environ size_bytes octets"""
+    header = "MSH|^~\\&|LAB|HOSPITAL|HIS|HOSPITAL|20250101120000||ORU^R01|BENCH|P|2.5\rPID|||P1||DOE^JOHN\r"
+    obx = "OBX|1|TX|NOTE^Compte rendu||" + "X" * 200 + "||||||F\r"
+    count = max(1, (size_bytes - len(header)) // len(obx))
+    return header + obx * count
+
+
+def split(stream, chunk_size):
+    """Découpe un flux d'octets comme le ferait recv(chunk_size)"""
+    return [stream[i:i + chunk_size] for i in range(0, len(stream), chunk_size)]
+
+
+def run(label, func, chunks, expected):
+    start = time.perf_counter()
+    frames = func(chunks)
+    elapsed = time.perf_counter() - start
+    status = "OK" if len(frames) == expected else f"{len(frames)}/{expected} trames"
+    print(f"  {label:<14} {elapsed * 1000:10.1f} ms  ({status})")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du décodage MLLP")
+    parser.add_argument("--size-mb", type=float, default=4, help="Taille du gros message (Mo)")
+    parser.add_argument("--chunk", type=int, default=65536, help="Taille des lectures simulées")
+    parser.add_argument("--burst", type=int, default=5000, help="Nombre de petits messages en rafale")
+    args = parser.parse_args()
+
+    payload = build_oru_payload(int(args.size_mb * 1024 * 1024))
+    big_stream = encode_frame(payload)
+    print(f"Message unique de {len(big_stream) / 1024 / 1024:.1f} Mo, lectures de {args.chunk} octets")
+    for chunk_size in (4096, args.chunk):
+        print(f" recv({chunk_size})")
+        chunks = split(big_stream, chunk_size)
+        run("legacy", legacy_decode, chunks, 1)
+        run("incrémental", incremental_decode, chunks, 1)
+
+    small = encode_frame("MSH|^~\\&|ADT|HOSPITAL|HIS|HOSPITAL|20250101120000||ADT^A01|1|P|2.5\rPID|||P1||DOE^JOHN\r")
+    burst_stream = small * args.burst
+    print(f"Rafale de {args.burst} messages ({len(burst_stream) / 1024:.0f} Ko) en lectures de {args.chunk} octets")
+    chunks = split(burst_stream, args.chunk)
+    # L'ancienne boucle n'extrait qu'une trame par lecture: les autres restent bloquées
+    run("legacy", legacy_decode, chunks, args.burst)
+    run("incrémental", incremental_decode, chunks, args.burst)
+
+
+if __name__ == "__main__":
+    main()
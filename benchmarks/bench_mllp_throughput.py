@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de débit et de latence MLLP de bout en bout.
+Le serveur (MLLPServer, AsyncMLLPServer ou run_server.SimpleMLLPServer)
+tourne dans un processus séparé; des clients MLLPClient (une connexion
+persistante par client) envoient un mélange ADT^A01 / ORU^R01 / ORM^O01
+et mesurent le délai de chaque ACK.
+
+Résultats: messages/s, latence ACK p50/p99/p999, mémoire résidente du
+serveur. --json écrit les résultats (avec le commit courant) pour comparer
+deux commits avec --compare.
+
+Usage: python -m benchmarks.bench_mllp_throughput [--servers threads,asyncio,simple]
+           [--concurrency 1,8,32] [--messages 5000] [--mix adt=2,oru=1,orm=1]
+           [--obx 20] [--pad-bytes 0] [--db] [--json results.json] [--compare base.json]
+"""
+import argparse
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# Ajouter le répertoire parent au path pour importer les modules de l'application
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from app.hl7_engine.template_builder import TemplateMessageBuilder
+from app.network.mllp_client import MLLPClient
+
+SERVERS = ("threads", "asyncio", "simple")
+MESSAGE_TYPES = ("adt", "oru", "orm")
+
+
+def build_messages(count, mix, obx_count, pad_bytes, seed=42):
+    """
+    Prépare les messages envoyés (hors mesure), de façon reproductible
+
+    Args:
+        count (int): Nombre de messages
+        mix (dict): Poids par type {'adt': 2, 'oru': 1, 'orm': 1}
+        obx_count (int): Nombre d'OBX par ORU^R01
+        pad_bytes (int): Taille d'un segment NTE ajouté à chaque message
+        seed (int, optional): Graine du tirage des types
+
+    Returns:
+        list: Messages ER7
+    """
+    logging.disable(logging.INFO)
+    builder = TemplateMessageBuilder()
+    rng = random.Random(seed)
+    types = [t for t in MESSAGE_TYPES for _ in range(mix.get(t, 0))]
+    padding = f"\rNTE|1||{'X' * pad_bytes}" if pad_bytes else ""
+    results = [{
+        "order_id": "O1", "filler_id": "LAB1", "test_code": "CBC", "test_name": "Hémogramme",
+        "results": [{"code": f"T{i}", "name": f"Analyse {i}", "value": f"{i}.5", "unit": "g/dL",
+                     "reference_range": "1-99", "type": "NM"} for i in range(1, obx_count + 1)]
+    }]
+
+    messages = []
+    for i in range(count):
+        patient_id = f"P{i % 10000:06d}"
+        kind = rng.choice(types)
+        if kind == "adt":
+            message, _ = builder.create_adt_a01({
+                "id": patient_id, "first_name": "JEAN", "last_name": f"DUPONT{i % 97}",
+                "birth_date": "19800101", "gender": "M", "ward": "CARDIO", "room": "12"
+            })
+        elif kind == "oru":
+            message, _ = builder.create_oru_r01(patient_id, results)
+        else:
+            message, _ = builder.create_orm_o01(patient_id, {
+                "order_id": f"ORD{i}", "test_code": "XR", "test_name": "Radio thorax"
+            })
+        messages.append(message + padding)
+    return messages
+
+
+def _server_main(kind, port, options):
+    """Processus serveur: sorties console coupées, persistance optionnelle"""
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), \
+            contextlib.redirect_stderr(devnull):
+        if kind == "simple":
+            from run_server import SimpleMLLPServer
+            server = SimpleMLLPServer("127.0.0.1", port, name="Bench")
+        else:
+            if kind == "asyncio":
+                from app.network.async_mllp_server import AsyncMLLPServer as server_class
+            else:
+                from app.network.mllp_server import MLLPServer as server_class
+            server = server_class("127.0.0.1", port, backlog=socket.SOMAXCONN,
+                                  log_level=options["log_level"], pool_size=options["pool_size"])
+            server.patient_repo = None
+            server.message_repo = None
+            if options["db_path"]:
+                from app.db.database import Database
+                from app.db.repositories.message_repository import MessageRepository
+                from app.db.repositories.patient_repository import PatientRepository
+                from app.db.write_behind import WriteBehindQueue
+                database = Database(options["db_path"])
+                server.patient_repo = PatientRepository(database)
+                server.message_repo = MessageRepository(database)
+                if options["persistence"] != "sync":
+                    server.write_behind = WriteBehindQueue(database, mode=options["persistence"])
+        server.start()
+
+
+def _wait_for_port(port, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.05)
+    return False
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def read_rss_kb(pid):
+    """
+    Mémoire résidente d'un processus (Linux: /proc)
+
+    Returns:
+        tuple: (VmRSS, VmHWM) en Ko, ou (None, None) si indisponible
+    """
+    values = {}
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    values[key] = int(value.split()[0])
+    except OSError:
+        pass
+    return values.get("VmRSS"), values.get("VmHWM")
+
+
+def percentile(sorted_values, q):
+    """Percentile par rang le plus proche (valeurs triées)"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def drive(port, messages, concurrency):
+    """
+    Envoie les messages avec `concurrency` clients en parallèle
+
+    Returns:
+        tuple: (latences en secondes, nombre d'erreurs, durée totale)
+    """
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    destination = f"127.0.0.1:{port}"
+    barrier = threading.Barrier(concurrency + 1)
+
+    def client_main(index):
+        client = MLLPClient(keep_alive=True, pool_size=1)
+        client.test_connection(destination)
+        barrier.wait()
+        samples = latencies[index]
+        for message in messages[index::concurrency]:
+            started = time.perf_counter()
+            success, _ = client.send_message(message, destination)
+            samples.append(time.perf_counter() - started)
+            if not success:
+                errors[index] += 1
+        client.close()
+
+    threads = [threading.Thread(target=client_main, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return [value for samples in latencies for value in samples], sum(errors), elapsed
+
+
+def run(kind, concurrency, messages, options):
+    """Démarre un serveur, le mesure puis l'arrête; renvoie le résultat"""
+    port = _free_port()
+    context = multiprocessing.get_context("spawn")
+    process = context.Process(target=_server_main, args=(kind, port, options), daemon=True)
+    process.start()
+    try:
+        if not _wait_for_port(port):
+            raise RuntimeError(f"Le serveur {kind} n'a pas démarré")
+        # Tour de chauffe (connexions, caches, premier accès base)
+        drive(port, messages[:min(len(messages), 100)], 1)
+        latencies, errors, elapsed = drive(port, messages, concurrency)
+        rss_kb, peak_rss_kb = read_rss_kb(process.pid)
+    finally:
+        process.terminate()
+        process.join(5)
+
+    latencies.sort()
+    to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        "server": kind,
+        "concurrency": concurrency,
+        "messages": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "msgs_per_sec": round(len(latencies) / elapsed, 1),
+        "latency_ms": {
+            "mean": to_ms(sum(latencies) / len(latencies)),
+            "p50": to_ms(percentile(latencies, 0.50)),
+            "p99": to_ms(percentile(latencies, 0.99)),
+            "p999": to_ms(percentile(latencies, 0.999)),
+            "max": to_ms(latencies[-1]),
+        },
+        "rss_kb": rss_kb,
+        "peak_rss_kb": peak_rss_kb,
+    }
+
+
+def print_result(result, baseline=None):
+    latency = result["latency_ms"]
+    line = (f"  {result['server']:<8} c={result['concurrency']:<4} "
+            f"{result['msgs_per_sec']:9.0f} msg/s  p50 {latency['p50']:7.2f} ms  "
+            f"p99 {latency['p99']:7.2f} ms  p999 {latency['p999']:7.2f} ms  "
+            f"RSS {result['rss_kb'] or 0:7d} Ko")
+    if result["errors"]:
+        line += f"  ({result['errors']} erreurs)"
+    if baseline:
+        throughput = (result["msgs_per_sec"] / baseline["msgs_per_sec"] - 1) * 100
+        p99 = (latency["p99"] / baseline["latency_ms"]["p99"] - 1) * 100
+        line += f"  [débit {throughput:+.1f}%, p99 {p99:+.1f}%]"
+    print(line)
+
+
+def current_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name not in MESSAGE_TYPES:
+            raise argparse.ArgumentTypeError(f"Type de message inconnu: {name}")
+        mix[name] = int(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark débit/latence MLLP")
+    parser.add_argument("--servers", default="threads,asyncio",
+                        help=f"Serveurs mesurés, parmi {','.join(SERVERS)}")
+    parser.add_argument("--concurrency", default="1,8,32", help="Nombres de clients simultanés")
+    parser.add_argument("--messages", type=int, default=5000, help="Messages par mesure")
+    parser.add_argument("--mix", type=parse_mix, default="adt=2,oru=1,orm=1",
+                        help="Poids des types de messages (adt, oru, orm)")
+    parser.add_argument("--obx", type=int, default=20, help="Segments OBX par ORU^R01")
+    parser.add_argument("--pad-bytes", type=int, default=0,
+                        help="Taille d'un segment NTE ajouté à chaque message (octets)")
+    parser.add_argument("--db", action="store_true",
+                        help="Persistance SQLite (base temporaire) au lieu du mode sans base")
+    parser.add_argument("--persistence", default="sync",
+                        choices=("sync", "commit-before-ack", "ack-then-commit"))
+    parser.add_argument("--pool-size", type=int, default=None, help="Pool de traitement borné")
+    parser.add_argument("--log-level", default="WARNING", help="Niveau du journal du serveur")
+    parser.add_argument("--json", help="Fichier de résultats JSON")
+    parser.add_argument("--compare", help="Résultats JSON de référence (autre commit)")
+    args = parser.parse_args()
+
+    servers = [s for s in args.servers.split(",") if s]
+    for kind in servers:
+        if kind not in SERVERS:
+            parser.error(f"Serveur inconnu: {kind}")
+    concurrencies = [int(c) for c in args.concurrency.split(",")]
+    mix = args.mix
+    messages = build_messages(args.messages, mix, args.obx, args.pad_bytes)
+    average_size = sum(len(m) for m in messages) / len(messages)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            reference = json.load(f)
+        baseline = {(r["server"], r["concurrency"]): r for r in reference["results"]}
+        print(f"Référence: commit {reference.get('commit')} ({reference.get('timestamp')})")
+
+    print(f"{len(messages)} messages ({mix}), {average_size:.0f} octets en moyenne, "
+          f"persistance: {args.persistence if args.db else 'aucune'}")
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for kind in servers:
+            for concurrency in concurrencies:
+                options = {
+                    "log_level": args.log_level,
+                    "pool_size": args.pool_size,
+                    "persistence": args.persistence,
+                    "db_path": os.path.join(directory, f"{kind}-{concurrency}.db") if args.db else None,
+                }
+                result = run(kind, concurrency, messages, options)
+                print_result(result, baseline.get((kind, concurrency)))
+                results.append(result)
+
+    if args.json:
+        report = {
+            "commit": current_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "config": {
+                "messages": args.messages, "mix": mix, "obx": args.obx,
+                "pad_bytes": args.pad_bytes, "average_size": round(average_size),
+                "db": args.db, "persistence": args.persistence, "pool_size": args.pool_size,
+            },
+            "results": results,
+        }
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Résultats écrits dans {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark du coût de la journalisation sur le chemin de traitement du serveur.
+Rejoue N messages dans la boucle de réception de MLLPServer (compteur,
+journal de réception, traitement et ACK, sans réseau ni base) avec:
+  - print:  l'ancien affichage console de chaque message (bannière + contenu)
+  - sync:   un logger classique dont le StreamHandler écrit dans le thread appelant
+  - queue:  le logger en file du serveur (niveau INFO, contenu échantillonné)
+  - quiet:  le mode production (niveau WARNING)
+Les sorties sont redirigées vers une console simulée dont chaque écriture
+bloque --write-latency-us microsecondes (terminal, session SSH, journald
+saturé); 0 pour une sortie sans coût (/dev/null).
+
+Usage: python -m benchmarks.bench_server_logging [--messages 20000] [--write-latency-us 50]
+"""
+import argparse
+import contextlib
+import os
+import sys
+import time
+from datetime import datetime
+
+# Ajouter le répertoire parent au path pour importer les modules de l'application
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.network.mllp_server import MLLPServer
+from app.utils.logging_utils import setup_logger, stop_queue_logger
+
+MESSAGE = ("MSH|^~\\&|ADT|HOSPITAL|HIS|HOSPITAL|20250101120000||ADT^A01|{}|P|2.5\r"
+           "PID|||P{}||DOE^JOHN||19800101|M\r")
+CLIENT = ("127.0.0.1", 40000)
+
+
+class SlowConsole:
+    """Flux de sortie qui jette le texte après un délai d'écriture fixe"""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def write(self, text):
+        if self.latency:
+            time.sleep(self.latency)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def legacy_print(server, message, client_id):
+    """Reproduit l'affichage de chaque message de l'ancien MLLPServer"""
+    print("=" * 50)
+    print(f"📨 MESSAGE HL7 #{server.messages_received} REÇU DE {client_id}")
+    print("=" * 50)
+    print(f"📏 Taille: {len(message)} caractères")
+    print(f"⏰ Heure: {datetime.now().strftime('%H:%M:%S')}")
+    print("📄 Contenu (extrait):")
+    print(message[:200] + ("..." if len(message) > 200 else ""))
+    print("=" * 50)
+    print(f"📋 Type de message: ADT^A01")
+    print(f"✅ ACK envoyé à {client_id}")
+
+
+def build_server(mode, sample_every):
+    """Crée un serveur sans persistance configuré pour le mode mesuré"""
+    server = MLLPServer("127.0.0.1", 0, log_level="WARNING" if mode == "quiet" else "INFO",
+                        payload_sample_every=sample_every)
+    server.patient_repo = None
+    server.message_repo = None
+    if mode == "sync":
+        server.logger = setup_logger("HL7Messenger.Bench.sync")
+        server.logger.propagate = False
+    return server
+
+
+def run(label, mode, messages, sample_every, latency):
+    client_id = f"{CLIENT[0]}:{CLIENT[1]}"
+    console = SlowConsole(latency)
+    with contextlib.redirect_stdout(console), contextlib.redirect_stderr(console):
+        server = build_server(mode, sample_every)
+        start = time.perf_counter()
+        for message in messages:
+            server.messages_received += 1
+            if mode == "print":
+                legacy_print(server, message, client_id)
+            else:
+                server._log_received_message(message, client_id)
+            server._dispatch(message, CLIENT)
+        elapsed = time.perf_counter() - start
+        # Vider la file du listener (hors chemin de traitement)
+        stop_queue_logger("HL7Messenger.MLLPServer")
+        drained = time.perf_counter() - start
+
+    per_message = elapsed / len(messages) * 1e6
+    print(f"  {label:<8} {elapsed * 1000:10.1f} ms  {per_message:8.1f} µs/message"
+          f"  (avec vidage du journal: {drained * 1000:.1f} ms)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la journalisation du serveur")
+    parser.add_argument("--messages", type=int, default=20000, help="Nombre de messages traités")
+    parser.add_argument("--sample-every", type=int, default=100,
+                        help="Contenu journalisé pour un message sur N")
+    parser.add_argument("--write-latency-us", type=float, default=50,
+                        help="Durée simulée d'une écriture console (µs)")
+    args = parser.parse_args()
+
+    messages = [MESSAGE.format(i, i) for i in range(args.messages)]
+    print(f"{args.messages} messages ADT^A01, contenu échantillonné 1/{args.sample_every}, "
+          f"écriture console {args.write_latency_us:g} µs")
+    for mode in ("print", "sync", "queue", "quiet"):
+        run(mode, mode, messages, args.sample_every, args.write_latency_us / 1e6)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,118 @@
 # Script de rapport (generate_report.py)
-import json
+"""
+Génère les rapports d'activité HL7 (HTML et/ou CSV) sur une plage de dates.
+
+Les messages sont lus depuis la base SQLite (compteurs horaires précalculés)
+ou en flux depuis une archive JSON-lines ou l'ancien resources/messages.json.
+
+Usage: python generate_report.py [--start 2025-06-01] [--end 2025-06-30]
+           [--source db|jsonl|json] [--path FICHIER] [--format html,csv]
+"""
+import argparse
 import datetime
-from collections import Counter
+import os
 
-def generate_daily_report():
-    """Génère un rapport d'activité quotidien"""
-    
-    today = datetime.date.today().strftime("%Y%m%d")
-    
-    # Charger les messages du jour
-    with open("resources/messages.json", "r") as f:
-        messages = json.load(f)
-    
-    daily_messages = [
-        msg for msg in messages 
-        if msg.get("timestamp", "").startswith(today)
-    ]
-    
-    # Statistiques
-    stats = {
-        "total_messages": len(daily_messages),
-        "types_distribution": Counter(msg.get("type", "") for msg in daily_messages),
-        "departments": Counter(msg.get("source", "") for msg in daily_messages),
-        "success_rate": len([m for m in daily_messages if m.get("status") == "SUCCESS"]) / len(daily_messages) * 100 if daily_messages else 0
-    }
-    
-    # Générer rapport HTML
-    report_html = f"""
-    <html>
-    <head><title>Rapport HL7 - {today}</title></head>
-    <body>
-        <h1>📊 Rapport d'activité HL7 - {today}</h1>
-        <h2>Statistiques générales</h2>
-        <ul>
-            <li>Total messages: {stats['total_messages']}</li>
-            <li>Taux de succès: {stats['success_rate']:.1f}%</li>
-        </ul>
-        
-        <h2>Répartition par type</h2>
-        <ul>
-        {"".join(f"<li>{type_}: {count}</li>" for type_, count in stats['types_distribution'].items())}
-        </ul>
-        
-        <h2>Activité par département</h2>
-        <ul>
-        {"".join(f"<li>{dept}: {count}</li>" for dept, count in stats['departments'].items())}
-        </ul>
-    </body>
-    </html>
+from app.reports.report_engine import (
+    aggregate_database, aggregate_messages, iter_json_array, iter_json_lines,
+    render_html, write_csv
+)
+
+# Chemins par défaut résolus depuis la racine du projet (comme Database),
+# et non depuis le répertoire courant
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PATHS = {
+    "db": os.path.join(ROOT_DIR, "resources", "hl7_messages.db"),
+    "jsonl": os.path.join(ROOT_DIR, "resources", "messages.jsonl"),
+    "json": os.path.join(ROOT_DIR, "resources", "messages.json"),
+}
+
+def build_report(start, end=None, source="db", path=None):
+    """
+    Calcule les agrégats d'une plage de dates
+
+    Args:
+        start (datetime.date): Premier jour
+        end (datetime.date, optional): Dernier jour inclus (start par défaut)
+        source (str, optional): 'db', 'jsonl' ou 'json'
+        path (str, optional): Fichier source (chemin par défaut sinon)
+
+    Returns:
+        ReportAggregator: Agrégats du rapport
+
+    Raises:
+        FileNotFoundError: Si le fichier source n'existe pas (une base
+            absente n'est jamais créée: le rapport serait vide sans erreur)
     """
-    
-    with open(f"reports/rapport_{today}.html", "w") as f:
-        f.write(report_html)
-    
-    print(f"📋 Rapport généré: reports/rapport_{today}.html")
+    path = path or DEFAULT_PATHS[source]
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"Fichier source introuvable: {path}")
+    if source == "db":
+        from app.db.database import Database
+        database = Database(path)
+        try:
+            return aggregate_database(database, start, end)
+        finally:
+            database.close()
+    messages = iter_json_lines(path) if source == "jsonl" else iter_json_array(path)
+    return aggregate_messages(messages, start, end)
+
+def write_report(report, output_dir="reports", formats=("html",)):
+    """
+    Écrit le rapport dans les formats demandés
+
+    Args:
+        report (ReportAggregator): Agrégats du rapport
+        output_dir (str, optional): Dossier de sortie
+        formats (iterable, optional): 'html' et/ou 'csv'
+
+    Returns:
+        list: Fichiers écrits
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    name = "rapport_" + report.start.strftime("%Y%m%d")
+    if report.end != report.start:
+        name += "_" + report.end.strftime("%Y%m%d")
+    written = []
+    for fmt in formats:
+        path = os.path.join(output_dir, f"{name}.{fmt}")
+        if fmt == "html":
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(render_html(report))
+        elif fmt == "csv":
+            write_csv(report, path)
+        else:
+            raise ValueError(f"Format de rapport inconnu: {fmt}")
+        written.append(path)
+    return written
+
+def generate_daily_report(source="db", path=None, output_dir="reports"):
+    """Génère un rapport d'activité quotidien"""
+    report = build_report(datetime.date.today(), source=source, path=path)
+    for written in write_report(report, output_dir):
+        print(f"📋 Rapport généré: {written}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Rapport d'activité HL7")
+    parser.add_argument("--start", type=datetime.date.fromisoformat,
+                        default=datetime.date.today(), help="Premier jour (AAAA-MM-JJ, aujourd'hui par défaut)")
+    parser.add_argument("--end", type=datetime.date.fromisoformat,
+                        help="Dernier jour inclus (AAAA-MM-JJ, --start par défaut)")
+    parser.add_argument("--source", choices=sorted(DEFAULT_PATHS), default="db",
+                        help="Base SQLite, archive JSON-lines ou ancien messages.json")
+    parser.add_argument("--path", help="Fichier source (chemin par défaut selon --source)")
+    parser.add_argument("--format", default="html", help="Formats séparés par des virgules: html,csv")
+    parser.add_argument("--output-dir", default="reports", help="Dossier de sortie")
+    args = parser.parse_args()
+
+    if args.end and args.end < args.start:
+        parser.error("--end doit être postérieur à --start")
+    try:
+        report = build_report(args.start, args.end, args.source, args.path)
+    except FileNotFoundError as e:
+        parser.error(str(e))
+    formats = [fmt.strip() for fmt in args.format.split(",") if fmt.strip()]
+    for written in write_report(report, args.output_dir, formats):
+        print(f"📋 Rapport généré: {written}")
 
 if __name__ == "__main__":
-    os.makedirs("reports", exist_ok=True)
-    generate_daily_report()
\ No newline at end of file
+    main()
@@ -2,12 +2,16 @@
 # -*- coding: utf-8 -*-
 import socket
 import threading
-import time
 import logging
 import os
 import sys
 from datetime import datetime
 
+from app.network.mllp_framing import MLLPFrameDecoder, encode_frame
+from app.network.multiport_server import MultiPortMLLPServer, load_department_ports
+from app.network.timeouts import load_timeouts
+from app.utils.logging_utils import PayloadSampler
+
 # Configuration du logging
 logging.basicConfig(
     level=logging.INFO,
@@ -16,6 +20,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger("HL7Server")
 
+# Contenu des messages (données patient) journalisé pour 1 message sur 100
+payload_sampler = PayloadSampler(100)
+
 # Caractères de contrôle MLLP
 SB = b'\x0b'  # Start Block
 EB = b'\x1c'  # End Block
@@ -60,39 +67,26 @@ class SimpleMLLPServer:
             
     def handle_client(self, client_socket, address):
         print(f"📨 Connexion de {address[0]}:{address[1]}")
-        buffer = b''
+        decoder = MLLPFrameDecoder()
         
         try:
             client_socket.settimeout(10)
             
             while self.running:
                 try:
-                    data = client_socket.recv(4096)
+                    data = client_socket.recv(65536)
                     if not data:
                         break
                         
-                    buffer += data
-                    
-                    # Chercher un message MLLP complet
-                    start = buffer.find(SB)
-                    end = buffer.find(EB, start)
-                    
-                    if start >= 0 and end > start:
-                        # Extraire le message
-                        message = buffer[start+1:end].decode('utf-8')
-                        print(f"✉️ Message reçu de {address[0]}:{address[1]}")
-                        print("-" * 50)
-                        print(message)
-                        print("-" * 50)
+                    # Traiter tous les messages MLLP complets reçus
+                    for raw_message in decoder.feed(data):
+                        message = raw_message.decode('utf-8')
+                        log_received_message(message, address, self.name)
                         
                         # Créer et envoyer un ACK
                         ack = create_ack(message)
-                        mllp_ack = SB + ack.encode('utf-8') + EB + CR
-                        client_socket.sendall(mllp_ack)
+                        client_socket.sendall(encode_frame(ack))
                         print(f"✅ ACK envoyé à {address[0]}:{address[1]}")
-                        
-                        # Réinitialiser le buffer
-                        buffer = buffer[end+2:]
                 except socket.timeout:
                     print(f"⏱️ Timeout pour {address[0]}:{address[1]}")
                     break
@@ -127,6 +121,40 @@ def create_ack(message):
         logger.error(f"Erreur de création d'ACK: {e}")
         return f"MSH|^~\&|HL7SERVER|HOSPITAL|HL7CLIENT|HOSPITAL|{datetime.now().strftime('%Y%m%d%H%M%S')}||ACK|1|P|2.5\rMSA|AA|1|Message processed"
 
+def log_received_message(message, address, name):
+    """
+    Journalise la réception d'un message; le contenu n'est écrit que pour
+    un message sur 100 (payload_sampler)
+    
+    Args:
+        message (str): Message HL7 décodé
+        address (tuple): Adresse du client
+        name (str): Département ou serveur de réception
+    """
+    if payload_sampler():
+        excerpt = message[:200] + ("..." if len(message) > 200 else "")
+        logger.info("Message reçu de %s:%s (%s, %d caractères): %r",
+                    address[0], address[1], name, len(message), excerpt)
+    else:
+        logger.info("Message reçu de %s:%s (%s, %d caractères)",
+                    address[0], address[1], name, len(message))
+
+def handle_department_message(message, name, address):
+    """
+    Journalise un message reçu sur le port d'un département et renvoie l'ACK
+    
+    Args:
+        message (str): Message HL7 décodé
+        name (str): Département associé au port d'écoute
+        address (tuple): Adresse du client
+    
+    Returns:
+        str: Message ACK
+    """
+    log_received_message(message, address, name)
+    return create_ack(message)
+
+
 def main():
     print("=" * 50)
     print("Serveur MLLP HL7 pour HL7 Messenger")
@@ -139,31 +167,21 @@ def main():
     if not os.path.exists("logs"):
         os.makedirs("logs")
     
-    # Configuration des serveurs
-    ports = {
-        2575: "Principal", 
-        2576: "Admission", 
-        2577: "Laboratoire",
-        2578: "Radiologie", 
-        2579: "Pharmacie"
-    }
-    
-    # Démarrer un serveur pour chaque port
-    servers = []
-    for port, name in ports.items():
-        server = SimpleMLLPServer(port=port, name=name)
-        thread = threading.Thread(target=server.start)
-        thread.daemon = True
-        thread.start()
-        servers.append((server, thread))
-    
+    # Configuration des serveurs: port principal + ports départementaux de config.json
+    ports = {2575: "Principal"}
     try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        print("\nArrêt des serveurs...")
-        for server, _ in servers:
-            server.running = False
+        ports.update(load_department_ports())
+    except (OSError, ValueError) as e:
+        logger.error(f"Configuration illisible, ports par défaut utilisés: {e}")
+        ports.update({2576: "Admission", 2577: "Laboratoire", 2578: "Radiologie", 2579: "Pharmacie"})
+    
+    # Tous les ports dans une seule boucle d'événements, délais par département
+    server = MultiPortMLLPServer(
+        {port: (name, handle_department_message) for port, name in ports.items()},
+        timeouts={name: load_timeouts(department=name) for name in ports.values()}
+    )
+    server.start()
+    print("\nArrêt des serveurs...")
         
 if __name__ == "__main__":
     main()
@@ -1,41 +1,79 @@
 # Script d'audit (security_audit.py)
-import re
-import datetime
-from collections import defaultdict
+"""
+Audit des connexions dans le journal de l'application.
 
-def analyze_security_logs():
+L'analyse est incrémentale: seules les lignes ajoutées depuis le passage
+précédent sont lues (position et inode enregistrés dans <journal>.audit.json,
+rotation gérée). --follow analyse le journal en continu.
+
+Le journal analysé par défaut est celui qu'écrit le serveur MLLP (section
+"logging" de resources/config.json, logs/hl7_messenger.log à la racine du
+projet).
+
+Usage: python security_audit.py [--log logs/hl7_messenger.log] [--follow]
+           [--window 300] [--threshold 10] [--reset]
+"""
+import argparse
+import os
+
+from app.utils.log_audit import LogAuditor
+from app.utils.logging_utils import DEFAULT_LOG_FILE
+
+# Journal écrit par le serveur, même si l'écriture fichier est désactivée
+DEFAULT_LOG = DEFAULT_LOG_FILE or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                               "logs", "hl7_messenger.log")
+
+def print_alert(ip, count):
+    print(f"🚨 IP {ip}: {count} tentatives échouées dans la fenêtre")
+
+def analyze_security_logs(log_path=DEFAULT_LOG, window=300.0, threshold=10, state_path=None):
     """Analyse les logs de sécurité"""
-    
-    failed_connections = defaultdict(int)
-    successful_connections = defaultdict(int)
-    
-    with open("logs/hl7_messenger.log", "r") as f:
-        for line in f:
-            # Détecter tentatives de connexion échouées
-            if "Connection refused" in line or "Authentication failed" in line:
-                ip_match = re.search(r'(\d+\.\d+\.\d+\.\d+)', line)
-                if ip_match:
-                    failed_connections[ip_match.group(1)] += 1
-            
-            # Détecter connexions réussies
-            if "Connection established" in line:
-                ip_match = re.search(r'(\d+\.\d+\.\d+\.\d+)', line)
-                if ip_match:
-                    successful_connections[ip_match.group(1)] += 1
-    
-    # Détecter tentatives suspectes (>10 échecs)
-    suspicious_ips = {ip: count for ip, count in failed_connections.items() if count > 10}
-    
+    auditor = LogAuditor(log_path, state_path=state_path, window=window, threshold=threshold)
+    auditor.poll()
+    auditor.save_state()
+
+    # Détecter tentatives suspectes (>threshold échecs dans la fenêtre)
+    suspicious_ips = auditor.suspicious()
     if suspicious_ips:
         print("🚨 ACTIVITÉ SUSPECTE DÉTECTÉE:")
-        for ip, count in suspicious_ips.items():
-            print(f"   IP {ip}: {count} tentatives échouées")
+        for ip, count in sorted(suspicious_ips.items(), key=lambda item: -item[1]):
+            print(f"   IP {ip}: {count} tentatives échouées en {window:.0f}s")
     else:
         print("✅ Aucune activité suspecte détectée")
-    
+
     print(f"\n📊 Statistiques connexions:")
-    print(f"   Connexions réussies: {sum(successful_connections.values())}")
-    print(f"   Tentatives échouées: {sum(failed_connections.values())}")
+    print(f"   Connexions réussies: {sum(auditor.success_total.values())}")
+    print(f"   Tentatives échouées: {sum(auditor.failed_total.values())}")
+    return auditor
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit de sécurité du journal HL7 Messenger")
+    parser.add_argument("--log", default=DEFAULT_LOG, help="Journal analysé")
+    parser.add_argument("--state", help="Fichier d'état (défaut: <journal>.audit.json)")
+    parser.add_argument("--window", type=float, default=300.0, help="Fenêtre glissante des échecs (s)")
+    parser.add_argument("--threshold", type=int, default=10,
+                        help="Échecs tolérés par IP dans la fenêtre")
+    parser.add_argument("--follow", action="store_true", help="Analyser le journal en continu")
+    parser.add_argument("--interval", type=float, default=1.0, help="Période d'analyse en continu (s)")
+    parser.add_argument("--reset", action="store_true", help="Oublier la position et relire tout le journal")
+    args = parser.parse_args()
+
+    if args.log == DEFAULT_LOG and DEFAULT_LOG_FILE is None:
+        print("⚠️ Journal fichier désactivé dans la configuration (logging.file_enabled)")
+    state_path = args.state or f"{args.log}.audit.json"
+    if args.reset and os.path.exists(state_path):
+        os.remove(state_path)
+
+    if not args.follow:
+        analyze_security_logs(args.log, args.window, args.threshold, state_path)
+        return
+
+    auditor = LogAuditor(args.log, state_path=state_path, window=args.window, threshold=args.threshold)
+    print(f"👁️ Suivi de {args.log} (Ctrl+C pour arrêter)")
+    try:
+        auditor.follow(args.interval, on_alert=print_alert)
+    except KeyboardInterrupt:
+        print("\n🛑 Suivi arrêté")
 
 if __name__ == "__main__":
-    analyze_security_logs()
\ No newline at end of file
+    main()
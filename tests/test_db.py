@@ -0,0 +1,691 @@
+# -*- coding: utf-8 -*-
+"""
+Tests unitaires pour la base de données et les repositories.
+"""
+import unittest
+import tempfile
+import json
+import os
+import sys
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+
+# Ajouter le répertoire parent au path pour importer les modules de l'application
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.db.database import Database, message_to_row
+from app.db.repositories.patient_repository import CachedPatientRepository, PatientRepository
+from app.db.repositories.message_repository import MessageRepository
+from app.db.repositories.stats_repository import StatsRepository
+from app.db.search_index import PatientSearchIndex, normalize_text
+from app.db.write_behind import (
+    ACK_THEN_COMMIT, COMMIT_BEFORE_ACK, WriteBehindFull, WriteBehindQueue, default_journal_path
+)
+from app.models.patient import Patient
+from app.models.message import Message
+
+
+class TestPatientRepository(unittest.TestCase):
+    
+    def setUp(self):
+        """Base SQLite temporaire avec un ancien fichier patients.json"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.json_path = os.path.join(self.tmp_dir.name, 'patients.json')
+        with open(self.json_path, 'w') as f:
+            json.dump([
+                {"id": "PAT001", "first_name": "John", "last_name": "Doe",
+                 "birth_date": "19700101", "gender": "M", "address": {"city": "Anytown"}},
+                {"id": "PAT002", "first_name": "Jane", "last_name": "Smith",
+                 "birth_date": "19800212", "gender": "F", "address": {}}
+            ], f)
+        self.db = Database(os.path.join(self.tmp_dir.name, 'test.db'))
+        self.repo = PatientRepository(self.db)
+    
+    def tearDown(self):
+        self.db.close()
+        self.tmp_dir.cleanup()
+    
+    def test_json_migration(self):
+        """Test l'import unique de l'ancien fichier JSON"""
+        patients = self.repo.get_all()
+        self.assertEqual([p.id for p in patients], ["PAT001", "PAT002"])
+        self.assertEqual(patients[0].address, {"city": "Anytown"})
+        
+        # Une nouvelle instance ne réimporte pas le JSON
+        self.repo.delete("PAT002")
+        repo = PatientRepository(Database(self.db.db_path))
+        self.assertIsNone(repo.get_by_id("PAT002"))
+    
+    def test_wal_mode(self):
+        """Test que la base est en mode WAL"""
+        with self.db.connect() as conn:
+            mode = conn.execute('PRAGMA journal_mode').fetchone()[0]
+        self.assertEqual(mode, 'wal')
+    
+    def test_create_and_update(self):
+        """Test la création puis la mise à jour d'un patient"""
+        self.repo.create(Patient(id="P100", first_name="Marie", last_name="Curie"))
+        self.repo.create(Patient(id="P100", first_name="Marie", last_name="Sklodowska"))
+        
+        patient = self.repo.get_by_id("P100")
+        self.assertEqual(patient.last_name, "Sklodowska")
+        self.assertEqual(len(self.repo.get_all()), 3)
+        
+        with self.assertRaises(ValueError):
+            self.repo.create(Patient(first_name="Sans", last_name="ID"))
+    
+    def test_delete(self):
+        """Test la suppression d'un patient"""
+        self.assertTrue(self.repo.delete("PAT001"))
+        self.assertFalse(self.repo.delete("PAT001"))
+        self.assertIsNone(self.repo.get_by_id("PAT001"))
+    
+    def test_search(self):
+        """Test la recherche par ID, prénom ou nom"""
+        self.assertEqual([p.id for p in self.repo.search("smi")], ["PAT002"])
+        self.assertEqual([p.id for p in self.repo.search("JOHN")], ["PAT001"])
+        self.assertEqual(len(self.repo.search("pat00")), 2)
+        self.assertEqual(self.repo.search("inconnu"), [])
+
+
+class TestCachedPatientRepository(TestPatientRepository):
+    """Mêmes tests que TestPatientRepository, servis depuis l'index en mémoire"""
+    
+    def setUp(self):
+        super().setUp()
+        self.repo = CachedPatientRepository(self.db)
+    
+    def tearDown(self):
+        self.repo.close()
+        super().tearDown()
+    
+    def test_external_changes_invalidate_cache(self):
+        """Test le rechargement après une écriture par une autre connexion"""
+        self.assertEqual(self.repo.get_by_id("PAT001").last_name, "Doe")
+        
+        other = PatientRepository(Database(self.db.db_path))
+        other.update(Patient(id="PAT001", first_name="John", last_name="Dupont"))
+        other.create(Patient(id="PAT003", first_name="Ada", last_name="Lovelace"))
+        other.db.close()
+        
+        self.assertEqual(self.repo.get_by_id("PAT001").last_name, "Dupont")
+        self.assertEqual([p.id for p in self.repo.search("love")], ["PAT003"])
+    
+    def test_find_by_name(self):
+        """Test la recherche exacte par nom via l'index"""
+        self.repo.create(Patient(id="PAT003", first_name="Jane", last_name="Doe"))
+        self.assertEqual([p.id for p in self.repo.find_by_name("doe")], ["PAT001", "PAT003"])
+        self.assertEqual([p.id for p in self.repo.find_by_name("DOE", "jane")], ["PAT003"])
+        
+        self.repo.update(Patient(id="PAT003", first_name="Jane", last_name="Roe"))
+        self.assertEqual([p.id for p in self.repo.find_by_name("doe")], ["PAT001"])
+        self.assertEqual([p.id for p in self.repo.get_all()], ["PAT001", "PAT002", "PAT003"])
+    
+    def test_search_ranked_and_limited(self):
+        """Test la recherche classée, limitée et insensible aux accents"""
+        self.repo.create(Patient(id="PAT003", first_name="Hélène", last_name="Lefèvre"))
+        self.repo.create(Patient(id="PAT004", first_name="Jean", last_name="Dupont"))
+        self.assertEqual([p.id for p in self.repo.search("helene LEFEVRE")], ["PAT003"])
+        self.assertEqual([p.id for p in self.repo.search("pat", limit=2)], ["PAT001", "PAT004"])
+    
+    def test_returned_patients_are_copies(self):
+        """Test que modifier un patient renvoyé n'altère pas l'index"""
+        patient = self.repo.get_by_id("PAT001")
+        patient.last_name = "Modifié"
+        patient.address["city"] = "Ailleurs"
+        self.assertEqual(self.repo.get_by_id("PAT001").last_name, "Doe")
+        self.assertEqual(self.repo.get_by_id("PAT001").address, {"city": "Anytown"})
+
+
+class TestPatientSearchIndex(unittest.TestCase):
+    
+    def setUp(self):
+        self.index = PatientSearchIndex()
+        self.index.add("PAT001", "Jean-Pierre", "Dupont")
+        self.index.add("PAT002", "Hélène", "Dupontel")
+        self.index.add("PAT003", "Zoé", "Lefèvre")
+        self.index.add("PAT004", "François", "Dupond")
+    
+    def test_normalize_text(self):
+        """Test la suppression des accents et de la casse"""
+        self.assertEqual(normalize_text("Hélène LEFÈVRE"), "helene lefevre")
+        self.assertEqual(normalize_text("François Noël"), "francois noel")
+        self.assertEqual(normalize_text(None), "")
+    
+    def test_accent_insensitive(self):
+        """Test que les accents sont ignorés dans la requête et dans l'index"""
+        self.assertEqual(self.index.search("helene"), ["PAT002"])
+        self.assertEqual(self.index.search("LEFÈVRE"), ["PAT003"])
+        self.assertEqual(self.index.search("zoe"), ["PAT003"])
+    
+    def test_ranking(self):
+        """Test le classement: mot identique, puis préfixe, puis sous-chaîne"""
+        self.assertEqual(self.index.search("dupont"), ["PAT001", "PAT002"])
+        self.assertEqual(self.index.search("pont"), ["PAT001", "PAT002"])
+        self.assertEqual(self.index.search("dupon"), ["PAT004", "PAT001", "PAT002"])
+    
+    def test_multiple_words_and_short_prefix(self):
+        """Test les requêtes à plusieurs mots et les préfixes courts"""
+        self.assertEqual(self.index.search("pierre dup"), ["PAT001"])
+        self.assertEqual(self.index.search("du"), ["PAT004", "PAT001", "PAT002"])
+        self.assertEqual(self.index.search("fr du"), ["PAT004"])
+        self.assertEqual(self.index.search("pt"), [])
+        self.assertEqual(self.index.search("  "), [])
+    
+    def test_short_queries_match_substrings(self):
+        """Test que les requêtes courtes ont la même sémantique (sous-chaîne) que les longues"""
+        self.assertEqual(self.index.search("on"), ["PAT004", "PAT001", "PAT002"])
+        self.assertEqual(self.index.search("ont"), ["PAT001", "PAT002"])
+        self.assertEqual(self.index.search("an"), ["PAT004", "PAT001"])
+        self.assertEqual(self.index.search("ean"), ["PAT001"])
+        self.assertEqual(self.index.search("z"), ["PAT003"])
+        for short, longer in (("on", "ont"), ("an", "ean"), ("up", "upon")):
+            self.assertLessEqual(set(self.index.search(longer)), set(self.index.search(short)))
+    
+    def test_vocabulary_removed_with_last_patient(self):
+        """Test que les n-grammes d'un mot disparaissent avec son dernier patient"""
+        self.index.remove("PAT003")
+        self.assertEqual(self.index.search("z"), [])
+        self.assertNotIn("zoe", self.index._ngrams.get("z", ()))
+    
+    def test_limit(self):
+        """Test la limitation du nombre de résultats"""
+        self.assertEqual(self.index.search("pat", limit=2), ["PAT004", "PAT001"])
+        self.assertEqual(len(self.index.search("pat")), 4)
+    
+    def test_remove_and_reindex(self):
+        """Test la mise à jour de l'index après modification ou suppression"""
+        self.index.add("PAT002", "Hélène", "Martin")
+        self.assertEqual(self.index.search("dupontel"), [])
+        self.assertEqual(self.index.search("martin"), ["PAT002"])
+        
+        self.index.remove("PAT001")
+        self.assertEqual(self.index.search("pierre"), [])
+        self.assertEqual(len(self.index), 3)
+
+
+class TestMessageRepository(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.tmp_dir.name, 'test.db'))
+        self.repo = MessageRepository(self.db)
+    
+    def tearDown(self):
+        self.db.close()
+        self.tmp_dir.cleanup()
+    
+    def _message(self, index, patient_id="PAT001"):
+        message = Message(message_type="ADT^A01", content=f"MSH|^~\\&|{index}",
+                          source="TEST", destination="SERVER", patient_id=patient_id,
+                          status="RECEIVED", id=f"MSG{index:04d}")
+        message.created_at = f"2025-01-01T10:00:{index % 60:02d}.{index:06d}"
+        return message
+    
+    def test_save_and_get_by_id(self):
+        """Test l'enregistrement et la relecture d'un message"""
+        self.repo.save(self._message(1))
+        message = self.repo.get_by_id("MSG0001")
+        self.assertEqual(message.message_type, "ADT^A01")
+        self.assertEqual(message.patient_id, "PAT001")
+        self.assertEqual(message.created_at, "2025-01-01T10:00:01.000001")
+        self.assertIsNone(self.repo.get_by_id("INCONNU"))
+    
+    def test_get_recent_and_by_patient(self):
+        """Test le tri par date et le filtrage par patient"""
+        for i in range(10):
+            self.repo.save(self._message(i, "PAT001" if i % 2 else "PAT002"))
+        
+        self.assertEqual([m.id for m in self.repo.get_recent(3)], ["MSG0009", "MSG0008", "MSG0007"])
+        self.assertEqual([m.id for m in self.repo.get_by_patient("PAT002")],
+                         ["MSG0008", "MSG0006", "MSG0004", "MSG0002", "MSG0000"])
+        self.assertTrue(self.repo.delete("MSG0008"))
+        self.assertFalse(self.repo.delete("MSG0008"))
+    
+    def test_in_memory_database(self):
+        """Test une base ':memory:' partagée par les connexions de l'instance"""
+        db = Database(':memory:')
+        repo = MessageRepository(db)
+        try:
+            repo.save(self._message(1))
+            self.assertEqual(repo.get_by_id("MSG0001").message_type, "ADT^A01")
+            
+            # Autre thread, donc autre connexion: même base
+            found = []
+            thread = threading.Thread(target=lambda: found.append(repo.get_by_id("MSG0001")))
+            thread.start()
+            thread.join()
+            conn = db.open()
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            conn.close()
+            self.assertIsNotNone(found[0])
+            self.assertTrue({"patients", "messages", "message_stats"} <= tables)
+            
+            # Chaque instance a sa propre base
+            other = Database(':memory:')
+            self.assertIsNone(other.connect().execute("SELECT * FROM messages").fetchone())
+            other.close_all()
+        finally:
+            db.close_all()
+    
+    def test_queries_use_indexes(self):
+        """Test que get_recent et get_by_patient n'entraînent pas de parcours de table"""
+        conn = self.db.connect()
+        for sql, params in (
+            ('SELECT * FROM messages ORDER BY created_at DESC LIMIT ?', (10,)),
+            ('SELECT * FROM messages WHERE patient_id = ? ORDER BY created_at DESC', ("PAT001",)),
+        ):
+            plan = " ".join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params))
+            self.assertIn("USING INDEX", plan)
+            self.assertNotIn("TEMP B-TREE", plan)
+    
+    def test_connection_per_thread(self):
+        """Test qu'une connexion est réutilisée par thread et propre à chaque thread"""
+        conn = self.db.connect()
+        self.assertIs(self.db.connect(), conn)
+        
+        other = []
+        thread = threading.Thread(target=lambda: other.append(self.db.connect()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(other[0], conn)
+    
+    def test_concurrent_saves(self):
+        """Test des écritures simultanées depuis plusieurs threads"""
+        errors = []
+        
+        def worker(offset):
+            try:
+                for i in range(50):
+                    self.repo.save(self._message(offset + i))
+            except Exception as e:
+                errors.append(e)
+            finally:
+                self.db.close()
+        
+        threads = [threading.Thread(target=worker, args=(n * 50,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(errors, [])
+        self.assertEqual(len(self.repo.get_recent(1000)), 400)
+
+
+class TestWriteBehindQueue(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.tmp_dir.name, 'test.db'))
+        self.repo = MessageRepository(self.db)
+        self.queues = []
+    
+    def tearDown(self):
+        for write_queue in self.queues:
+            write_queue.close()
+        self.db.close()
+        self.tmp_dir.cleanup()
+    
+    def _queue(self, **kwargs):
+        write_queue = WriteBehindQueue(self.db, **kwargs)
+        self.queues.append(write_queue)
+        return write_queue
+    
+    def _message(self, index):
+        return Message(message_type="ADT^A01", content="MSH|^~\\&|", patient_id="PAT001",
+                       status="PROCESSED", id=f"MSG{index:04d}")
+    
+    def test_ack_then_commit(self):
+        """Test la mise en file immédiate puis l'écriture par lots"""
+        write_queue = self._queue(mode=ACK_THEN_COMMIT)
+        for i in range(100):
+            write_queue.submit(message=self._message(i))
+        self.assertTrue(write_queue.flush(5))
+        
+        self.assertEqual(len(self.repo.get_recent(1000)), 100)
+        self.assertEqual(write_queue.written, 100)
+        self.assertLessEqual(write_queue.batches, 100)
+    
+    def test_commit_before_ack(self):
+        """Test que submit ne rend la main qu'après la validation"""
+        write_queue = self._queue(mode=COMMIT_BEFORE_ACK)
+        patient = Patient(id="PAT001", first_name="John", last_name="Doe")
+        write_queue.submit(patient, self._message(1))
+        
+        self.assertIsNotNone(self.repo.get_by_id("MSG0001"))
+        self.assertEqual(PatientRepository(self.db).get_by_id("PAT001").last_name, "Doe")
+    
+    def test_concurrent_commits_are_batched(self):
+        """Test le regroupement des écritures concurrentes dans une même transaction"""
+        write_queue = self._queue(mode=COMMIT_BEFORE_ACK)
+        
+        def worker(offset):
+            for i in range(25):
+                write_queue.submit(message=self._message(offset + i))
+        
+        threads = [threading.Thread(target=worker, args=(n * 25,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        self.assertEqual(write_queue.written, 200)
+        self.assertEqual(len(self.repo.get_recent(1000)), 200)
+    
+    def test_backpressure(self):
+        """Test le rejet quand la file reste pleine"""
+        release = threading.Event()
+        write_queue = self._queue(mode=ACK_THEN_COMMIT, max_size=2, put_timeout=0.1)
+        original = write_queue._write_batch
+        
+        def blocked_write(batch):
+            release.wait(5)
+            original(batch)
+        
+        write_queue._write_batch = blocked_write
+        with self.assertRaises(WriteBehindFull):
+            for i in range(10):
+                write_queue.submit(message=self._message(i))
+        self.assertEqual(write_queue.rejected, 1)
+        
+        release.set()
+        self.assertTrue(write_queue.flush(5))
+        self.assertEqual(len(self.repo.get_recent(1000)), write_queue.written)
+    
+    def test_flush_timeout_with_full_queue(self):
+        """Test que flush() respecte son délai quand la file est pleine"""
+        release = threading.Event()
+        write_queue = self._queue(mode=ACK_THEN_COMMIT, max_size=2, put_timeout=0.1)
+        original = write_queue._write_batch
+        
+        def blocked_write(batch):
+            release.wait(5)
+            original(batch)
+        
+        write_queue._write_batch = blocked_write
+        with self.assertRaises(WriteBehindFull):
+            for i in range(10):
+                write_queue.submit(message=self._message(i))
+        
+        started = time.monotonic()
+        self.assertFalse(write_queue.flush(0.2))
+        self.assertLess(time.monotonic() - started, 1.0)
+        
+        release.set()
+        self.assertTrue(write_queue.flush(5))
+    
+    def test_failed_commit_is_reported(self):
+        """Test qu'une erreur d'écriture remonte en mode commit-before-ack"""
+        write_queue = self._queue(mode=COMMIT_BEFORE_ACK)
+        message = self._message(1)
+        message.content = object()  # Type non supporté par sqlite3
+        with self.assertRaises(Exception):
+            write_queue.submit(message=message)
+        
+        write_queue.submit(message=self._message(2))
+        self.assertEqual(write_queue.failed, 1)
+        self.assertIsNotNone(self.repo.get_by_id("MSG0002"))
+    
+    def test_commit_timeout_cancels_pending(self):
+        """Test qu'un élément abandonné après commit_timeout n'est jamais écrit"""
+        release = threading.Event()
+        write_queue = self._queue(mode=COMMIT_BEFORE_ACK, commit_timeout=0.2)
+        original = write_queue._write_batch
+        
+        def blocked_write(batch):
+            release.wait(5)
+            original(batch)
+        
+        write_queue._write_batch = blocked_write
+        errors = []
+        
+        def first():
+            try:
+                write_queue.submit(message=self._message(1))
+            except Exception as e:
+                errors.append(e)
+        
+        thread = threading.Thread(target=first)
+        thread.start()
+        time.sleep(0.05)  # Le premier lot est pris par le thread d'écriture
+        with self.assertRaises(TimeoutError):
+            write_queue.submit(message=self._message(2))
+        
+        release.set()
+        thread.join(5)
+        self.assertTrue(write_queue.flush(5))
+        # Le lot déjà pris est écrit et confirmé malgré le délai dépassé
+        self.assertEqual(errors, [])
+        self.assertIsNotNone(self.repo.get_by_id("MSG0001"))
+        self.assertIsNone(self.repo.get_by_id("MSG0002"))
+        self.assertEqual(write_queue.cancelled, 1)
+    
+    def test_lost_ack_then_commit_is_logged(self):
+        """Test qu'un message acquitté puis perdu est journalisé et compté"""
+        write_queue = self._queue(mode=ACK_THEN_COMMIT)
+        message = self._message(1)
+        message.content = {"segments": []}  # Type non supporté par sqlite3
+        with self.assertLogs("HL7Messenger.MLLPServer.WriteBehind", level="ERROR") as logs:
+            write_queue.submit(message=message)
+            write_queue.submit(message=self._message(2))
+            self.assertTrue(write_queue.flush(5))
+        
+        self.assertEqual((write_queue.failed, write_queue.lost), (1, 1))
+        self.assertIn("MSG0001", logs.output[0])
+        self.assertIsNotNone(self.repo.get_by_id("MSG0002"))
+    
+    def test_journal_replayed_after_crash(self):
+        """Test que les messages acquittés non écrits sont rejoués au démarrage"""
+        release = threading.Event()
+        crashed = self._queue(mode=ACK_THEN_COMMIT)
+        original = crashed._write_batch
+        crashed._write_batch = lambda batch: release.wait(5)  # Jamais validé
+        crashed.submit(message=self._message(1))
+        crashed.submit(message=self._message(2))
+        self.assertIsNone(self.repo.get_by_id("MSG0001"))
+        
+        # Nouveau processus sur la même base: le journal est rejoué
+        write_queue = WriteBehindQueue(self.db, mode=ACK_THEN_COMMIT)
+        write_queue.start()
+        self.assertEqual(write_queue.replayed, 2)
+        self.assertIsNotNone(self.repo.get_by_id("MSG0001"))
+        self.assertIsNotNone(self.repo.get_by_id("MSG0002"))
+        self.assertEqual(os.path.getsize(write_queue.journal_path), 0)
+        write_queue.close()
+        crashed._write_batch = original
+        release.set()
+    
+    def test_journal_truncated_after_commit(self):
+        """Test que le journal est vidé une fois la file écrite"""
+        write_queue = self._queue(mode=ACK_THEN_COMMIT)
+        self.assertEqual(write_queue.journal_path, default_journal_path(self.db.db_path))
+        for i in range(20):
+            write_queue.submit(message=self._message(i))
+        self.assertTrue(write_queue.flush(5))
+        self.assertEqual(write_queue.written, 20)
+        self.assertEqual(os.path.getsize(write_queue.journal_path), 0)
+    
+    def test_journal_torn_line_is_ignored(self):
+        """Test qu'une dernière ligne tronquée par un crash est ignorée"""
+        journal_path = os.path.join(self.tmp_dir.name, 'journal.jsonl')
+        with open(journal_path, 'w', encoding='utf-8') as journal:
+            journal.write(json.dumps({"patient": None,
+                                      "message": list(message_to_row(self._message(1)))}) + "\n")
+            journal.write('{"patient": null, "mess')
+        
+        write_queue = self._queue(mode=ACK_THEN_COMMIT, journal_path=journal_path)
+        write_queue.start()
+        self.assertEqual(write_queue.replayed, 1)
+        self.assertIsNotNone(self.repo.get_by_id("MSG0001"))
+    
+    def test_ack_then_commit_requires_journal(self):
+        """Test qu'une base en mémoire sans journal refuse le mode ack-then-commit"""
+        database = Database(':memory:')
+        self.addCleanup(database.close_all)
+        with self.assertRaises(ValueError):
+            WriteBehindQueue(database, mode=ACK_THEN_COMMIT)
+        
+        journal_path = os.path.join(self.tmp_dir.name, 'memory.jsonl')
+        write_queue = WriteBehindQueue(database, mode=ACK_THEN_COMMIT, journal_path=journal_path)
+        self.assertEqual(write_queue.journal_path, journal_path)
+    
+    def test_transient_error_is_retried(self):
+        """Test les nouvelles tentatives après une base verrouillée"""
+        write_queue = self._queue(mode=ACK_THEN_COMMIT, retry_delay=0.01)
+        connect = self.db.connect
+        failures = [sqlite3.OperationalError("database is locked")] * 3
+        
+        def flaky_connect():
+            if failures:
+                raise failures.pop()
+            return connect()
+        
+        self.db.connect = flaky_connect
+        with self.assertLogs("HL7Messenger.MLLPServer.WriteBehind", level="WARNING"):
+            write_queue.submit(message=self._message(1))
+            self.assertTrue(write_queue.flush(5))
+        self.db.connect = connect
+        
+        self.assertEqual((write_queue.retries, write_queue.lost), (2, 0))
+        self.assertIsNotNone(self.repo.get_by_id("MSG0001"))
+
+
+class TestStatsRepository(unittest.TestCase):
+    
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.tmp_dir.name, 'test.db'))
+        self.repo = MessageRepository(self.db)
+        self.stats = StatsRepository(self.db)
+    
+    def tearDown(self):
+        self.db.close()
+        self.tmp_dir.cleanup()
+    
+    def _message(self, index, created_at, message_type="ADT^A01", source="ADMISSION", status="PROCESSED"):
+        message = Message(message_type=message_type, content="MSH|^~\\&|", source=source,
+                          destination="HL7_SERVER", patient_id="PAT001", status=status,
+                          id=f"MSG{index:04d}")
+        message.created_at = created_at
+        return message
+    
+    def _all_stats(self):
+        return sorted(tuple(row) for row in self.db.connect().execute('SELECT * FROM message_stats WHERE count > 0'))
+    
+    def test_counters_updated_on_save(self):
+        """Test la mise à jour des compteurs minute/heure/jour à l'enregistrement"""
+        self.repo.save(self._message(1, "2025-06-01T10:15:00"))
+        self.repo.save(self._message(2, "2025-06-01T10:15:30", status="ERROR"))
+        self.repo.save(self._message(3, "2025-06-01T11:00:00", "ORU^R01", "LAB"))
+        self.repo.save(self._message(4, "2025-06-02T09:00:00"))
+        
+        day = date(2025, 6, 1)
+        self.assertEqual(self.stats.totals(day), {"ADT^A01": 2, "ORU^R01": 1})
+        self.assertEqual(self.stats.totals(day, by="source"), {"ADMISSION": 2, "LAB": 1})
+        self.assertEqual(self.stats.totals(day, by="ack_code"), {"AA": 2, "AE": 1})
+        self.assertEqual(sum(self.stats.totals(day, date(2025, 6, 2)).values()), 4)
+        self.assertEqual(self.stats.series(datetime(2025, 6, 1), datetime(2025, 6, 2), "hour"),
+                         [("2025-06-01T10", 2), ("2025-06-01T11", 1)])
+        self.assertEqual(self.stats.series(datetime(2025, 6, 1, 10), datetime(2025, 6, 1, 11), source="ADMISSION"),
+                         [("2025-06-01T10:15", 2)])
+        with self.assertRaises(ValueError):
+            self.stats.totals(day, by="content")
+    
+    def test_replace_update_and_delete(self):
+        """Test que remplacements, mises à jour et suppressions gardent des compteurs exacts"""
+        self.repo.save(self._message(1, "2025-06-01T10:15:00", status="RECEIVED"))
+        self.repo.save(self._message(1, "2025-06-01T10:15:00", status="PROCESSED"))
+        self.assertEqual(self.stats.totals(date(2025, 6, 1), by="status"), {"PROCESSED": 1})
+        
+        with self.db.connect() as conn:
+            conn.execute("UPDATE messages SET status = 'ERROR' WHERE id = 'MSG0001'")
+        self.assertEqual(self.stats.totals(date(2025, 6, 1), by="status"), {"ERROR": 1})
+        
+        self.repo.delete("MSG0001")
+        self.assertEqual(self._all_stats(), [])
+    
+    def test_write_behind_batches(self):
+        """Test les compteurs des lots écrits par la file write-behind"""
+        write_queue = WriteBehindQueue(self.db, mode=ACK_THEN_COMMIT, batch_size=50)
+        for i in range(120):
+            write_queue.submit(message=self._message(i, f"2025-06-01T10:{i % 60:02d}:00"))
+        write_queue.close()
+        
+        self.assertEqual(self.stats.totals(date(2025, 6, 1)), {"ADT^A01": 120})
+        self.assertEqual(len(self.stats.series(datetime(2025, 6, 1, 10), datetime(2025, 6, 1, 11))), 60)
+    
+    def test_rebuild_matches_triggers(self):
+        """Test que le recalcul complet donne les mêmes compteurs que les déclencheurs"""
+        for i in range(30):
+            self.repo.save(self._message(i, f"2025-06-0{1 + i % 2}T{i % 24:02d}:{i:02d}:00",
+                                         source="10.0.0.5:40000" if i % 5 else "LAB",
+                                         status="PROCESSED" if i % 4 else "ERROR"))
+        expected = self._all_stats()
+        self.db.rebuild_stats()
+        self.assertEqual(self._all_stats(), expected)
+    
+    def test_ack_code_and_source_dimensions(self):
+        """Test le code d'ACK enregistré et la source sans port éphémère"""
+        for i, (source, ack_code) in enumerate([("10.0.0.5:40001", "AA"), ("10.0.0.5:40002", "AE"),
+                                                ("LAB", "AR"), ("LAB", None)]):
+            message = self._message(i, "2025-06-01T10:00:00", source=source)
+            message.ack_code = ack_code
+            self.repo.save(message)
+        self.assertEqual(self.repo.get_by_id("MSG0001").ack_code, "AE")
+        
+        day = date(2025, 6, 1)
+        self.assertEqual(self.stats.totals(day, by="source"), {"10.0.0.5": 2, "LAB": 2})
+        # Sans code enregistré, le code est déduit du statut (PROCESSED -> AA)
+        self.assertEqual(self.stats.totals(day, by="ack_code"), {"AA": 2, "AE": 1, "AR": 1})
+        self.assertEqual(self.stats.series(datetime(2025, 6, 1), datetime(2025, 6, 2), "hour",
+                                           ack_code="AE"), [("2025-06-01T10", 1)])
+    
+    def test_minute_retention(self):
+        """Test la purge des compteurs par minute anciens à chaque nouvelle heure"""
+        self.repo.save(self._message(1, "2025-06-01T10:15:00"))
+        self.repo.save(self._message(2, "2025-06-02T10:15:00"))
+        self.assertEqual(len(self.stats.series(datetime(2025, 6, 1), datetime(2025, 6, 4))), 2)
+        
+        self.repo.save(self._message(3, "2025-06-03T11:00:00"))
+        self.assertEqual(self.stats.series(datetime(2025, 6, 1), datetime(2025, 6, 4)),
+                         [("2025-06-02T10:15", 1), ("2025-06-03T11:00", 1)])
+        # Heures et jours conservés
+        self.assertEqual(sum(self.stats.totals(date(2025, 6, 1), date(2025, 6, 3)).values()), 3)
+        self.db.rebuild_stats()
+        self.assertEqual(len(self.stats.series(datetime(2025, 6, 1), datetime(2025, 6, 4))), 2)
+    
+    def test_existing_database_backfilled(self):
+        """Test le calcul initial des compteurs d'une base antérieure aux déclencheurs"""
+        path = os.path.join(self.tmp_dir.name, 'old.db')
+        conn = sqlite3.connect(path)
+        conn.executescript('''
+            CREATE TABLE messages (id TEXT PRIMARY KEY, type TEXT, content TEXT, source TEXT,
+                                   destination TEXT, patient_id TEXT, status TEXT, created_at TEXT);
+            INSERT INTO messages VALUES ('M1', 'ADT^A01', '', 'ADMISSION', 'HL7_SERVER', 'P1',
+                                         'PROCESSED', '2025-06-01T10:00:00');
+            INSERT INTO messages VALUES ('M2', 'ADT^A01', '', 'ADMISSION', 'HL7_SERVER', 'P1',
+                                         'PROCESSED', '2025-06-01T11:00:00');
+            PRAGMA user_version = 1;
+        ''')
+        conn.close()
+        
+        database = Database(path)
+        try:
+            stats = StatsRepository(database)
+            self.assertEqual(stats.totals(date(2025, 6, 1)), {"ADT^A01": 2})
+            self.assertEqual(stats.totals(date(2025, 6, 1), by="ack_code"), {"AA": 2})
+            
+            # Colonne ack_code ajoutée aux messages existants
+            message = self._message(3, "2025-06-01T12:00:00")
+            message.ack_code = "AE"
+            MessageRepository(database).save(message)
+            self.assertEqual(stats.totals(date(2025, 6, 1), by="ack_code"), {"AA": 2, "AE": 1})
+        finally:
+            database.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
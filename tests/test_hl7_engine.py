@@ -10,6 +10,9 @@ import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 from app.hl7_engine.builder import HL7MessageBuilder
+from app.hl7_engine.er7 import ER7ParseError, parse_er7, unescape
+from app.hl7_engine.parser import parse_hl7_message
+from app.hl7_engine.template_builder import TemplateMessageBuilder
 
 class TestHL7Builder(unittest.TestCase):
     
@@ -138,5 +141,122 @@ class TestHL7Builder(unittest.TestCase):
         self.assertTrue(timestamp.isdigit())
 
 
+class TestTemplateMessageBuilder(TestHL7Builder):
+    """Rejoue les tests du builder hl7apy sur le builder par gabarits"""
+    
+    def setUp(self):
+        super().setUp()
+        self.builder = TemplateMessageBuilder()
+    
+    def _freeze(self, builder):
+        """Fige l'horodatage et l'ID de contrôle pour comparer les sorties"""
+        builder._get_timestamp = lambda: "20250101120000"
+        builder._get_control_id = lambda: "CTRL0001"
+        return builder
+    
+    def test_identical_to_hl7apy_builder(self):
+        """Test que les segments sont identiques à ceux de HL7MessageBuilder"""
+        reference = self._freeze(HL7MessageBuilder())
+        template = self._freeze(TemplateMessageBuilder())
+        
+        self.assertEqual(template.create_adt_a01(self.patient_data),
+                         reference.create_adt_a01(self.patient_data))
+        self.assertEqual(template.create_adt_a01({"id": "P1", "last_name": "DOE"}),
+                         reference.create_adt_a01({"id": "P1", "last_name": "DOE"}))
+        self.assertEqual(template.create_oru_r01("P12345", self.results_data),
+                         reference.create_oru_r01("P12345", self.results_data))
+        self.assertEqual(template.create_orm_o01("P12345", self.order_data),
+                         reference.create_orm_o01("P12345", self.order_data))
+        order_without_options = {"order_id": "ORD1", "test_code": "XR", "test_name": "Radio"}
+        self.assertEqual(template.create_orm_o01("P12345", order_without_options),
+                         reference.create_orm_o01("P12345", order_without_options))
+    
+    def test_user_data_escaping(self):
+        """Test l'échappement des caractères réservés dans les données"""
+        patient = dict(self.patient_data, last_name="DUPONT|JR", first_name="A^B&C~D\\E")
+        message, _ = self.builder.create_adt_a01(patient)
+        
+        pid = parse_er7(message).segment("PID")
+        self.assertEqual(pid.component(5, 1), "DUPONT|JR")
+        self.assertEqual(pid.component(5, 2), "A^B&C~D\\E")
+        self.assertEqual(len(pid), 8)
+    
+    def test_none_order_id(self):
+        """Test qu'un order_id à None produit un champ vide"""
+        message, _ = self.builder.create_orm_o01("P1", {"order_id": None, "test_code": "A", "test_name": "B"})
+        self.assertEqual(parse_er7(message).value("ORC-2"), "")
+
+
+class TestER7Parser(unittest.TestCase):
+    
+    def setUp(self):
+        self.raw = (
+            "MSH|^~\\&|LAB|HOSPITAL|HIS|HOSPITAL|20250101120000||ORU^R01|CTRL001|P|2.5\r"
+            "PID|1||P12345^^^HOSPITAL~ALT99||DUPONT\\S\\JR^Jean||19800101|M\r"
+            "OBX|1|NM|HGB^Hémoglobine||14.2|g/dL\r"
+            "OBX|2|NM|PLT^Plaquettes||250|10*3/uL\r"
+        )
+    
+    def test_field_accessors(self):
+        """Test les accesseurs de type msh_9 / pid_3_1"""
+        msg = parse_er7(self.raw)
+        self.assertEqual(msg.msh_9, "ORU^R01")
+        self.assertEqual(msg.msh_10, "CTRL001")
+        self.assertEqual(msg.message_type, "ORU^R01")
+        self.assertEqual(msg.control_id, "CTRL001")
+        self.assertEqual(msg.pid_3_1, "P12345")
+        self.assertEqual(msg.value("PID-5-2"), "Jean")
+        self.assertEqual(msg.msh_1, "|")
+        self.assertEqual(msg.msh_2, "^~\\&")
+    
+    def test_escape_sequences(self):
+        """Test le décodage des séquences d'échappement"""
+        msg = parse_er7(self.raw)
+        self.assertEqual(msg.pid_5_1, "DUPONT^JR")
+        self.assertEqual(unescape("A\\F\\B\\T\\C\\R\\D\\E\\"), "A|B&C~D\\")
+        self.assertEqual(unescape("\\X41\\"), "A")
+    
+    def test_repetitions_and_segments(self):
+        """Test les répétitions et les segments multiples"""
+        msg = parse_er7(self.raw)
+        pid = msg.segment("PID")
+        self.assertEqual(pid.component(3, 1, repetition=2), "ALT99")
+        self.assertEqual([obx.field(5) for obx in msg.get_segments("OBX")], ["14.2", "250"])
+        self.assertIsNone(msg.segment("NTE"))
+        self.assertEqual(msg.value("PV1-3"), "")
+    
+    def test_custom_encoding_characters(self):
+        """Test un message utilisant d'autres séparateurs"""
+        msg = parse_er7("MSH#:~\\&#A#B#C#D#20250101##ADT:A01#42#P#2.5\rPID#1##P9##NOM:PRENOM")
+        self.assertEqual(msg.msh_9, "ADT:A01")
+        self.assertEqual(msg.msh_9_2, "A01")
+        self.assertEqual(msg.pid_5_2, "PRENOM")
+    
+    def test_missing_msh(self):
+        """Test le rejet d'un message sans MSH"""
+        with self.assertRaises(ER7ParseError):
+            parse_er7("PID|1||P12345")
+
+
+class TestHL7Parser(unittest.TestCase):
+    
+    MESSAGE = "MSH|^~\\&|A|B|C|D|20240517||ADT^A01|1|P|2.5\rPID|1||{}"
+    
+    def test_parse_valid_message(self):
+        """Test qu'un message valide est parsé (et pas refusé par le niveau de validation)"""
+        parsed = parse_hl7_message("\x0b" + self.MESSAGE.format("PAT1") + "\x1c\x0d")
+        self.assertIsNotNone(parsed)
+        self.assertEqual(parsed.msh.msh_9.value, "ADT^A01")
+    
+    def test_tolerant_validation(self):
+        """Test la validation tolérante par défaut: hors norme accepté, refusé en strict"""
+        from hl7apy.consts import VALIDATION_LEVEL
+        too_long = self.MESSAGE.format("X" * 300)            # PID-3 au-delà de sa longueur maximale
+        extra_fields = self.MESSAGE.format("PAT1" + "|x" * 60)  # Champs au-delà de la norme 2.5
+        for message in (too_long, extra_fields):
+            self.assertIsNotNone(parse_hl7_message(message))
+            self.assertIsNone(parse_hl7_message(message, validation_level=VALIDATION_LEVEL.STRICT))
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
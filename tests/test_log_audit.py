@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Tests unitaires pour l'analyse incrémentale des journaux de sécurité.
+"""
+import unittest
+import tempfile
+import os
+import sys
+
+# Ajouter le répertoire parent au path pour importer les modules de l'application
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.log_audit import LogAuditor, SlidingWindowCounter, parse_line
+from app.utils.logging_utils import setup_queue_logger, stop_queue_logger
+
+def log_line(second, message):
+    return f"2025-06-01 10:{second // 60:02d}:{second % 60:02d},000 - HL7Messenger - INFO - {message}\n"
+
+class TestParseLine(unittest.TestCase):
+    """Tests pour l'expression combinée"""
+
+    def test_events(self):
+        self.assertEqual(parse_line("Authentication failed for 10.0.0.5"), ("failure", "10.0.0.5"))
+        self.assertEqual(parse_line("10.0.0.5: Connection refused"), ("failure", "10.0.0.5"))
+        self.assertEqual(parse_line("Nouvelle connexion #3 depuis 192.168.1.20:5123"),
+                         ("success", "192.168.1.20"))
+        self.assertEqual(parse_line("Connexion refusée (limite de débit) depuis 10.0.0.5:5000"),
+                         ("failure", "10.0.0.5"))
+        self.assertIsNone(parse_line("Message reçu de 10.0.0.5"))
+        self.assertIsNone(parse_line("Authentication failed (version 1.2.3.4.5)"))
+
+class TestSlidingWindowCounter(unittest.TestCase):
+    """Tests pour la fenêtre glissante"""
+
+    def test_window(self):
+        counter = SlidingWindowCounter(window=60)
+        self.assertEqual(counter.add("a", 0), 1)
+        self.assertEqual(counter.add("a", 30), 2)
+        self.assertEqual(counter.add("a", 61), 2)
+        self.assertEqual(counter.count("a", 100), 1)
+        counter.add("b", 10)
+        counter.prune(100)
+        self.assertEqual(counter.keys(), ["a"])
+
+class TestLogAuditor(unittest.TestCase):
+    """Tests pour la lecture incrémentale et la rotation"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.log_path = os.path.join(self.temp_dir.name, "hl7_messenger.log")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write(self, *lines, mode="a"):
+        with open(self.log_path, mode, encoding="utf-8") as f:
+            f.write("".join(lines))
+
+    def test_incremental_with_saved_state(self):
+        self.write(*(log_line(i, "Authentication failed for 10.0.0.5") for i in range(5)),
+                   log_line(5, "Nouvelle connexion #1 depuis 10.0.0.9:4000"))
+        auditor = LogAuditor(self.log_path, threshold=5)
+        self.assertEqual(auditor.poll(), [])
+        auditor.save_state()
+
+        # Nouvelle instance: reprise à la position enregistrée
+        self.write(log_line(6, "Authentication failed for 10.0.0.5"), "2025-06-01 10:00:07,000 - partiel")
+        auditor = LogAuditor(self.log_path, threshold=5)
+        self.assertEqual(auditor.poll(), [("10.0.0.5", 6)])
+        self.assertEqual(auditor.failed_total["10.0.0.5"], 6)
+        self.assertEqual(auditor.success_total["10.0.0.9"], 1)
+        self.assertEqual(auditor.lines, 7)
+
+        # La ligne incomplète est lue une fois terminée
+        self.write(" Authentication failed for 10.0.0.6\n")
+        auditor.poll()
+        self.assertEqual(auditor.failed_total["10.0.0.6"], 1)
+        self.assertEqual(auditor.suspicious(), {"10.0.0.5": 6})
+
+    def test_sliding_window_threshold(self):
+        # Échecs espacés de 2 minutes: jamais plus de 3 dans une fenêtre de 5 minutes
+        self.write(*(log_line(i * 120, "Connection refused from 10.0.0.7") for i in range(20)))
+        auditor = LogAuditor(self.log_path, window=300, threshold=3)
+        self.assertEqual(auditor.poll(), [])
+        self.assertEqual(auditor.failed_total["10.0.0.7"], 20)
+        self.assertEqual(auditor.suspicious(), {})
+
+    def test_rotation_and_truncation(self):
+        self.write(log_line(0, "Authentication failed for 10.0.0.5"))
+        auditor = LogAuditor(self.log_path)
+        auditor.poll()
+
+        # Lignes écrites juste avant la rotation, puis nouveau fichier
+        self.write(log_line(1, "Authentication failed for 10.0.0.5"))
+        os.rename(self.log_path, self.log_path + ".1")
+        self.write(log_line(2, "Authentication failed for 10.0.0.8"), mode="w")
+        auditor.poll()
+        self.assertEqual(auditor.failed_total, {"10.0.0.5": 2, "10.0.0.8": 1})
+
+        # Troncature sur place
+        self.write(log_line(3, "Authentication failed for 10.0.0.9"), mode="w")
+        auditor.poll()
+        self.assertEqual(auditor.failed_total["10.0.0.9"], 1)
+
+    def test_server_log_format(self):
+        """Test la lecture du journal tel qu'écrit par le logger du serveur"""
+        logger = setup_queue_logger("HL7AuditTest.Server", log_file=self.log_path, console=False)
+        logger.propagate = False
+        for port in range(3):
+            logger.warning("Connexion refusée (limite de débit) depuis 10.0.0.5:%d", 4000 + port)
+        logger.info("Nouvelle connexion #1 depuis 10.0.0.9:4100")
+        stop_queue_logger("HL7AuditTest.Server")
+
+        auditor = LogAuditor(self.log_path, threshold=2)
+        self.assertEqual(auditor.poll(), [("10.0.0.5", 3)])
+        self.assertEqual(auditor.success_total, {"10.0.0.9": 1})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,16 +3,41 @@
 Tests unitaires pour le client MLLP.
 """
 import unittest
+from unittest import mock
 import threading
 import socket
 import time
 import os
+import signal
 import sys
+import json
+import logging
+import queue
+import tempfile
+import urllib.request
 
 # Ajouter le répertoire parent au path pour importer les modules de l'application
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from app.network.mllp_client import MLLPClient
+from app.db.database import Database
+from app.db.repositories.message_repository import MessageRepository
+from app.network.mllp_client import MLLPClient, MLLPConnectionPool, PooledConnection
+from app.network.async_mllp_server import AsyncMLLPServer
+from app.network import mllp_server
+from app.network.mllp_server import MLLPServer
+from app.network.multiprocess_server import MultiProcessMLLPServer
+from app.network.multiport_server import MultiPortMLLPServer, load_department_ports
+from app.network.processing_pool import Overloaded, ProcessingPool
+from app.network.patient_lanes import PatientLaneScheduler
+from app.network.mllp_framing import MLLPFrameDecoder, MLLPFrameError, encode_frame
+from app.network.rate_limit import SourceRateLimiter, Tarpit, TokenBucketLimiter, load_rate_limits
+from app.network.timeouts import ConnectionDeadline, TimerWheel, load_timeouts
+from app.utils.log_audit import parse_line
+from app.utils.logging_utils import (
+    DroppingQueueHandler, PayloadSampler, configured_log_file, setup_queue_logger, stop_queue_logger
+)
+from app.utils.metrics import MetricsRegistry
+from app.utils.tracing import NULL_TRACE, RollingFileExporter, Tracer
 
 class MockMLLPServer:
     """Serveur MLLP simulé pour tests"""
@@ -79,7 +104,13 @@ class MockMLLPServer:
     def stop(self):
         self.running = False
         if self.server_socket:
+            try:
+                # Débloquer accept() pour libérer réellement le port
+                self.server_socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
             self.server_socket.close()
+            self.server_thread.join(1)
 
 
 class TestMLLPClient(unittest.TestCase):
@@ -110,6 +141,17 @@ class TestMLLPClient(unittest.TestCase):
         self.assertEqual(len(self.mock_server.received_messages), 1)
         self.assertEqual(self.mock_server.received_messages[0], test_message)
     
+    def test_reconnect_after_server_close(self):
+        """Test qu'une connexion fermée par le serveur est remplacée"""
+        test_message = "MSH|^~\\&|SENDER|FACILITY|RECEIVER|FACILITY|20240517||ADT^A01|123456|P|2.5"
+        for _ in range(3):
+            success, response = self.client.send_message(test_message, 'TEST_SERVER')
+            self.assertTrue(success)
+            # Fermeture pendant l'inactivité: détectée avant le prochain envoi
+            # (un message déjà écrit n'est jamais renvoyé)
+            time.sleep(0.05)
+        self.assertEqual(len(self.mock_server.received_messages), 3)
+    
     def test_connection_failure(self):
         """Test l'envoi vers un serveur inexistant"""
         success, response = self.client.send_message("TEST", "NONEXISTENT_SERVER")
@@ -132,6 +174,14 @@ class TestMLLPClient(unittest.TestCase):
         self.assertIsNone(host)
         self.assertIsNone(port)
     
+    def test_control_id_extraction(self):
+        """Test l'extraction de MSH-10 et MSA-2"""
+        self.assertEqual(self.client._get_message_control_id(
+            "MSH|^~\\&|A|B|C|D|20240517||ADT^A01|CTRL42|P|2.5\rPID|||1"), "CTRL42")
+        self.assertIsNone(self.client._get_message_control_id("PID|||1"))
+        self.assertEqual(self.client._get_ack_control_id(
+            "MSH|^~\\&|ACK_SERVER||CLIENT||20240517||ACK|1|P|2.5\rMSA|AA|CTRL42|OK\r"), "CTRL42")
+    
     def test_validate_ack(self):
         """Test la validation des ACK"""
         # ACK positif
@@ -151,5 +201,1258 @@ class TestMLLPClient(unittest.TestCase):
         self.assertFalse(success)
 
 
+class TestMLLPConnectionPool(unittest.TestCase):
+    """Échanges du client sur une connexion persistante, serveur scripté"""
+    
+    ACK = "MSH|^~\\&|ACK_SERVER||CLIENT||20240517||ACK|1|P|2.5\rMSA|AA|{}|OK\r"
+    
+    def setUp(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind(('localhost', 12364))
+        self.listener.listen(5)
+        self.listener.settimeout(5)
+        self.accepted = 0
+        self.received = []
+        self.client = MLLPClient({'SCRIPTED': {'host': 'localhost', 'port': 12364}})
+    
+    def tearDown(self):
+        self.client.close()
+        try:
+            # Débloquer accept() du thread du serveur
+            self.listener.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.listener.close()
+        self.thread.join(5)
+    
+    def _serve(self, replies):
+        """Accepte des connexions; replies(index, message) renvoie les octets à écrire ou None pour fermer"""
+        def run():
+            while True:
+                try:
+                    conn, _ = self.listener.accept()
+                except OSError:
+                    return
+                self.accepted += 1
+                decoder = MLLPFrameDecoder()
+                with conn:
+                    while True:
+                        data = conn.recv(4096)
+                        if not data:
+                            break
+                        for frame in decoder.feed(data):
+                            self.received.append(frame.decode('utf-8'))
+                            reply = replies(len(self.received), frame.decode('utf-8'))
+                            if reply is None:
+                                break
+                            conn.sendall(reply)
+                        else:
+                            continue
+                        break
+        
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+    
+    def _message(self, control_id):
+        return f"MSH|^~\\&|A|B|C|D|20240517||ADT^A01|{control_id}|P|2.5"
+    
+    def test_extra_frames_not_dropped(self):
+        """Test que les trames reçues en plus de l'ACK ne désynchronisent pas la connexion"""
+        self._serve(lambda index, message: b''.join(
+            encode_frame(self.ACK.format(control_id)) for control_id in (f"CTRL{index}", "EXTRA")
+        ))
+        success, _ = self.client.send_message(self._message("CTRL1"), 'SCRIPTED')
+        self.assertTrue(success)
+        # Trame EXTRA restée en attente: la connexion n'est pas remise dans le pool
+        self.assertFalse(self.client.pool._idle.get(('localhost', 12364)))
+        
+        success, _ = self.client.send_message(self._message("CTRL2"), 'SCRIPTED')
+        self.assertTrue(success)
+        self.assertEqual(self.accepted, 2)
+    
+    def test_no_resend_after_write(self):
+        """Test qu'un message écrit sur une connexion réutilisée n'est jamais renvoyé"""
+        self._serve(lambda index, message: encode_frame(self.ACK.format("CTRL1")) if index == 1 else None)
+        self.assertTrue(self.client.send_message(self._message("CTRL1"), 'SCRIPTED')[0])
+        
+        # Le serveur lit le second message puis ferme sans ACK
+        success, response = self.client.send_message(self._message("CTRL2"), 'SCRIPTED')
+        self.assertFalse(success)
+        self.assertEqual(response, "Pas d'accusé de réception")
+        self.assertEqual([m.split("|")[9] for m in self.received], ["CTRL1", "CTRL2"])
+        self.assertEqual(self.accepted, 1)
+    
+    def test_batch_ignores_duplicate_ack(self):
+        """Test qu'un ACK en double (y compris sans message en attente) est ignoré"""
+        rejected = self.ACK.replace("MSA|AA|", "MSA|AE|")
+        self._serve(lambda index, message: encode_frame(self.ACK.format(f"CTRL{index}"))
+                    + encode_frame(rejected.format(f"CTRL{index}")))
+        messages = [self._message(f"CTRL{i}") for i in range(1, 4)]
+        with self.assertLogs("HL7Messenger.MLLPClient", level="WARNING"):
+            results = self.client.send_batch(messages, 'SCRIPTED', window=3)
+        self.assertEqual([success for success, _ in results], [True, True, True])
+    
+    def test_batch_ignores_unknown_ack(self):
+        """Test qu'un ACK d'un autre message n'est pas attribué à un message en attente"""
+        rejected = self.ACK.replace("MSA|AA|", "MSA|AE|")
+        self._serve(lambda index, message: encode_frame(rejected.format("OTHER"))
+                    + encode_frame(self.ACK.format(f"CTRL{index}")))
+        messages = [self._message(f"CTRL{i}") for i in range(1, 4)]
+        with self.assertLogs("HL7Messenger.MLLPClient", level="WARNING") as logs:
+            results = self.client.send_batch(messages, 'SCRIPTED', window=3)
+        self.assertEqual([success for success, _ in results], [True, True, True])
+        self.assertIn("OTHER", logs.output[0])
+
+
+class TestMLLPConnectionPoolEviction(unittest.TestCase):
+    """Fermeture des connexions inactives du pool"""
+    
+    def _connection(self, endpoint, idle_for):
+        sock, peer = socket.socketpair()
+        self.addCleanup(peer.close)
+        conn = PooledConnection(sock, endpoint)
+        conn.last_used = time.monotonic() - idle_for
+        return conn
+    
+    def test_expired_connection_evicted_on_release(self):
+        """Test qu'une connexion inactive vers une autre destination est fermée"""
+        pool = MLLPConnectionPool(idle_timeout=0.05)
+        self.addCleanup(pool.close_all)
+        stale = self._connection(('host-a', 2575), idle_for=60)
+        pool._idle[stale.endpoint] = [stale]
+        time.sleep(0.1)  # Prochaine éviction due
+        
+        fresh = self._connection(('host-b', 2575), idle_for=0)
+        pool.release(fresh)
+        self.assertEqual(stale.sock.fileno(), -1)
+        self.assertEqual(pool._idle[('host-a', 2575)], [])
+        self.assertEqual(pool._idle[('host-b', 2575)], [fresh])
+    
+    def test_eviction_is_throttled(self):
+        """Test que l'éviction n'a lieu qu'une fois par idle_timeout"""
+        pool = MLLPConnectionPool(idle_timeout=60)
+        self.addCleanup(pool.close_all)
+        stale = self._connection(('host-a', 2575), idle_for=120)
+        pool._idle[stale.endpoint] = [stale]
+        
+        pool.release(self._connection(('host-b', 2575), idle_for=0))
+        self.assertNotEqual(stale.sock.fileno(), -1)
+        pool._next_eviction = 0
+        pool.release(self._connection(('host-b', 2575), idle_for=0))
+        self.assertEqual(stale.sock.fileno(), -1)
+
+
+class TestMLLPFrameDecoder(unittest.TestCase):
+    
+    def setUp(self):
+        self.decoder = MLLPFrameDecoder(max_frame_size=1024)
+    
+    def test_multiple_frames_per_read(self):
+        """Test l'extraction de plusieurs trames reçues en une seule lecture"""
+        data = encode_frame("MSG1") + encode_frame("MSG2") + encode_frame("MSG3")
+        self.assertEqual(self.decoder.feed(data), [b"MSG1", b"MSG2", b"MSG3"])
+        self.assertEqual(len(self.decoder), 0)
+    
+    def test_frame_split_across_reads(self):
+        """Test une trame reçue octet par octet"""
+        frames = []
+        for byte in encode_frame("MSH|^~\\&|A") + encode_frame("B"):
+            frames.extend(self.decoder.feed(bytes([byte])))
+        self.assertEqual(frames, [b"MSH|^~\\&|A", b"B"])
+    
+    def test_partial_frame_kept(self):
+        """Test qu'une trame incomplète reste dans le buffer"""
+        self.assertEqual(self.decoder.feed(encode_frame("A") + b"\x0bPART"), [b"A"])
+        self.assertEqual(self.decoder.feed(b"IAL\x1c\x0d"), [b"PARTIAL"])
+    
+    def test_noise_between_frames_ignored(self):
+        """Test que les octets hors trame sont ignorés"""
+        data = b"noise" + encode_frame("A") + b"\r\n" + encode_frame("B")
+        self.assertEqual(self.decoder.feed(data), [b"A", b"B"])
+    
+    def test_max_frame_size(self):
+        """Test le rejet d'un message trop volumineux"""
+        with self.assertRaises(MLLPFrameError):
+            self.decoder.feed(b"\x0b" + b"X" * 2048)
+        self.assertEqual(len(self.decoder), 0)
+        
+        with self.assertRaises(MLLPFrameError):
+            self.decoder.feed(encode_frame("X" * 2048))
+
+
+class TestAsyncMLLPServer(unittest.TestCase):
+    
+    def setUp(self):
+        self.server = AsyncMLLPServer(host='localhost', port=12346, backlog=128)
+        # Pas de persistance pendant les tests
+        self.server.patient_repo = None
+        self.server.message_repo = None
+        self.server_thread = threading.Thread(target=self.server.start)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        time.sleep(0.2)  # Attendre que le serveur démarre
+        
+        self.client = MLLPClient({
+            'ASYNC_SERVER': {'host': 'localhost', 'port': 12346}
+        })
+    
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        self.server_thread.join(2)
+    
+    def test_send_message(self):
+        """Test l'envoi d'un message et la réception d'un ACK AA"""
+        test_message = "MSH|^~\\&|SENDER|FACILITY|RECEIVER|FACILITY|20240517||ADT^A01|123456|P|2.5\rPID|||12345^^^FACILITY||DOE^JOHN||19700101|M"
+        success, response = self.client.send_message(test_message, 'ASYNC_SERVER')
+        
+        self.assertTrue(success)
+        self.assertEqual(self.server.messages_received, 1)
+    
+    def test_connection_reuse(self):
+        """Test que les envois successifs réutilisent la même connexion"""
+        test_message = "MSH|^~\\&|SENDER|FACILITY|RECEIVER|FACILITY|20240517||ORM^O01|1|P|2.5"
+        success, _ = self.client.test_connection('ASYNC_SERVER')
+        self.assertTrue(success)
+        for _ in range(10):
+            success, _ = self.client.send_message(test_message, 'ASYNC_SERVER')
+            self.assertTrue(success)
+        
+        self.assertEqual(self.server.messages_received, 10)
+        self.assertEqual(self.server.clients_connected, 1)
+    
+    def test_idle_eviction(self):
+        """Test la fermeture des connexions inactives"""
+        self.client.pool.idle_timeout = 0
+        test_message = "MSH|^~\\&|SENDER|FACILITY|RECEIVER|FACILITY|20240517||ORM^O01|1|P|2.5"
+        self.client.send_message(test_message, 'ASYNC_SERVER')
+        self.client.send_message(test_message, 'ASYNC_SERVER')
+        self.assertEqual(self.server.clients_connected, 2)
+    
+    def test_send_batch(self):
+        """Test l'envoi en lot avec fenêtre et corrélation des ACK"""
+        messages = [
+            f"MSH|^~\\&|LAB|HOSPITAL|HIS|HOSPITAL|20240517||ORU^R01|CTRL{i}|P|2.5\rPID|||P{i}"
+            for i in range(50)
+        ]
+        messages[7] = "PID|||SANS_MSH"  # Rejeté par le serveur (ACK AE)
+        
+        results = self.client.send_batch(messages, 'ASYNC_SERVER', window=8)
+        
+        self.assertEqual(len(results), 50)
+        self.assertEqual(results[7], (False, "Erreur d'application"))
+        self.assertTrue(all(success for i, (success, _) in enumerate(results) if i != 7))
+        self.assertEqual(self.server.messages_received, 50)
+        self.assertEqual(self.server.clients_connected, 1)
+    
+    def test_send_batch_unknown_destination(self):
+        """Test l'envoi en lot vers une destination inconnue"""
+        results = self.client.send_batch(["MSH|^~\\&|A"] * 3, 'UNKNOWN')
+        self.assertEqual(len(results), 3)
+        self.assertFalse(any(success for success, _ in results))
+    
+    def test_invalid_message(self):
+        """Test qu'un message sans MSH reçoit un ACK d'erreur"""
+        success, response = self.client.send_message("PID|||12345", 'ASYNC_SERVER')
+        self.assertFalse(success)
+        self.assertEqual(response, "Erreur d'application")
+    
+    def test_pipelined_messages(self):
+        """Test plusieurs messages envoyés dans un même segment TCP"""
+        frames = b''.join(
+            encode_frame(f"MSH|^~\\&|A|B|C|D|20240517||ADT^A01|{i}|P|2.5\r")
+            for i in range(10)
+        )
+        with socket.create_connection(('localhost', 12346), timeout=5) as s:
+            s.sendall(frames)
+            decoder = MLLPFrameDecoder()
+            acks = []
+            while len(acks) < 10:
+                acks.extend(decoder.feed(s.recv(4096)))
+        
+        for i, ack in enumerate(acks):
+            self.assertIn(f"MSA|AA|{i}|".encode('utf-8'), ack)
+    
+    def test_concurrent_connections(self):
+        """Test de nombreuses connexions persistantes simultanées"""
+        sockets = []
+        try:
+            for _ in range(200):
+                s = socket.create_connection(('localhost', 12346), timeout=5)
+                sockets.append(s)
+            
+            message = "MSH|^~\\&|A|B|C|D|20240517||ORU^R01|42|P|2.5\r"
+            for s in sockets:
+                s.sendall(MLLPClient.SB + message.encode('utf-8') + MLLPClient.EB + MLLPClient.CR)
+            for s in sockets:
+                data = b''
+                while MLLPClient.EB not in data:
+                    data += s.recv(4096)
+                self.assertIn(b"MSA|AA|42", data)
+        finally:
+            for s in sockets:
+                s.close()
+        
+        self.assertEqual(self.server.messages_received, 200)
+
+
+class QuietMLLPServer(MLLPServer):
+    """Serveur MLLP sans persistance, exécuté par les ouvriers de test"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.patient_repo = None
+        self.message_repo = None
+
+
+@unittest.skipUnless(hasattr(socket, 'SO_REUSEPORT'), "SO_REUSEPORT non disponible")
+class TestMultiProcessMLLPServer(unittest.TestCase):
+    
+    MESSAGE = "MSH|^~\\&|A|B|C|D|20240517||ADT^A01|7|P|2.5\r"
+    
+    def setUp(self):
+        self.server = MultiProcessMLLPServer(
+            'localhost', 12347, workers=2, server_class=QuietMLLPServer,
+            restart_delay=0.1, report_interval=0.05
+        )
+        self.server_thread = threading.Thread(target=self.server.start)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self._wait(lambda: len(self.server.worker_pids()) == 2)
+        time.sleep(0.5)  # Attendre que les ouvriers écoutent
+    
+    def tearDown(self):
+        self.server.stop()
+        self.server_thread.join(10)
+    
+    def _wait(self, condition, timeout=10):
+        deadline = time.time() + timeout
+        while not condition():
+            if time.time() > deadline:
+                self.fail("Condition non atteinte à temps")
+            time.sleep(0.05)
+    
+    def _send(self, count):
+        for _ in range(count):
+            with socket.create_connection(('localhost', 12347), timeout=5) as s:
+                s.sendall(encode_frame(self.MESSAGE))
+                decoder = MLLPFrameDecoder()
+                acks = []
+                while not acks:
+                    acks = decoder.feed(s.recv(4096))
+                self.assertIn(b"MSA|AA|7", acks[0])
+    
+    def test_counters_aggregated(self):
+        """Test l'agrégation des compteurs de tous les ouvriers"""
+        self._send(20)
+        self._wait(lambda: self.server.messages_received == 20)
+        self.assertEqual(self.server.stats()['clients_connected'], 20)
+    
+    def test_crashed_worker_restarted(self):
+        """Test le redémarrage d'un ouvrier tué et la conservation de ses compteurs"""
+        self._send(10)
+        self._wait(lambda: self.server.messages_received == 10)
+        
+        os.kill(self.server.worker_pids()[0], signal.SIGKILL)
+        self._wait(lambda: self.server.restarts == 1 and len(self.server.worker_pids()) == 2)
+        time.sleep(0.5)
+        
+        self._send(10)
+        self._wait(lambda: self.server.messages_received == 20)
+
+
+class TestMultiPortMLLPServer(unittest.TestCase):
+    
+    def setUp(self):
+        def handler(message, name, address):
+            control_id = message.split("|")[9]
+            return f"MSH|^~\\&|{name}||CLIENT||20240517||ACK|{control_id}|P|2.5\rMSA|AA|{control_id}|{name}"
+        
+        self.server = MultiPortMLLPServer({
+            12350: ("ADMISSION", handler),
+            12351: ("LAB", handler),
+        }, host='localhost')
+        self.server_thread = threading.Thread(target=self.server.start)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        self.server.wait_ready(5)
+        
+        self.client = MLLPClient({
+            'ADMISSION': {'host': 'localhost', 'port': 12350},
+            'LAB': {'host': 'localhost', 'port': 12351},
+        })
+    
+    def tearDown(self):
+        self.client.close()
+        self.server.stop()
+        self.server_thread.join(2)
+    
+    def test_routing_by_port(self):
+        """Test que chaque port est servi par le gestionnaire de son département"""
+        message = "MSH|^~\\&|A|B|C|D|20240517||ADT^A01|{}|P|2.5"
+        for i, (port, department) in enumerate([(12350, 'ADMISSION'), (12351, 'LAB'), (12351, 'LAB')]):
+            with socket.create_connection(('localhost', port), timeout=5) as s:
+                s.sendall(encode_frame(message.format(i)))
+                decoder = MLLPFrameDecoder()
+                acks = []
+                while not acks:
+                    acks = decoder.feed(s.recv(4096))
+            self.assertIn(f"MSA|AA|{i}|{department}".encode('utf-8'), acks[0])
+        
+        success, _ = self.client.send_message(message.format(3), 'LAB')
+        self.assertTrue(success)
+        self.assertEqual(self.server.messages_received, {'ADMISSION': 1, 'LAB': 3})
+
+    def test_frame_error_ack(self):
+        """Test l'ACK d'erreur AE renvoyé pour une trame rejetée, comme MLLPServer"""
+        self.server.max_message_size = 64
+        with socket.create_connection(('localhost', 12350), timeout=5) as s:
+            s.sendall(b'\x0b' + b'X' * 200)
+            decoder = MLLPFrameDecoder()
+            acks = []
+            while not acks:
+                data = s.recv(4096)
+                self.assertTrue(data)
+                acks = decoder.feed(data)
+            self.assertIn(b"MSA|AE|1|", acks[0])
+            self.assertEqual(s.recv(4096), b"")
+    
+    def test_single_thread(self):
+        """Test que tous les ports sont servis sans thread supplémentaire"""
+        threads_before = threading.active_count()
+        sockets = [socket.create_connection(('localhost', port), timeout=5)
+                   for port in (12350, 12351) for _ in range(20)]
+        try:
+            time.sleep(0.2)
+            self.assertEqual(threading.active_count(), threads_before)
+        finally:
+            for s in sockets:
+                s.close()
+    
+    def test_load_department_ports(self):
+        """Test la lecture des ports départementaux de config.json"""
+        ports = load_department_ports()
+        self.assertEqual(ports[2576], 'ADMISSION_SYSTEM')
+        self.assertEqual(ports[2579], 'PHARMACY_SYSTEM')
+
+
+class TestProcessingPool(unittest.TestCase):
+    
+    def setUp(self):
+        self.release = threading.Event()
+        self.started = threading.Event()
+        self.order = []
+        
+        def handler(item):
+            self.started.set()
+            self.release.wait(5)
+            self.order.append(item)
+            return item.lower()
+        
+        self.handler = handler
+    
+    def test_round_robin_between_sources(self):
+        """Test qu'une source qui inonde le pool ne bloque pas les autres"""
+        pool = ProcessingPool(self.handler, workers=1, max_in_flight=100)
+        futures = [pool.submit("A", "A1")]
+        self.started.wait(5)
+        futures += [pool.submit("A", f"A{i}") for i in range(2, 6)]
+        futures += [pool.submit("B", f"B{i}") for i in range(1, 3)]
+        self.release.set()
+        
+        self.assertEqual([f.result(5) for f in futures], ["a1", "a2", "a3", "a4", "a5", "b1", "b2"])
+        self.assertEqual(self.order, ["A1", "A2", "B1", "A3", "B2", "A4", "A5"])
+        pool.shutdown()
+        self.assertEqual(pool.in_flight, 0)
+    
+    def test_admission_limits(self):
+        """Test les limites globale et par source"""
+        pool = ProcessingPool(self.handler, workers=1, max_in_flight=3, max_per_source=2)
+        futures = [pool.submit("A", "A1"), pool.submit("A", "A2")]
+        with self.assertRaises(Overloaded):
+            pool.submit("A", "A3")
+        futures.append(pool.submit("B", "B1"))
+        with self.assertRaises(Overloaded):
+            pool.submit("C", "C1")
+        self.assertEqual(pool.rejected, 2)
+        
+        self.release.set()
+        for future in futures:
+            future.result(5)
+        pool.submit("C", "C1").result(5)
+        pool.shutdown()
+    
+    def test_handler_exception(self):
+        """Test qu'une exception du gestionnaire est transmise au Future"""
+        pool = ProcessingPool(lambda item: 1 / 0, workers=1)
+        with self.assertRaises(ZeroDivisionError):
+            pool.submit("A", "A1").result(5)
+        pool.shutdown()
+
+
+class TestPatientLaneScheduler(unittest.TestCase):
+    
+    def test_same_patient_in_order(self):
+        """Test que les messages d'un même patient sont traités dans l'ordre d'arrivée"""
+        processed = {}
+        lock = threading.Lock()
+        
+        def handler(patient_id, sequence):
+            time.sleep(0.001 * (sequence % 3))
+            with lock:
+                processed.setdefault(patient_id, []).append(sequence)
+        
+        lanes = PatientLaneScheduler(handler, lanes=4, max_in_flight=1000)
+        futures = [lanes.submit(f"PAT{p}", f"PAT{p}", i) for i in range(20) for p in range(8)]
+        for future in futures:
+            future.result(10)
+        lanes.shutdown()
+        
+        for patient_id in processed:
+            self.assertEqual(processed[patient_id], list(range(20)))
+        self.assertEqual(sum(lanes.stats()['processed']), 160)
+        self.assertEqual(lanes.in_flight, 0)
+    
+    def test_different_lanes_in_parallel(self):
+        """Test que deux patients de files différentes sont traités en parallèle"""
+        barrier = threading.Barrier(2, timeout=5)
+        lanes = PatientLaneScheduler(lambda key: barrier.wait(), lanes=8)
+        first, second = "PAT1", next(
+            key for key in (f"PAT{i}" for i in range(2, 100))
+            if lanes.lane_for(key) != lanes.lane_for("PAT1")
+        )
+        # Les deux traitements ne se terminent que s'ils s'exécutent simultanément
+        futures = [lanes.submit(first, first), lanes.submit(second, second)]
+        for future in futures:
+            future.result(5)
+        lanes.shutdown()
+    
+    def test_lane_depth_metrics(self):
+        """Test les profondeurs de file et la limite globale"""
+        release = threading.Event()
+        lanes = PatientLaneScheduler(lambda key: release.wait(5), lanes=2, max_in_flight=3)
+        futures = [lanes.submit("PAT1", "PAT1") for _ in range(3)]
+        with self.assertRaises(Overloaded):
+            lanes.submit("PAT2", "PAT2")
+        
+        lane = lanes.lane_for("PAT1")
+        self.assertEqual(lanes.stats()['depths'][lane], 3)
+        release.set()
+        for future in futures:
+            future.result(5)
+        lanes.shutdown()
+        
+        stats = lanes.stats()
+        self.assertEqual(stats['depths'], [0, 0])
+        self.assertEqual(stats['max_depths'][lane], 3)
+        self.assertEqual(stats['rejected'], 1)
+    
+    def test_submit_after_shutdown(self):
+        """Test l'arrêt: messages en attente annulés, soumissions refusées"""
+        started, release = threading.Event(), threading.Event()
+        
+        def handler(key):
+            started.set()
+            release.wait(5)
+            return key
+        
+        lanes = PatientLaneScheduler(handler, lanes=1, max_in_flight=10)
+        running = lanes.submit("PAT1", "PAT1")
+        started.wait(5)
+        queued = [lanes.submit("PAT1", "PAT1") for _ in range(2)]
+        lanes.shutdown(wait=False)
+        
+        with self.assertRaises(Overloaded):
+            lanes.submit("PAT1", "PAT1")
+        for future in queued:
+            self.assertTrue(future.cancelled())
+        
+        # Le message en cours de traitement se termine normalement
+        release.set()
+        self.assertEqual(running.result(5), "PAT1")
+        lanes.shutdown()
+        self.assertEqual(lanes.in_flight, 0)
+        self.assertEqual(lanes.stats()['depths'], [0])
+        
+    def test_server_lane_key(self):
+        """Test la clé d'ordonnancement du serveur: PID-3, sinon la source"""
+        server = QuietMLLPServer(host='localhost', port=12353, lanes=2)
+        try:
+            with_pid = "MSH|^~\\&|A|B|C|D|20240517||ADT^A08|1|P|2.5\rPID|1||PAT42^^^HOSP||DOE^JOHN"
+            without_pid = "MSH|^~\\&|A|B|C|D|20240517||ORM^O01|2|P|2.5"
+            self.assertEqual(server._lane_key(with_pid, ('10.0.0.1', 5000)), "PAT42")
+            self.assertEqual(server._lane_key(without_pid, ('10.0.0.1', 5000)), "10.0.0.1")
+            
+            ack = server._dispatch(with_pid, ('10.0.0.1', 5000))
+            self.assertIn(b"MSA|AA|1|", ack)
+        finally:
+            server.lane_scheduler.shutdown()
+
+
+class TestServerArguments(unittest.TestCase):
+    """Options de la ligne de commande du serveur"""
+    
+    def _main(self, *argv):
+        with mock.patch.object(sys, 'argv', ['mllp_server.py', *argv]), \
+                mock.patch('app.network.mllp_server.MLLPServer') as server_class, \
+                mock.patch('app.network.multiprocess_server.MultiProcessMLLPServer') as multi_class, \
+                mock.patch('builtins.print'):
+            mllp_server.main()
+        return server_class, multi_class
+    
+    def test_max_per_source(self):
+        """Test que --max-per-source est transmis aux deux modes du serveur"""
+        self.assertIsNone(mllp_server.parse_arguments([]).max_per_source)
+        
+        server_class, _ = self._main("--no-rate-limit", "--pool-size", "4", "--max-per-source", "8")
+        self.assertEqual(server_class.call_args.kwargs["max_per_source"], 8)
+        
+        _, multi_class = self._main("--no-rate-limit", "--workers", "2", "--max-per-source", "8")
+        self.assertEqual(multi_class.call_args.kwargs["max_per_source"], 8)
+
+
+class TestServerAdmissionControl(unittest.TestCase):
+    
+    def setUp(self):
+        self.release = threading.Event()
+        self.server = QuietMLLPServer(host='localhost', port=12352, pool_size=1, max_in_flight=1)
+        original = self.server.handle_message
+        
+        def slow_handle_message(message, client_address):
+            self.release.wait(5)
+            return original(message, client_address)
+        
+        self.server.handle_message = slow_handle_message
+        self.server_thread = threading.Thread(target=self.server.start)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        time.sleep(0.2)
+    
+    def tearDown(self):
+        self.release.set()
+        self.server.stop()
+        self.server_thread.join(2)
+    
+    def _ack(self, s):
+        decoder = MLLPFrameDecoder()
+        acks = []
+        while not acks:
+            acks = decoder.feed(s.recv(4096))
+        return acks[0]
+    
+    def test_fast_reject_when_overloaded(self):
+        """Test le rejet AR immédiat quand la capacité est atteinte"""
+        message = "MSH|^~\\&|A|B|C|D|20240517||ADT^A01|{}|P|2.5\r"
+        with socket.create_connection(('localhost', 12352), timeout=5) as busy, \
+                socket.create_connection(('localhost', 12352), timeout=5) as flooded:
+            busy.sendall(encode_frame(message.format("FIRST")))
+            time.sleep(0.2)
+            
+            flooded.sendall(encode_frame(message.format("SECOND")))
+            self.assertIn(b"MSA|AR|SECOND|", self._ack(flooded))
+            
+            self.release.set()
+            self.assertIn(b"MSA|AA|FIRST|", self._ack(busy))
+        
+        self.assertEqual(self.server.processing_pool.rejected, 1)
+
+
+class ListHandler(logging.Handler):
+    """Handler de test qui conserve les enregistrements"""
+    
+    def __init__(self):
+        super().__init__()
+        self.records = []
+    
+    def emit(self, record):
+        self.records.append(record)
+
+
+class TestServerLogging(unittest.TestCase):
+    
+    MESSAGE = "MSH|^~\\&|A|B|C|D|20240517||ADT^A01|7|P|2.5\rPID|||P1||DOE^JOHN\r"
+    
+    def setUp(self):
+        self.handler = ListHandler()
+        self.server = None
+    
+    def tearDown(self):
+        if self.server:
+            self.server.logger.removeHandler(self.handler)
+    
+    def _server(self, **kwargs):
+        self.server = QuietMLLPServer(host='localhost', port=0, **kwargs)
+        self.server.logger.addHandler(self.handler)
+        return self.server
+    
+    def test_payload_sampler(self):
+        """Test l'échantillonnage du contenu des messages"""
+        sampler = PayloadSampler(3)
+        self.assertEqual([sampler() for _ in range(6)], [True, False, False, True, False, False])
+        never = PayloadSampler(0)
+        self.assertFalse(any(never() for _ in range(5)))
+    
+    def test_dropping_queue_handler_never_blocks(self):
+        """Test l'abandon des enregistrements quand la file est pleine"""
+        handler = DroppingQueueHandler(queue.Queue(2))
+        record = logging.makeLogRecord({'msg': 'x'})
+        for _ in range(5):
+            handler.handle(record)
+        self.assertEqual(handler.queue.qsize(), 2)
+        self.assertEqual(handler.dropped, 3)
+    
+    def test_sampled_payload(self):
+        """Test que le contenu n'est journalisé que pour un message sur N"""
+        server = self._server(payload_sample_every=2)
+        for _ in range(4):
+            server._log_received_message(self.MESSAGE, "127.0.0.1:1")
+        with_payload = [r for r in self.handler.records if "DOE^JOHN" in r.getMessage()]
+        self.assertEqual(len(self.handler.records), 4)
+        self.assertEqual(len(with_payload), 2)
+    
+    def test_quiet_mode(self):
+        """Test qu'aucun enregistrement n'est produit par message en mode silencieux"""
+        server = self._server(log_level="WARNING")
+        server._log_received_message(self.MESSAGE, "127.0.0.1:1")
+        server._dispatch(self.MESSAGE, ("127.0.0.1", 1))
+        self.assertEqual(self.handler.records, [])
+        
+        server._reject(self.MESSAGE, "Serveur saturé")
+        self.assertEqual([r.levelno for r in self.handler.records], [logging.WARNING])
+    
+    def test_level_per_instance(self):
+        """Test qu'un second serveur ne modifie pas le niveau du premier"""
+        first = QuietMLLPServer(host='localhost', port=0, log_level="DEBUG")
+        QuietMLLPServer(host='localhost', port=0, log_level="WARNING")
+        self.assertTrue(first.logger.isEnabledFor(logging.DEBUG))
+    
+    def test_queue_logger_file_and_propagation(self):
+        """Test l'écriture dans le fichier de log et la propagation aux loggers parents"""
+        parent_handler = ListHandler()
+        logging.getLogger("HL7Test").addHandler(parent_handler)
+        with tempfile.TemporaryDirectory() as directory:
+            log_file = os.path.join(directory, "logs", "app.log")
+            logger = setup_queue_logger("HL7Test.Queue", log_file=log_file, console=False)
+            logger.warning("Connexion refusée depuis 10.0.0.5:4000")
+            stop_queue_logger("HL7Test.Queue")
+            logging.getLogger("HL7Test").removeHandler(parent_handler)
+            with open(log_file, encoding="utf-8") as f:
+                self.assertIn("Connexion refusée depuis 10.0.0.5:4000", f.read())
+        self.assertEqual(len(parent_handler.records), 1)
+    
+    def test_configured_log_file(self):
+        """Test le fichier de log de la configuration, relatif à la racine du projet"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.json")
+            with open(path, "w") as f:
+                json.dump({"logging": {"file_enabled": True, "file_path": "logs/x.log"}}, f)
+            self.assertTrue(configured_log_file(path).endswith(os.path.join("logs", "x.log")))
+            self.assertTrue(os.path.isabs(configured_log_file(path)))
+            with open(path, "w") as f:
+                json.dump({"logging": {"file_enabled": False}}, f)
+            self.assertIsNone(configured_log_file(path))
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    
+    def test_counter_with_labels(self):
+        """Test le rendu d'un compteur décliné par étiquettes"""
+        registry = MetricsRegistry()
+        acks = registry.counter("hl7_acks_total", "ACK envoyés", ("code", "message_type"))
+        acks.inc("AA", "ADT^A01")
+        acks.inc("AA", "ADT^A01")
+        acks.inc("AE", 'X"Y')
+        text = registry.render()
+        self.assertIn("# TYPE hl7_acks_total counter", text)
+        self.assertIn('hl7_acks_total{code="AA",message_type="ADT^A01"} 2', text)
+        self.assertIn('hl7_acks_total{code="AE",message_type="X\\"Y"} 1', text)
+        self.assertIs(registry.counter("hl7_acks_total", "ACK envoyés", ("code", "message_type")), acks)
+    
+    def test_histogram_buckets_are_cumulative(self):
+        """Test les seaux cumulatifs, la somme et l'estimation des quantiles"""
+        registry = MetricsRegistry()
+        latency = registry.histogram("latency_seconds", "Latence", buckets=(0.01, 0.1, 1))
+        for value in (0.005, 0.05, 0.05, 5):
+            latency.observe(value)
+        text = registry.render()
+        self.assertIn('latency_seconds_bucket{le="0.01"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 3', text)
+        self.assertIn('latency_seconds_bucket{le="1"} 3', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4', text)
+        self.assertIn("latency_seconds_count 4", text)
+        self.assertEqual(latency.quantile(0.5), 0.1)
+        self.assertEqual(latency.quantile(1.0), float("inf"))
+    
+    def test_message_type_label(self):
+        """Test l'extraction de MSH-9 sans analyse complète"""
+        self.assertEqual(MLLPServer._message_type_label("MSH|^~\\&|A|B|C|D|1||ORU^R01^ORU_R01|9|P|2.5\r"), "ORU^R01")
+        self.assertEqual(MLLPServer._message_type_label("PID|||1"), "UNKNOWN")
+        # MSH-9 fourni par l'émetteur: valeurs hors liste regroupées
+        self.assertEqual(MLLPServer._message_type_label("MSH|^~\\&|A|B|C|D|1||ZZZ^Z99|9|P|2.5\r"), "OTHER")
+        self.assertEqual(MLLPServer._message_type_label("MSH#^~\\&#A#B#C#D#1##ADT^A01#9#P#2.5\r"), "ADT^A01")
+
+
+class TestServerMetrics(unittest.TestCase):
+    
+    def setUp(self):
+        self.server = QuietMLLPServer(host='localhost', port=12354, metrics_port=0)
+        self.server_thread = threading.Thread(target=self.server.start)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+        time.sleep(0.2)
+    
+    def tearDown(self):
+        self.server.stop()
+        self.server_thread.join(2)
+    
+    def test_metrics_endpoint(self):
+        """Test les compteurs exposés sur /metrics après quelques messages"""
+        message = "MSH|^~\\&|A|B|C|D|20240517||ADT^A01^ADT_A01|{}|P|2.5\r"
+        with socket.create_connection(('localhost', 12354), timeout=5) as s:
+            s.sendall(encode_frame(message.format(1)) + encode_frame(message.format(2)))
+            decoder = MLLPFrameDecoder()
+            acks = []
+            while len(acks) < 2:
+                acks.extend(decoder.feed(s.recv(4096)))
+        
+        url = f"http://127.0.0.1:{self.server.metrics_endpoint.port}/metrics"
+        with urllib.request.urlopen(url, timeout=5) as response:
+            text = response.read().decode('utf-8')
+        
+        self.assertIn("hl7_messages_received_total 2", text)
+        self.assertIn('hl7_acks_total{code="AA",message_type="ADT^A01"} 2', text)
+        self.assertIn("hl7_ack_latency_seconds_count 2", text)
+        self.assertIn("hl7_parse_seconds_count 2", text)
+        self.assertIn(f"hl7_bytes_sent_total {sum(len(encode_frame(a.decode())) for a in acks)}", text)
+        self.assertIn("hl7_connections_total 1", text)
+
+
+class TestMessagePersistence(unittest.TestCase):
+    
+    def setUp(self):
+        self.db = Database(':memory:')
+        self.server = QuietMLLPServer(host='localhost', port=0)
+        self.server.message_repo = MessageRepository(self.db)
+    
+    def tearDown(self):
+        self.db.close_all()
+    
+    def _saved(self):
+        return self.db.connect().execute("SELECT source, status, ack_code FROM messages").fetchall()
+    
+    def test_source_and_ack_code(self):
+        """Test la source stable (MSH-3, sinon IP sans port) et le code d'ACK enregistrés"""
+        self.server.handle_message("MSH|^~\\&|LABAPP|LAB|C|D|20240517||ORU^R01|1|P|2.5\r", ("10.0.0.5", 40001))
+        self.server.handle_message("MSH|^~\\&||LAB|C|D|20240517||ORU^R01|2|P|2.5\r", ("10.0.0.5", 40002))
+        self.assertEqual(sorted(tuple(row) for row in self._saved()),
+                         [("10.0.0.5", "PROCESSED", "AA"), ("LABAPP", "PROCESSED", "AA")])
+    
+    def test_processing_error_recorded_as_ae(self):
+        """Test l'enregistrement AE d'un message dont le traitement échoue"""
+        def failing_ack(*args, **kwargs):
+            raise RuntimeError("ACK impossible")
+        self.server.create_success_ack = failing_ack
+        ack = self.server.handle_message("MSH|^~\\&|LABAPP|LAB|C|D|20240517||ORU^R01|3|P|2.5\r",
+                                         ("10.0.0.5", 40003))
+        self.assertIn("MSA|AE", ack)
+        self.assertEqual([tuple(row) for row in self._saved()], [("LABAPP", "ERROR", "AE")])
+
+
+class TestTracing(unittest.TestCase):
+    
+    MESSAGE = "MSH|^~\\&|A|B|C|D|20240517||ADT^A01|42|P|2.5\rPID|||P1||DOE^JOHN\r"
+    
+    def test_disabled_tracer_is_noop(self):
+        """Test qu'un traceur sans exportateur ne crée aucune trace"""
+        tracer = Tracer()
+        self.assertFalse(tracer.enabled)
+        self.assertIs(tracer.begin(source="x"), NULL_TRACE)
+        self.assertIs(tracer.span("parse"), tracer.span("persist"))
+        with tracer.activate(NULL_TRACE), tracer.span("parse"):
+            pass
+        tracer.finish(NULL_TRACE)
+    
+    def test_spans_are_recorded_per_thread(self):
+        """Test les étapes mesurées dans la trace courante du thread"""
+        records = []
+        tracer = Tracer(records.append)
+        trace = tracer.begin(source="10.0.0.1:1")
+        with tracer.activate(trace):
+            with tracer.span("parse"):
+                pass
+            with tracer.span("ack"):
+                pass
+            with tracer.span("ack"):
+                pass
+            tracer.annotate(control_id="42")
+        # Hors activation: pas de trace courante
+        with tracer.span("ignored"):
+            pass
+        tracer.finish(trace)
+        
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0]["source"], "10.0.0.1:1")
+        self.assertEqual(records[0]["control_id"], "42")
+        self.assertEqual(set(records[0]["spans_ms"]), {"parse", "ack"})
+    
+    def test_server_writes_rolling_trace_file(self):
+        """Test l'export des étapes de handle_message dans le fichier de traces"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "traces.jsonl")
+            server = QuietMLLPServer(host='localhost', port=0, trace_file=path)
+            for _ in range(3):
+                trace = server.tracer.begin(source="127.0.0.1:1")
+                trace.add("decode", 0.0)
+                server._dispatch(self.MESSAGE, ("127.0.0.1", 1), trace)
+                server.tracer.finish(trace)
+            server.trace_exporter.close()
+            
+            with open(path, encoding='utf-8') as f:
+                records = [json.loads(line) for line in f]
+        
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0]["message_type"], "ADT^A01")
+        self.assertEqual(records[0]["control_id"], "42")
+        self.assertEqual(set(records[0]["spans_ms"]),
+                         {"decode", "parse", "extract_patient", "persist", "ack"})
+    
+    def test_ack_span_recorded_once(self):
+        """Test que la création de l'ACK n'est mesurée qu'une fois par message"""
+        server = QuietMLLPServer(host='localhost', port=0)
+        spans = []
+        original = server.tracer.span
+        
+        def recording_span(name):
+            spans.append(name)
+            return original(name)
+        
+        server.tracer.span = recording_span
+        server._dispatch(self.MESSAGE, ("127.0.0.1", 1))
+        self.assertEqual(spans.count("ack"), 1)
+    
+    def test_rolling_file_rotation(self):
+        """Test la rotation du fichier de traces"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "traces.jsonl")
+            exporter = RollingFileExporter(path, max_bytes=200, backup_count=2)
+            for i in range(20):
+                exporter({"n": i, "padding": "x" * 50})
+            exporter.close()
+            self.assertTrue(os.path.exists(path + ".1"))
+            self.assertFalse(os.path.exists(path + ".3"))
+
+
+class TestRateLimiting(unittest.TestCase):
+    
+    MESSAGE = "MSH|^~\\&|A|B|C|D|20240517||ADT^A01|{}|P|2.5\r"
+    LIMITS = {"connections_per_second": 0.01, "connection_burst": 2,
+              "messages_per_second": 0.01, "message_burst": 2, "tarpit_seconds": 0}
+    
+    def setUp(self):
+        self.servers = []
+    
+    def tearDown(self):
+        for server, thread in self.servers:
+            server.stop()
+            thread.join(2)
+    
+    def _start(self, server_class, port, **limits):
+        server = server_class(host='localhost', port=port, rate_limits=dict(self.LIMITS, **limits))
+        server.patient_repo = None
+        server.message_repo = None
+        thread = threading.Thread(target=server.start, daemon=True)
+        thread.start()
+        self.servers.append((server, thread))
+        time.sleep(0.2)
+        return server
+    
+    def _ack(self, s):
+        decoder = MLLPFrameDecoder()
+        acks = []
+        while not acks:
+            acks = decoder.feed(s.recv(4096))
+        return acks[0]
+    
+    def test_token_bucket(self):
+        """Test la rafale, le remplissage et l'oubli des sources inactives"""
+        now = [0.0]
+        limiter = TokenBucketLimiter(rate=2, burst=3, max_sources=2, clock=lambda: now[0])
+        self.assertEqual([limiter.allow("a") for _ in range(4)], [True, True, True, False])
+        now[0] = 0.5
+        self.assertTrue(limiter.allow("a"))
+        self.assertFalse(limiter.allow("a"))
+        
+        limiter.allow("b")
+        now[0] = 10.0
+        limiter.allow("c")  # Seaux pleins de a et b oubliés
+        self.assertEqual(len(limiter), 1)
+    
+    def test_source_limiter_and_config(self):
+        """Test les exemptions, les compteurs de refus et la lecture de config.json"""
+        limiter = SourceRateLimiter(dict(self.LIMITS, exempt=["10.0.0.1"]))
+        self.assertTrue(all(limiter.allow_connection("10.0.0.1") for _ in range(10)))
+        self.assertEqual([limiter.allow_message("10.0.0.2") for _ in range(3)], [True, True, False])
+        self.assertEqual(limiter.refused_messages, {"10.0.0.2": 1})
+        
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.json")
+            with open(path, "w") as f:
+                json.dump({"rate_limit": {"connections_per_second": 3}}, f)
+            self.assertIsNone(load_rate_limits(path))  # Activation explicite requise
+            with open(path, "w") as f:
+                json.dump({"rate_limit": {"enabled": True, "connections_per_second": 3}}, f)
+            limits = load_rate_limits(path)
+            self.assertEqual(limits["connections_per_second"], 3)
+            self.assertEqual(limits["message_burst"], 2000)
+            with open(path, "w") as f:
+                json.dump({"rate_limit": {"enabled": False}}, f)
+            self.assertIsNone(load_rate_limits(path))
+        self.assertIsNone(load_rate_limits(os.path.join("absent", "config.json")))
+    
+    def test_refusals_reach_application_log(self):
+        """Test que les refus passent par les handlers du journal lu par l'audit"""
+        handler = ListHandler()
+        shared = logging.getLogger("HL7Messenger.MLLPServer")
+        server = MLLPServer(host='localhost', port=0, rate_limits=self.LIMITS)
+        shared.addHandler(handler)
+        try:
+            for port in range(3):
+                server._admit_connection(("10.0.0.5", 4000 + port))
+        finally:
+            shared.removeHandler(handler)
+            server.tarpit.close()
+        messages = [record.getMessage() for record in handler.records]
+        self.assertEqual([parse_line(message) for message in messages], [("failure", "10.0.0.5")])
+    
+    def test_tarpit_closes_after_delay(self):
+        """Test la fermeture différée des connexions retenues"""
+        left, right = socket.socketpair()
+        tarpit = Tarpit(0.2)
+        tarpit.hold(right)
+        self.assertEqual(len(tarpit), 1)
+        self.assertNotEqual(right.fileno(), -1)
+        left.settimeout(2)
+        self.assertEqual(left.recv(1), b"")
+        self.assertEqual(len(tarpit), 0)
+        left.close()
+        tarpit.close()
+    
+    def test_threaded_server_refuses_connections(self):
+        """Test le refus des connexions au-delà de la rafale, sans thread client"""
+        server = self._start(MLLPServer, 12355)
+        sockets = [socket.create_connection(('localhost', 12355), timeout=5) for _ in range(3)]
+        try:
+            sockets[2].settimeout(2)
+            self.assertEqual(sockets[2].recv(1), b"")  # Fermée par le serveur
+            sockets[0].sendall(encode_frame(self.MESSAGE.format("1")))
+            self.assertIn(b"MSA|AA|1|", self._ack(sockets[0]))
+        finally:
+            for s in sockets:
+                s.close()
+        self.assertEqual(server.clients_connected, 2)
+        self.assertEqual(server.metrics.get("hl7_rate_limited_total").value("connection"), 1)
+    
+    def test_message_limit_answers_ar(self):
+        """Test l'ACK AR des messages au-delà de la limite de la source"""
+        server = self._start(MLLPServer, 12356)
+        with socket.create_connection(('localhost', 12356), timeout=5) as s:
+            codes = []
+            for i in range(3):
+                s.sendall(encode_frame(self.MESSAGE.format(i)))
+                codes.append(self._ack(s).split(b"MSA|")[1][:2])
+        self.assertEqual(codes, [b"AA", b"AA", b"AR"])
+        self.assertEqual(server.rate_limiter.refused_messages, {"127.0.0.1": 1})
+    
+    def test_async_server_refuses_connections(self):
+        """Test le refus des connexions par le moteur asyncio (avec tarpit)"""
+        server = self._start(AsyncMLLPServer, 12357, tarpit_seconds=0.3)
+        sockets = [socket.create_connection(('localhost', 12357), timeout=5) for _ in range(3)]
+        try:
+            sockets[2].settimeout(2)
+            started = time.monotonic()
+            self.assertEqual(sockets[2].recv(1), b"")
+            self.assertGreaterEqual(time.monotonic() - started, 0.2)
+            sockets[1].sendall(encode_frame(self.MESSAGE.format("2")))
+            self.assertIn(b"MSA|AA|2|", self._ack(sockets[1]))
+        finally:
+            for s in sockets:
+                s.close()
+        self.assertEqual(server.clients_connected, 2)
+
+
+class TestConnectionTimeouts(unittest.TestCase):
+    
+    MESSAGE = "MSH|^~\\&|A|B|C|D|20240517||ADT^A01|{}|P|2.5\r"
+    TIMEOUTS = {"read": 0.4, "idle": 0.8, "write": 1.0}
+    
+    def setUp(self):
+        self.servers = []
+        self.now = [100.0]
+    
+    def tearDown(self):
+        for server, thread in self.servers:
+            server.stop()
+            thread.join(2)
+    
+    def _start(self, server):
+        thread = threading.Thread(target=server.start, daemon=True)
+        thread.start()
+        self.servers.append((server, thread))
+        time.sleep(0.2)
+        return server
+    
+    def _closed_after(self, s, limit=3):
+        """Durée avant la fermeture de la connexion par le serveur"""
+        started = time.monotonic()
+        s.settimeout(limit)
+        while s.recv(4096):
+            pass
+        return time.monotonic() - started
+    
+    def test_timer_wheel(self):
+        """Test le déclenchement, l'annulation et les échéances au-delà d'un tour"""
+        wheel = TimerWheel(resolution=1, slots=8, clock=lambda: self.now[0])
+        fired = []
+        wheel.schedule(102, lambda: fired.append("a"))
+        cancelled = wheel.schedule(101, lambda: fired.append("b"))
+        wheel.schedule(120, lambda: fired.append("c"))  # Plus d'un tour de roue
+        wheel.cancel(cancelled)
+        self.assertEqual(len(wheel), 2)
+        
+        self.now[0] = 103
+        self.assertEqual(wheel.advance(), 1)
+        self.now[0] = 112
+        wheel.advance()
+        self.assertEqual(fired, ["a"])
+        self.now[0] = 130
+        wheel.advance()
+        self.assertEqual(fired, ["a", "c"])
+        self.assertEqual(len(wheel), 0)
+    
+    def test_deadline_rearm_and_slow_frame(self):
+        """Test le réarmement sans nouvelle échéance et le délai de trame non prolongé"""
+        wheel = TimerWheel(resolution=1, slots=8, clock=lambda: self.now[0])
+        expired = []
+        deadline = ConnectionDeadline(wheel, {"read": 5, "idle": 60, "write": 2}, expired.append)
+        for _ in range(100):
+            deadline.received(0)
+        self.assertEqual(len(wheel), 1)
+        
+        # Trame commencée à t=100, complétée goutte à goutte: pas de prolongation
+        for second in range(4):
+            self.now[0] = 100 + second
+            deadline.received(10 + second)
+            wheel.advance()
+        self.assertEqual(expired, [])
+        self.now[0] = 106
+        wheel.advance()
+        self.assertEqual(expired, ["read"])
+        self.assertEqual(deadline.expired, "read")
+        
+        # Inactivité désactivée (0): flux persistant conservé
+        persistent = ConnectionDeadline(wheel, {"read": 5, "idle": 0, "write": 2}, expired.append)
+        persistent.received(0)
+        self.now[0] = 10000
+        wheel.advance()
+        self.assertEqual(expired, ["read"])
+    
+    def test_load_timeouts(self):
+        """Test les délais généraux et propres à un département"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "config.json")
+            with open(path, "w") as f:
+                json.dump({"timeouts": {"idle": 60, "departments": {"LAB": {"idle": 0, "read": 5}}}}, f)
+            self.assertEqual(load_timeouts(path), {"read": 30.0, "idle": 60, "write": 10.0})
+            self.assertEqual(load_timeouts(path, "LAB"), {"read": 5, "idle": 0, "write": 10.0})
+            self.assertEqual(load_timeouts(path, "PHARMACY")["idle"], 60)
+        self.assertEqual(load_timeouts(os.path.join("absent", "config.json"))["read"], 30.0)
+    
+    def _check_server_timeouts(self, server_class, port):
+        server = server_class(host='localhost', port=port, timeouts=self.TIMEOUTS)
+        server.patient_repo = None
+        server.message_repo = None
+        self._start(server)
+        
+        # Client lent: la trame n'est jamais terminée malgré les envois réguliers
+        with socket.create_connection(('localhost', port), timeout=5) as s:
+            s.sendall(b"\x0bMSH|")
+            started = time.monotonic()
+            try:
+                for _ in range(20):
+                    time.sleep(0.1)
+                    s.sendall(b"x")
+            except OSError:
+                pass
+            s.settimeout(2)
+            while s.recv(4096):
+                pass
+            self.assertLess(time.monotonic() - started, 1.5)
+        
+        # Connexion inactive après un message
+        with socket.create_connection(('localhost', port), timeout=5) as s:
+            s.sendall(encode_frame(self.MESSAGE.format("1")))
+            self.assertIn(b"MSA|AA|1|", s.recv(4096))
+            self.assertGreater(self._closed_after(s), 0.6)
+        
+        timeouts = server.metrics.get("hl7_connection_timeouts_total")
+        for _ in range(50):
+            if timeouts.value("idle"):
+                break
+            time.sleep(0.05)  # Compteur mis à jour à la fin du traitement du client
+        self.assertEqual((timeouts.value("read"), timeouts.value("idle")), (1, 1))
+    
+    def test_threaded_server_timeouts(self):
+        """Test les délais de lecture et d'inactivité du moteur à threads"""
+        self._check_server_timeouts(MLLPServer, 12358)
+    
+    def test_async_server_timeouts(self):
+        """Test les délais de lecture et d'inactivité du moteur asyncio"""
+        self._check_server_timeouts(AsyncMLLPServer, 12359)
+    
+    def test_slow_processing_is_not_a_write_timeout(self):
+        """Test qu'un traitement plus long que le délai d'écriture ne coupe pas la connexion"""
+        class SlowServer(MLLPServer):
+            def handle_message(self, message, client_address):
+                time.sleep(0.8)
+                return super().handle_message(message, client_address)
+        
+        class AsyncSlowServer(AsyncMLLPServer, SlowServer):
+            pass
+        
+        for server_class, port in ((SlowServer, 12362), (AsyncSlowServer, 12363)):
+            server = server_class(host='localhost', port=port,
+                                  timeouts={"read": 0.3, "idle": 0.3, "write": 0.3})
+            server.patient_repo = None
+            server.message_repo = None
+            self._start(server)
+            with socket.create_connection(('localhost', port), timeout=5) as s:
+                s.sendall(encode_frame(self.MESSAGE.format("3")))
+                self.assertIn(b"MSA|AA|3|", s.recv(4096))
+            self.assertEqual(server.metrics.get("hl7_connection_timeouts_total").value("write"), 0)
+    
+    def test_multiport_department_timeouts(self):
+        """Test les délais propres à chaque département"""
+        def handler(message, name, address):
+            return "MSH|^~\\&|S||C||20240517||ACK|1|P|2.5\rMSA|AA|1"
+        
+        server = MultiPortMLLPServer({12360: ("ADMISSION", handler), 12361: ("LAB", handler)},
+                                     host='localhost',
+                                     timeouts={"ADMISSION": self.TIMEOUTS,
+                                               "LAB": dict(self.TIMEOUTS, idle=0)})
+        thread = threading.Thread(target=server.start, daemon=True)
+        thread.start()
+        self.servers.append((server, thread))
+        server.wait_ready(5)
+        
+        with socket.create_connection(('localhost', 12360), timeout=5) as admission, \
+                socket.create_connection(('localhost', 12361), timeout=5) as lab:
+            self.assertLess(self._closed_after(admission), 1.5)
+            # Flux du laboratoire conservé sans délai d'inactivité
+            lab.sendall(encode_frame(self.MESSAGE.format("2")))
+            self.assertIn(b"MSA|AA", lab.recv(4096))
+            self.assertEqual(server.connections_open, 1)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
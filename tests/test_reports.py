@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Tests unitaires pour le moteur de rapports d'activité.
+"""
+import unittest
+import tempfile
+import json
+import os
+import sys
+from datetime import date
+
+# Ajouter le répertoire parent au path pour importer les modules de l'application
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.db.database import Database
+from app.db.repositories.message_repository import MessageRepository
+from app.models.message import Message
+from app.reports.report_engine import (
+    ReportAggregator, aggregate_database, aggregate_messages, date_range_bounds,
+    iter_json_array, iter_json_lines, parse_timestamp, render_html, write_csv
+)
+from generate_report import DEFAULT_PATHS, ROOT_DIR, build_report
+
+def make_message(message_type, source, status, created_at):
+    message = Message(message_type=message_type, content="MSH|^~\\&|", source=source,
+                      destination="HL7_SERVER", patient_id="P1")
+    message.status = status
+    message.created_at = created_at
+    return message
+
+class TestReportAggregator(unittest.TestCase):
+    """Tests pour les agrégats calculés en un seul passage"""
+
+    def test_single_pass_aggregates(self):
+        report = ReportAggregator(date(2025, 6, 1))
+        report.add("2025-06-01T08", "ADT^A01", "ADMISSION", "PROCESSED", count=3)
+        report.add("2025-06-01T08", "ORU^R01", "LAB", "ERROR")
+        report.add("2025-06-01T14", "ADT^A01", "ADMISSION", "SUCCESS")
+
+        self.assertEqual(report.total, 5)
+        self.assertAlmostEqual(report.success_rate, 80.0)
+        self.assertEqual(report.types["ADT^A01"], 4)
+        self.assertEqual(report.sources["LAB"], 1)
+        hourly = dict((hour.hour, count) for hour, count in report.hourly())
+        self.assertEqual(len(hourly), 24)
+        self.assertEqual(hourly[8], 4)
+        self.assertEqual(hourly[14], 1)
+        self.assertEqual(hourly[9], 0)
+
+    def test_date_range_bounds(self):
+        self.assertEqual(date_range_bounds(date(2025, 6, 1), date(2025, 6, 30)),
+                         ("2025-06-01T00:00:00", "2025-07-01T00:00:00"))
+
+    def test_parse_timestamp(self):
+        self.assertEqual(parse_timestamp("20250601143000").hour, 14)
+        self.assertEqual(parse_timestamp("20250601").day, 1)
+        self.assertEqual(parse_timestamp("2025-06-01T14:30:00.123").minute, 30)
+        self.assertIsNone(parse_timestamp("bad"))
+        self.assertIsNone(parse_timestamp(""))
+
+class TestReportSources(unittest.TestCase):
+    """Tests pour les sources de messages (base, JSON-lines, ancien JSON)"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.messages = [
+            {"timestamp": "20250531235959", "type": "ADT^A01", "source": "ADMISSION", "status": "SUCCESS"},
+            {"timestamp": "20250601080000", "type": "ADT^A01", "source": "ADMISSION", "status": "SUCCESS"},
+            {"timestamp": "20250601091500", "type": "ORU^R01", "source": "LAB", "status": "ERROR"},
+            {"timestamp": "20250602100000", "type": "ORM^O01", "source": "RADIO", "status": "SUCCESS"},
+        ]
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_database_range(self):
+        database = Database(os.path.join(self.temp_dir.name, "report.db"))
+        repository = MessageRepository(database)
+        for message in [
+            make_message("ADT^A01", "ADMISSION", "PROCESSED", "2025-05-31T23:59:59"),
+            make_message("ADT^A01", "ADMISSION", "PROCESSED", "2025-06-01T08:00:00"),
+            make_message("ADT^A01", "ADMISSION", "ERROR", "2025-06-01T08:30:00"),
+            make_message("ORU^R01", "LAB", "PROCESSED", "2025-06-02T23:59:59.999"),
+            make_message("ORU^R01", "LAB", "PROCESSED", "2025-06-03T00:00:00"),
+        ]:
+            repository.save(message)
+
+        report = aggregate_database(database, date(2025, 6, 1), date(2025, 6, 2))
+        database.close()
+        self.assertEqual(report.total, 3)
+        self.assertEqual(report.types, {"ADT^A01": 2, "ORU^R01": 1})
+        self.assertAlmostEqual(report.success_rate, 200 / 3)
+        self.assertEqual(report.hours["2025-06-01T08"], 2)
+        self.assertEqual(len(report.hourly()), 48)
+
+    def test_json_lines(self):
+        path = os.path.join(self.temp_dir.name, "messages.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for message in self.messages:
+                f.write(json.dumps(message) + "\n")
+
+        report = aggregate_messages(iter_json_lines(path), date(2025, 6, 1))
+        self.assertEqual(report.total, 2)
+        self.assertEqual(report.sources, {"ADMISSION": 1, "LAB": 1})
+
+    def test_legacy_json_array_streamed(self):
+        path = os.path.join(self.temp_dir.name, "messages.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.messages, f, indent=2)
+
+        # Petites lectures: les objets sont coupés entre deux blocs
+        self.assertEqual(list(iter_json_array(path, chunk_size=7)), self.messages)
+        report = aggregate_messages(iter_json_array(path, chunk_size=16), date(2025, 6, 1), date(2025, 6, 2))
+        self.assertEqual(report.total, 3)
+
+    def test_render_html_and_csv(self):
+        report = aggregate_messages(self.messages, date(2025, 6, 1))
+        report.add("2025-06-01T10", "<script>", "LAB", "SUCCESS")
+        page = render_html(report)
+        self.assertIn("Total messages: 3", page)
+        self.assertIn("&lt;script&gt;", page)
+        self.assertNotIn("<script>", page)
+
+        path = os.path.join(self.temp_dir.name, "rapport.csv")
+        write_csv(report, path)
+        with open(path, encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], "section,key,count")
+        self.assertIn("total,messages,3", lines)
+        self.assertIn("hour,2025-06-01T08:00,1", lines)
+
+class TestGenerateReport(unittest.TestCase):
+    """Tests pour les sources du script generate_report.py"""
+
+    def test_default_paths_from_project_root(self):
+        for path in DEFAULT_PATHS.values():
+            self.assertTrue(path.startswith(os.path.join(ROOT_DIR, "resources")))
+
+    def test_missing_source_not_created(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "absent.db")
+            with self.assertRaises(FileNotFoundError):
+                build_report(date(2025, 6, 1), source="db", path=path)
+            self.assertFalse(os.path.exists(path))
+
+if __name__ == '__main__':
+    unittest.main()